@@ -5,10 +5,19 @@
 __author__ = """Gavin Chan"""
 __email__ = 'gavincyi@gmail.com'
 
-from pkg_resources import get_distribution, DistributionNotFound
 try:
-    __version__ = get_distribution(__name__).version
-except DistributionNotFound:
+    from importlib.metadata import version, PackageNotFoundError
+except ImportError:
+    # importlib.metadata is only available from Python 3.8
+    from pkg_resources import (
+        get_distribution, DistributionNotFound as PackageNotFoundError)
+
+    def version(distribution_name):
+        return get_distribution(distribution_name).version
+
+try:
+    __version__ = version('BitcoinExchangeFH')
+except PackageNotFoundError:
     # package is not installed
     pass
 
@@ -32,7 +32,27 @@ LOGGER = logging.getLogger(__name__)
     default=None,
     help='Manually archive the tables.',
     required=False)
-def main(configuration, debug, cold, archive):
+@click.option(
+    '--archive-delete',
+    default=False,
+    is_flag=True,
+    help='Delete the archived rows from the database once the archive '
+         'is verified.')
+@click.option(
+    '--archive-processes',
+    default=None,
+    type=int,
+    help='Number of archive processes.',
+    required=False)
+@click.option(
+    '--profile',
+    default=None,
+    type=click.Choice(['cprofile', 'sample', 'tracemalloc']),
+    help='Profile each process and dump the statistics on shutdown '
+         'or SIGUSR1.',
+    required=False)
+def main(configuration, debug, cold, archive, archive_delete,
+         archive_processes, profile):
     """Console script for BitcoinExchangeFH."""
     if debug:
         level = logging.DEBUG
@@ -48,14 +68,22 @@ def main(configuration, debug, cold, archive):
     LOGGER.debug('Configuration:\n%s', configuration)
     configuration = Configuration(configuration)
 
+    profile_configuration = dict(configuration.profile)
+    if profile is not None:
+        profile_configuration['mode'] = profile
+
     runner = Runner(
         config=configuration,
         is_debug=debug,
-        is_cold=cold)
+        is_cold=cold,
+        profile=profile_configuration)
     runner.load()
 
     if archive is not None:
-        runner.archive(date=archive)
+        runner.archive(
+            date=archive,
+            processes=archive_processes,
+            is_delete=archive_delete)
     else:
         runner.run()
 
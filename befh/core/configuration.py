@@ -21,6 +21,12 @@ class Configuration:
         """
         return self._config['handlers']
 
+    @property
+    def profile(self):
+        """Profile.
+        """
+        return self._config.get('profile') or {}
+
     def keys(self):
         """Keys.
         """
@@ -0,0 +1,156 @@
+from collections import Counter
+import logging
+import os
+import signal
+from time import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Profiler:
+    """Profiler of a process target.
+
+    The statistics are dumped into the profile directory when the
+    target returns, when the process is terminated, and whenever the
+    process receives SIGUSR1, in the files named by the process name
+    and pid.
+    """
+
+    MODES = ('cprofile', 'sample', 'tracemalloc')
+    DEFAULT_PATH = '.profile'
+    DEFAULT_SAMPLE_INTERVAL = 0.005
+    DEFAULT_TOP = 25
+
+    def __init__(self, mode, path=DEFAULT_PATH,
+                 sample_interval=DEFAULT_SAMPLE_INTERVAL,
+                 top=DEFAULT_TOP):
+        """Constructor.
+
+        :param mode: `str` of the profiler mode. "cprofile" profiles
+            every function call deterministically, "sample" samples the
+            stack of the main thread every sample interval and
+            "tracemalloc" reports the top allocators.
+        :param path: `str` of the directory of the statistics files.
+        :param sample_interval: `float` of the seconds of CPU time
+            between the samples.
+        :param top: `int` of the number of the top allocators reported.
+        """
+        assert mode in self.MODES, (
+            "Profile mode ({}) must be one of {}".format(mode, self.MODES))
+        self._mode = mode
+        self._path = path
+        self._sample_interval = sample_interval
+        self._top = top
+        self._name = None
+        self._profile = None
+        self._is_running = False
+        self._samples = Counter()
+
+    @property
+    def mode(self):
+        """Mode.
+        """
+        return self._mode
+
+    def run(self, target, name, **kwargs):
+        """Run the target under the profiler.
+
+        :param target: Callable of the process target.
+        :param name: `str` of the process name in the file names.
+        :param kwargs: Keyword arguments of the target.
+        """
+        self._name = name
+        self.start()
+        signal.signal(signal.SIGUSR1, lambda *args: self.dump())
+        signal.signal(signal.SIGTERM, self._terminate)
+
+        try:
+            return target(**kwargs)
+        finally:
+            self.stop()
+            self.dump()
+
+    def start(self):
+        """Start profiling.
+        """
+        LOGGER.info('Profiling %s (pid %d) by %s',
+                    self._name, os.getpid(), self._mode)
+        self._is_running = True
+
+        if self._mode == 'cprofile':
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self._mode == 'sample':
+            signal.signal(signal.SIGPROF, self._sample)
+            signal.setitimer(
+                signal.ITIMER_PROF,
+                self._sample_interval,
+                self._sample_interval)
+        else:
+            import tracemalloc
+            tracemalloc.start()
+
+    def stop(self):
+        """Stop profiling.
+        """
+        self._is_running = False
+
+        if self._mode == 'cprofile':
+            self._profile.disable()
+        elif self._mode == 'sample':
+            signal.setitimer(signal.ITIMER_PROF, 0)
+
+    def dump(self):
+        """Dump the statistics into the profile directory.
+
+        :return: `str` of the file path.
+        """
+        os.makedirs(self._path, exist_ok=True)
+        path = os.path.join(
+            self._path, '%s.%d' % (self._name, os.getpid()))
+
+        if self._mode == 'cprofile':
+            path += '.prof'
+            self._profile.dump_stats(path)
+            # Dumping the statistics disables the profiler
+            if self._is_running:
+                self._profile.enable()
+        elif self._mode == 'sample':
+            # Collapsed stacks, which are the input of flame graphs
+            path += '.folded'
+            with open(path, 'w') as stats_file:
+                for stack, count in self._samples.most_common():
+                    stats_file.write('%s %d\n' % (stack, count))
+        else:
+            import tracemalloc
+            path += '.tracemalloc.txt'
+            statistics = tracemalloc.take_snapshot().statistics('lineno')
+            with open(path, 'w') as stats_file:
+                stats_file.write('Top %d allocators at %f\n' % (
+                    self._top, time()))
+                for statistic in statistics[:self._top]:
+                    stats_file.write('%s\n' % statistic)
+
+        LOGGER.info('Dumped profile of %s into %s', self._name, path)
+        return path
+
+    def _sample(self, signum, frame):
+        """Record the stack of the interrupted frame.
+        """
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append('%s:%s:%d' % (
+                os.path.basename(code.co_filename),
+                code.co_name,
+                code.co_firstlineno))
+            frame = frame.f_back
+
+        self._samples[';'.join(reversed(stack))] += 1
+
+    @staticmethod
+    def _terminate(signum, frame):
+        """Exit on termination, so that the statistics are dumped.
+        """
+        raise SystemExit(0)
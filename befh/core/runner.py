@@ -1,6 +1,13 @@
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed)
 import logging
 import multiprocessing as mp
 from datetime import datetime
+from time import time
+
+from .profiler import Profiler
 
 LOGGER = logging.getLogger(__name__)
 
@@ -9,19 +16,28 @@ class Runner:
     """Runner.
     """
 
-    def __init__(self, config, is_debug, is_cold):
+    def __init__(self, config, is_debug, is_cold, profile=None):
         """Constructor.
+
+        :param profile: `dict` of the parameters of `Profiler`. Each
+            child process is run under the profiler if "mode" is
+            specified.
         """
         self._config = config
         self._is_debug = is_debug
         self._is_cold = is_cold
         self._exchanges = {}
         self._handlers = {}
+        self._profiler = None
+
+        if profile and profile.get('mode') is not None:
+            self._profiler = Profiler(**profile)
 
     def load(self):
         """Load.
         """
         LOGGER.info('Loading runner')
+        start_time = time()
 
         handlers_configuration = self._config.handlers
         handlers = self.create_handlers(
@@ -30,6 +46,7 @@ class Runner:
             is_cold=self._is_cold)
 
         self._handlers = handlers
+        handlers_time = time()
 
         exchanges_configuration = self._config.subscriptions
         exchanges = self.create_exchanges(
@@ -39,27 +56,32 @@ class Runner:
             is_cold=self._is_cold)
 
         self._exchanges = exchanges
+        exchanges_time = time()
+
+        LOGGER.info(
+            'Loaded runner in %.3fs (handlers %.3fs, exchanges %.3fs)',
+            exchanges_time - start_time,
+            handlers_time - start_time,
+            exchanges_time - handlers_time)
 
     def run(self):
         """Run.
         """
         LOGGER.info('Start running the feed handler')
 
-        processes = []
-
-        for name, handler in self._handlers.items():
-            LOGGER.info('Running handler %s', name)
-            process = mp.Process(target=handler.run)
-            process.start()
-            processes.append(process)
+        processes = self._start_handlers()
 
         for name, exchange in self._exchanges.items():
             LOGGER.info('Running exchange %s', name)
 
             if len(self._exchanges) > 1:
-                process = mp.Process(target=exchange.run)
-                process.start()
-                processes.append(process)
+                processes.append(self._start_process(
+                    target=exchange.run,
+                    name='exchange_%s' % name))
+            elif self._profiler is not None:
+                self._profiler.run(
+                    target=exchange.run,
+                    name='exchange_%s' % name)
             else:
                 exchange.run()
 
@@ -67,44 +89,117 @@ class Runner:
         for process in processes:
             process.join()
 
-    def archive(self, date):
+    def archive(self, date, processes=None, is_delete=False):
         """Archive.
+
+        The rows of the date in all the tables are archived by a
+        process pool. If is_delete is set, the archived rows are
+        deleted, and then the databases are vacuumed.
+
+        :param date: `str` of the date in the format "%Y-%m-%d".
+        :param processes: `int` of the number of archive processes,
+            which is the number of CPUs if not specified.
+        :param is_delete: `bool` indicating whether to delete the
+            archived rows from the databases.
         """
+        from befh.handler.sql_archive import archive_table, vacuum_database
+
         date = datetime.strptime(date, '%Y-%m-%d')
 
         LOGGER.info('Archiving the tables with date %s', date)
 
-        processes = []
-
-        for name, handler in self._handlers.items():
-            LOGGER.info('Running handler %s', name)
-            process = mp.Process(target=handler.run)
-            process.start()
-            processes.append(process)
-
-        for exchange in self._exchanges.values():
-            for name, instrument in exchange.instruments.items():
-                for handler in exchange.handlers.values():
-                    handler.rotate_table(
-                        table=instrument,
-                        last_datetime=date,
-                        allow_fail=True)
+        # The handlers create the tables which are not created yet
+        handler_processes = self._start_handlers()
 
         LOGGER.info('Closing the handlers')
         for handler in self._handlers.values():
             handler.prepare_close()
 
-        LOGGER.info('Joining all the processes')
-        for process in processes:
+        for process in handler_processes:
             process.join()
 
-        LOGGER.info('Archived the tables with date %s', date)
+        table_names = [
+            table_name
+            for exchange in self._exchanges.values()
+            for instrument in exchange.instruments.values()
+            for table_name, _ in instrument.tables]
+        tasks = [
+            dict(task, is_delete=is_delete)
+            for handler in self._handlers.values()
+            for task in handler.get_archive_tasks(
+                table_names=table_names, date=date)]
+        connections = sorted(set(task['connection'] for task in tasks))
+        start_time = time()
+        total_row_count = 0
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {
+                executor.submit(archive_table, **task): task
+                for task in tasks}
+
+            for i, future in enumerate(as_completed(futures)):
+                task = futures[future]
+                row_count = future.result()
+                total_row_count += row_count
+                LOGGER.info(
+                    'Archived table %s with %d rows (%d/%d, %.1fs)',
+                    task['table_name'], row_count, i + 1, len(tasks),
+                    time() - start_time)
+
+            if is_delete:
+                LOGGER.info('Vacuuming %d databases', len(connections))
+                for future in as_completed([
+                        executor.submit(vacuum_database, connection)
+                        for connection in connections]):
+                    future.result()
+
+        LOGGER.info(
+            'Archived %d rows of %d tables with date %s in %.1fs',
+            total_row_count, len(tasks), date, time() - start_time)
+
+    def _start_handlers(self):
+        """Start a process for each worker of the handlers.
+        """
+        processes = []
+
+        for name, handler in self._handlers.items():
+            for worker in range(handler.workers):
+                LOGGER.info('Running handler %s (worker %d)', name, worker)
+                processes.append(self._start_process(
+                    target=handler.run,
+                    name='handler_%s_%d' % (name, worker),
+                    worker=worker))
+
+        return processes
+
+    def _start_process(self, target, name, **kwargs):
+        """Start a process running the target, under the profiler if
+        it is specified.
+
+        :param name: `str` of the process name.
+        """
+        if self._profiler is not None:
+            process = mp.Process(
+                target=self._profiler.run,
+                name=name,
+                kwargs=dict(target=target, name=name, **kwargs))
+        else:
+            process = mp.Process(target=target, name=name, kwargs=kwargs)
+
+        process.start()
+        return process
 
     @staticmethod
     def create_exchange(
-            exchange_name, subscription, handlers, is_debug, is_cold):
+            exchange_name, subscription, handlers, is_debug, is_cold,
+            is_load_feed=True):
         """Create exchange.
+
+        :param is_load_feed: `bool` indicating whether to load the feed
+            of the websocket exchange.
         """
+        start_time = time()
+
         try:
             from befh.exchange.websocket_exchange import WebsocketExchange
             exchange = WebsocketExchange(
@@ -113,9 +208,9 @@ class Runner:
                 is_debug=is_debug,
                 is_cold=is_cold)
 
-            exchange.load(handlers=handlers)
+            exchange.load(handlers=handlers, is_load_feed=is_load_feed)
 
-        except ImportError as error:
+        except ImportError:
             LOGGER.info(
                 'Cannot load websocket exchange %s and fall into '
                 'REST api exchange', exchange_name)
@@ -128,23 +223,58 @@ class Runner:
 
             exchange.load(handlers=handlers)
 
+        LOGGER.info('Loaded exchange %s in %.3fs',
+                    exchange_name, time() - start_time)
+
         return exchange
 
     @staticmethod
     def create_exchanges(
             exchanges_configuration, handlers, is_debug, is_cold):
         """Create exchanges.
+
+        The exchanges are loaded concurrently, as loading an exchange
+        mostly waits for the network. The feeds of the websocket
+        exchanges are then loaded in the main thread, as they are bound
+        to the event loop of the thread.
         """
-        exchanges = {}
+        if not exchanges_configuration:
+            return {}
 
-        for exchange_name, subscription in exchanges_configuration.items():
-            exchange = Runner.create_exchange(
-                exchange_name=exchange_name,
-                subscription=subscription,
-                handlers=handlers,
-                is_debug=is_debug,
-                is_cold=is_cold)
-            exchanges[exchange_name] = exchange
+        # Import the exchange modules once before loading the exchanges
+        # in the threads
+        start_time = time()
+        try:
+            from befh.exchange.websocket_exchange import WebsocketExchange
+        except ImportError:
+            import befh.exchange.rest_api_exchange  # noqa: F401
+            WebsocketExchange = None
+
+        LOGGER.info('Imported exchange modules in %.3fs',
+                    time() - start_time)
+
+        with ThreadPoolExecutor(
+                max_workers=len(exchanges_configuration)) as executor:
+            futures = [
+                (exchange_name, executor.submit(
+                    Runner.create_exchange,
+                    exchange_name=exchange_name,
+                    subscription=subscription,
+                    handlers=handlers,
+                    is_debug=is_debug,
+                    is_cold=is_cold,
+                    is_load_feed=False))
+                for exchange_name, subscription
+                in exchanges_configuration.items()]
+
+            exchanges = {
+                exchange_name: future.result()
+                for exchange_name, future in futures}
+
+        for exchange in exchanges.values():
+            if (WebsocketExchange is not None and
+                    isinstance(exchange, WebsocketExchange)):
+                exchange.load_feed()
 
         return exchanges
 
@@ -153,25 +283,36 @@ class Runner:
         """Create handler.
         """
         LOGGER.info('Creating handler %s', handler_name)
+        start_time = time()
         handler_name = handler_name.lower()
 
         if handler_name == "sql":
-            from befh.handler import SqlHandler
+            from befh.handler.sql_handler import SqlHandler
             handler = SqlHandler(
                 is_debug=is_debug,
                 is_cold=is_cold,
                 **handler_parameters)
         elif handler_name == "zmq":
-            from befh.handler import ZmqHandler
+            from befh.handler.zmq_handler import ZmqHandler
             handler = ZmqHandler(
                 is_debug=is_debug,
                 is_cold=is_cold,
                 **handler_parameters)
+        elif handler_name == "shared_memory":
+            from befh.handler.shared_memory_handler import (
+                SharedMemoryHandler)
+            handler = SharedMemoryHandler(
+                is_debug=is_debug,
+                is_cold=is_cold,
+                **handler_parameters)
         else:
             raise NotImplementedError(
                 'Handler %s is not implemented' % handler_name)
 
-        handler.load(queue=mp.Queue())
+        handler.load(queue_factory=mp.Queue)
+
+        LOGGER.info('Loaded handler %s in %.3fs',
+                    handler_name, time() - start_time)
 
         return handler
 
@@ -0,0 +1,47 @@
+import asyncio
+import gc
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+EVENT_LOOPS = ('asyncio', 'uvloop')
+
+
+def create_event_loop(event_loop='asyncio'):
+    """Create and set the event loop of the current thread.
+
+    :param event_loop: `str` of either "asyncio" or "uvloop". The
+        asyncio loop is created if uvloop is not installed.
+    :return: The event loop.
+    """
+    assert event_loop in EVENT_LOOPS, (
+        "Event loop ({}) must be one of {}".format(event_loop, EVENT_LOOPS))
+
+    if event_loop == 'uvloop':
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            LOGGER.warning(
+                'uvloop is not installed and falls into the asyncio loop')
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+def tune_gc(threshold=None, is_freeze=False):
+    """Tune the garbage collector for the callbacks.
+
+    :param threshold: `list` of the thresholds of the generations,
+        passed to `gc.set_threshold`. A larger threshold of the
+        youngest generation collects less often in the callbacks.
+    :param is_freeze: `bool` indicating whether to move all the objects
+        created so far into the permanent generation, so that they are
+        not scanned by the following collections.
+    """
+    if threshold is not None:
+        gc.set_threshold(*threshold)
+
+    if is_freeze:
+        gc.freeze()
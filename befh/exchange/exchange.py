@@ -1,7 +1,11 @@
 import logging
 from datetime import datetime
+from math import floor
+from time import time
 
+from befh.handler.handler_dispatcher import HandlerDispatcher
 from befh.table.order_book_table import OrderBook
+from befh.table.order_book_delta_table import OrderBookDelta
 
 LOGGER = logging.getLogger(__name__)
 
@@ -11,9 +15,14 @@ class Exchange:
     """
 
     DEFAULT_ORDER_BOOK_CLASS = OrderBook
+    ORDER_BOOK_CLASSES = {
+        'full': OrderBook,
+        'delta': OrderBookDelta,
+    }
     TIMEOUT_TOLERANCE = 5
     DEFAULT_DEPTH = 5
     DEFAULT_TYPE = 'spot'
+    BAR_CLOSE_INTERVAL = 1.0
 
     def __init__(self, name, config, is_debug, is_cold):
         """Constructor.
@@ -29,6 +38,11 @@ class Exchange:
         self._last_request_time = datetime(1990, 1, 1)
         self._exchange_interface = None
         self._handlers = {}
+        self._dispatcher = HandlerDispatcher({})
+        self._sample_interval = None
+        self._is_sample_only = False
+        self._next_sample_time = float('inf')
+        self._next_bar_close_time = float('inf')
 
     @classmethod
     def get_order_book_class(cls):
@@ -63,26 +77,71 @@ class Exchange:
         self._load_depth()
         self._load_type()
         self._load_is_orders()
+        self._load_sample()
+        self._load_bars()
+
+    def close(self):
+        """Close.
+
+        The open bars are recorded, as no later trade closes them.
+        """
+        self._close_bars(is_flush=True)
 
     def _load_handlers(self, handlers):
         """Load handlers.
         """
         self._handlers = handlers
+        self._dispatcher = HandlerDispatcher(handlers)
 
     def _load_instruments(self):
         """Load instruments.
         """
         instruments = self._config['instruments']
+        order_book_class, order_book_params = self._get_storage()
+
         for symbol in instruments:
-            instmt_info = self.DEFAULT_ORDER_BOOK_CLASS(
+            instmt_info = order_book_class(
                 exchange=self._name,
-                symbol=self._symbol_filter(symbol))
+                symbol=self._symbol_filter(symbol),
+                **order_book_params)
             self._instruments[symbol] = instmt_info
 
-            for handler in self._handlers.values():
-                handler.prepare_create_table(
-                    table_name=instmt_info.table_name,
-                    fields=instmt_info.fields)
+            for table_name, fields in instmt_info.tables:
+                self._dispatcher.prepare_create_table(
+                    table_name=table_name,
+                    fields=fields)
+
+    def _get_storage(self):
+        """Get the order book class and parameters of the storage.
+        """
+        storage = self._config.get('storage')
+        params = {}
+
+        if 'trade_table' in self._config:
+            params['is_trade_table'] = self._config['trade_table']
+            assert isinstance(params['is_trade_table'], bool), (
+                "trade_table ({}) must be an boolean".format(
+                    params['is_trade_table']))
+
+        if 'bar_intervals' in self._config:
+            params['bar_intervals'] = self._config['bar_intervals']
+            assert (isinstance(params['bar_intervals'], list) and
+                    all(isinstance(interval, int) and interval > 0
+                        for interval in params['bar_intervals'])), (
+                "bar_intervals ({}) must be a list of positive "
+                "integers".format(params['bar_intervals']))
+
+        if storage is None:
+            return self.DEFAULT_ORDER_BOOK_CLASS, params
+
+        assert storage in self.ORDER_BOOK_CLASSES, (
+            "Storage ({}) must be one of {}".format(
+                storage, list(self.ORDER_BOOK_CLASSES.keys())))
+
+        if storage == 'delta' and 'keyframe_interval' in self._config:
+            params['keyframe_interval'] = self._config['keyframe_interval']
+
+        return self.ORDER_BOOK_CLASSES[storage], params
 
     def _load_depth(self):
         """Load depth.
@@ -111,6 +170,85 @@ class Exchange:
                 "is_orders ({}) must be an boolean".format(
                     self._is_orders))    
 
+    def _load_sample(self):
+        """Load sample_interval and sample_only.
+        """
+        if 'sample_interval' in self._config:
+            self._sample_interval = self._config['sample_interval']
+            assert (isinstance(self._sample_interval, (int, float)) and
+                    self._sample_interval > 0), (
+                "sample_interval ({}) must be a positive number".format(
+                    self._sample_interval))
+            self._next_sample_time = self.get_next_sample_time(
+                timestamp=time(),
+                sample_interval=self._sample_interval)
+
+        if 'sample_only' in self._config:
+            self._is_sample_only = self._config['sample_only']
+            assert isinstance(self._is_sample_only, bool), (
+                "sample_only ({}) must be an boolean".format(
+                    self._is_sample_only))
+            assert (not self._is_sample_only or
+                    self._sample_interval is not None), (
+                "sample_only requires sample_interval")
+
+    def _load_bars(self):
+        """Load the timer closing the bars.
+        """
+        if self._config.get('bar_intervals'):
+            self._next_bar_close_time = time()
+
+    @staticmethod
+    def get_next_sample_time(timestamp, sample_interval):
+        """Get the next sampling time on the grid of the interval.
+
+        :param timestamp: `float` of epoch seconds.
+        :param sample_interval: `float` of the seconds between samples.
+        :return: `float` of epoch seconds.
+        """
+        return (floor(timestamp / sample_interval) + 1) * sample_interval
+
+    def _update_samples(self):
+        """Sample the order books once the sampling time is passed.
+
+        It is also called before an order book update is applied, so
+        that the sample stamped with the sampling time is the order
+        book at that time rather than the one after a later update.
+        """
+        if time() < self._next_sample_time:
+            return
+
+        sample_time = datetime.utcfromtimestamp(self._next_sample_time)
+        self._next_sample_time = self.get_next_sample_time(
+            timestamp=time(),
+            sample_interval=self._sample_interval)
+
+        for instmt_info in self._instruments.values():
+            for fields in instmt_info.get_sample_rows(sample_time):
+                self._dispatcher.prepare_insert(
+                    table_name=instmt_info.table_name,
+                    fields=fields)
+
+    def _close_bars(self, is_flush=False):
+        """Record the bars of which the interval is passed without any
+        trade of a later bar, once every BAR_CLOSE_INTERVAL seconds.
+
+        :param is_flush: `bool` indicating whether to record all the
+            open bars regardless of the time.
+        """
+        if not is_flush and time() < self._next_bar_close_time:
+            return
+
+        self._next_bar_close_time = time() + self.BAR_CLOSE_INTERVAL
+        timestamp = None if is_flush else datetime.utcnow()
+
+        for instmt_info in self._instruments.values():
+            for table_name, fields in instmt_info.get_closed_bar_rows(
+                    timestamp):
+                self._dispatcher.prepare_insert(
+                    table_name=table_name,
+                    fields=fields)
+
     @staticmethod
     def _symbol_filter(original_symbol):     
         if original_symbol.find(':')>=0:
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+
+
+class PollScheduler:
+    """Poll scheduler of the REST API instruments.
+
+    The request rate of the exchange is allocated to the instruments
+    in proportion to their activity, which is the exponentially weighted
+    fraction of the polls observing a change. The poll interval of each
+    instrument is bounded by the minimum and maximum intervals, so that
+    the active instruments are polled often and the inactive ones are
+    still polled occasionally.
+    """
+
+    DEFAULT_MIN_INTERVAL = 0.0
+    DEFAULT_MAX_INTERVAL = 60.0
+    DEFAULT_SMOOTHING = 0.2
+    MINIMUM_ACTIVITY = 0.01
+
+    def __init__(self, symbols, request_rate,
+                 min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL,
+                 smoothing=DEFAULT_SMOOTHING):
+        """Constructor.
+
+        :param symbols: `list` of the instrument symbols, which must
+            not be empty.
+        :param request_rate: `float` of the requests per second allowed
+            by the exchange.
+        :param min_interval: `float` of the minimum seconds between the
+            polls of an instrument.
+        :param max_interval: `float` of the maximum seconds between the
+            polls of an instrument.
+        :param smoothing: `float` of the weight of the latest poll in
+            the activity and cost.
+        """
+        assert symbols, "Symbols must not be empty"
+        assert min_interval <= max_interval, (
+            "Minimum interval ({}) must not be larger than maximum "
+            "interval ({})".format(min_interval, max_interval))
+        self._request_rate = request_rate
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._smoothing = smoothing
+        # All the instruments are assumed active and polled at once
+        self._activities = OrderedDict((symbol, 1.0) for symbol in symbols)
+        self._total_activity = float(len(self._activities))
+        self._costs = {symbol: 1.0 for symbol in symbols}
+        self._next_times = OrderedDict((symbol, 0.0) for symbol in symbols)
+
+    def get_activity(self, symbol):
+        """Get the activity of the instrument.
+        """
+        return self._activities[symbol]
+
+    def get_interval(self, symbol):
+        """Get the poll interval of the instrument.
+
+        :return: `float` of seconds.
+        """
+        share = self._activities[symbol] / self._total_activity
+        poll_rate = self._request_rate * share / self._costs[symbol]
+
+        return min(max(1.0 / poll_rate, self._min_interval),
+                   self._max_interval)
+
+    def next(self):
+        """Get the instrument to poll next.
+
+        :return: `tuple` of the symbol and its poll time in epoch
+            seconds.
+        """
+        symbol = min(self._next_times, key=self._next_times.get)
+        return symbol, self._next_times[symbol]
+
+    def update(self, symbol, is_changed, request_count, timestamp):
+        """Update the instrument after a poll.
+
+        :param is_changed: `bool` indicating whether the poll observes
+            a change.
+        :param request_count: `int` of the requests made by the poll.
+        :param timestamp: `float` of the poll time in epoch seconds.
+        """
+        smoothing = self._smoothing
+        activity = max(
+            (1 - smoothing) * self._activities[symbol] +
+            smoothing * float(is_changed),
+            self.MINIMUM_ACTIVITY)
+
+        self._total_activity += activity - self._activities[symbol]
+        self._activities[symbol] = activity
+        self._costs[symbol] = (
+            (1 - smoothing) * self._costs[symbol] +
+            smoothing * request_count)
+        self._next_times[symbol] = timestamp + self.get_interval(symbol)
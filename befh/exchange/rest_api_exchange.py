@@ -1,11 +1,16 @@
+import importlib
+import json
 import logging
+import os
 from datetime import datetime
-from time import sleep
+from threading import Thread
+from time import sleep, time
 
 import ccxt
 from ccxt.base.errors import RequestTimeout, NetworkError, ExchangeError
 
 from .exchange import Exchange
+from .poll_scheduler import PollScheduler
 
 LOGGER = logging.getLogger(__name__)
 
@@ -14,33 +19,278 @@ class RestApiExchange(Exchange):
     """Rest API exchange.
     """
 
+    DEFAULT_MARKETS_CACHE_TTL = 86400
+    MARKETS_CACHE_RETRY_INTERVAL = 60
+
+    def __init__(self, **kwargs):
+        """Constructor.
+        """
+        super().__init__(**kwargs)
+        self._markets_cache = None
+        self._markets_cache_ttl = self.DEFAULT_MARKETS_CACHE_TTL
+        self._markets_cache_time = None
+        self._poll_min_interval = PollScheduler.DEFAULT_MIN_INTERVAL
+        self._poll_max_interval = PollScheduler.DEFAULT_MAX_INTERVAL
+        self._interface = None
+        self._interface_config = {}
+
+    @property
+    def markets_cache_path(self):
+        """Path of the markets cache file.
+        """
+        if self._markets_cache is None:
+            return None
+
+        return os.path.join(
+            self._markets_cache, '%s.json' % self._name.lower())
+
     def load(self, is_initialize_instmt=True, **kwargs):
         """Load.
         """
         super().load(**kwargs)
-        ccxt_exchange = getattr(ccxt, self._name.lower(), None)
-        if ccxt_exchange:          
-            self._exchange_interface = ccxt_exchange()
-            self._exchange_interface.load_markets()
+        assert self._instruments, (
+            "Instruments of exchange {} must not be empty".format(
+                self._name))
+        self._load_markets_cache()
+        self._load_poll_intervals()
+        self._load_interface()
+        ccxt_exchange = self._get_interface_class()
+        if ccxt_exchange:
+            self._exchange_interface = ccxt_exchange(self._interface_config)
+            self._load_markets()
             self._check_valid_instrument()
             if is_initialize_instmt:
                 self._initialize_instmt_info()
 
     def run(self):
         """Run.
+
+        The instruments are polled by the poll scheduler, which polls
+        the active instruments more often within the rate limit.
+        """
+        scheduler = PollScheduler(
+            symbols=list(self._instruments.keys()),
+            request_rate=1000.0 / self._exchange_interface.rateLimit,
+            min_interval=self._poll_min_interval,
+            max_interval=self._poll_max_interval)
+        self._start_markets_cache_refresh()
+
+        try:
+            while True:
+                symbol, poll_time = scheduler.next()
+                wait_second = min(
+                    poll_time,
+                    self._next_sample_time,
+                    self._next_bar_close_time) - time()
+                if wait_second > 0:
+                    sleep(wait_second)
+
+                self._update_samples()
+                self._close_bars()
+
+                if time() >= poll_time:
+                    self._poll(symbol=symbol, scheduler=scheduler)
+        finally:
+            self.close()
+
+    def _poll(self, symbol, scheduler):
+        """Poll the order book, and the trades if any trade is possible.
+        """
+        instmt_info = self._instruments[symbol]
+        request_count = 1
+        is_updated = self._update_order_book(
+            symbol=symbol,
+            instmt_info=instmt_info)
+
+        if instmt_info.is_possible_trade():
+            request_count += 1
+            self._update_trades(
+                symbol=symbol,
+                instmt_info=instmt_info)
+
+        scheduler.update(
+            symbol=symbol,
+            is_changed=is_updated,
+            request_count=request_count,
+            timestamp=time())
+
+    def _load_poll_intervals(self):
+        """Load poll_min_interval and poll_max_interval.
+        """
+        if 'poll_min_interval' in self._config:
+            self._poll_min_interval = self._config['poll_min_interval']
+            assert isinstance(self._poll_min_interval, (int, float)), (
+                "poll_min_interval ({}) must be a number".format(
+                    self._poll_min_interval))
+
+        if 'poll_max_interval' in self._config:
+            self._poll_max_interval = self._config['poll_max_interval']
+            assert isinstance(self._poll_max_interval, (int, float)), (
+                "poll_max_interval ({}) must be a number".format(
+                    self._poll_max_interval))
+
+    def _load_interface(self):
+        """Load interface and interface_config.
+        """
+        if 'interface' in self._config:
+            self._interface = self._config['interface']
+            assert isinstance(self._interface, str), (
+                "interface ({}) must be an string".format(
+                    self._interface))
+
+        if 'interface_config' in self._config:
+            self._interface_config = self._config['interface_config']
+            assert isinstance(self._interface_config, dict), (
+                "interface_config ({}) must be a dict".format(
+                    self._interface_config))
+
+    def _get_interface_class(self):
+        """Get the ccxt compatible class of the exchange interface.
+
+        :return: The class of the interface path, e.g.
+            "befh.testing.fake_ccxt_exchange.FakeCcxtExchange", or the
+            ccxt exchange of the name if the interface is not specified.
+        """
+        if self._interface is None:
+            return getattr(ccxt, self._name.lower(), None)
+
+        module_name, _, class_name = self._interface.rpartition('.')
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def _load_markets_cache(self):
+        """Load markets_cache and markets_cache_ttl.
+        """
+        if 'markets_cache' in self._config:
+            self._markets_cache = self._config['markets_cache']
+            assert isinstance(self._markets_cache, str), (
+                "markets_cache ({}) must be an string".format(
+                    self._markets_cache))
+
+        if 'markets_cache_ttl' in self._config:
+            self._markets_cache_ttl = self._config['markets_cache_ttl']
+            assert isinstance(self._markets_cache_ttl, (int, float)), (
+                "markets_cache_ttl ({}) must be a number".format(
+                    self._markets_cache_ttl))
+
+    def _load_markets(self):
+        """Load markets.
+
+        The markets are loaded from the cache file if it exists. The
+        cache is refreshed by the running exchange once it expires.
+        """
+        path = self.markets_cache_path
+        cache = self._read_markets_cache(path)
+
+        if cache is None:
+            self._exchange_interface.load_markets()
+            self._markets_cache_time = time()
+            self._write_markets_cache(path)
+            return
+
+        LOGGER.info('Loaded markets of exchange %s from cache %s',
+                    self._name, path)
+        self._exchange_interface.set_markets(
+            cache['markets'], cache.get('currencies'))
+        self._markets_cache_time = cache['timestamp']
+
+    def _start_markets_cache_refresh(self):
+        """Start refreshing the markets cache in a background thread.
+
+        The thread is started by the running exchange, which is a
+        separate process of the one loading the exchange, so that the
+        refreshed markets are used by the exchange polling them.
+        """
+        if self.markets_cache_path is None or self._markets_cache_time is None:
+            return
+
+        thread = Thread(target=self._refresh_markets_cache_loop, daemon=True)
+        thread.start()
+
+    def _refresh_markets_cache_loop(self):
+        """Refresh the markets cache whenever it expires, or retry
+        after MARKETS_CACHE_RETRY_INTERVAL seconds if it fails.
         """
         while True:
-            for symbol, instmt_info in self._instruments.items():
-                self._update_order_book(
-                    symbol=symbol,
-                    instmt_info=instmt_info)
+            wait_second = (
+                self._markets_cache_time + self._markets_cache_ttl - time())
+            if wait_second > 0:
+                sleep(wait_second)
+
+            try:
+                is_refreshed = self._refresh_markets_cache()
+            except Exception:
+                # Keep the thread alive on any other failure
+                LOGGER.exception(
+                    'Failed to refresh markets cache of exchange %s',
+                    self._name)
+                is_refreshed = False
 
-                if instmt_info.is_possible_trade():
-                    self._update_trades(
-                        symbol=symbol,
-                        instmt_info=instmt_info)
+            if not is_refreshed:
+                sleep(self.MARKETS_CACHE_RETRY_INTERVAL)
 
-                self._rotate_ordre_tables()
+    def _refresh_markets_cache(self):
+        """Refresh the markets and the cache file.
+
+        :return: `bool` indicating whether the markets are refreshed.
+        """
+        LOGGER.info('Refreshing markets cache of exchange %s', self._name)
+        try:
+            exchange_interface = self._exchange_interface.__class__(
+                self._interface_config)
+            exchange_interface.load_markets()
+        except (RequestTimeout, NetworkError, ExchangeError) as e:
+            LOGGER.warning('Cannot refresh markets of exchange %s (%s)',
+                           self._name, e)
+            return False
+
+        self._exchange_interface.set_markets(
+            exchange_interface.markets, exchange_interface.currencies)
+        self._markets_cache_time = time()
+        self._write_markets_cache(self.markets_cache_path)
+        return True
+
+    def _read_markets_cache(self, path):
+        """Read the markets cache file.
+
+        :return: `dict` of the cache, or None if it is not found.
+        """
+        if path is None or not os.path.isfile(path):
+            return None
+
+        try:
+            with open(path, 'r') as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError) as e:
+            LOGGER.warning('Cannot read markets cache %s (%s)', path, e)
+            return None
+
+    def _write_markets_cache(self, path):
+        """Write the markets cache file.
+
+        The file is replaced atomically, so that a concurrent reader
+        never reads a partial file.
+        """
+        if path is None:
+            return
+
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+            with open(temp_path, 'w') as cache_file:
+                json.dump({
+                    'timestamp': self._markets_cache_time,
+                    'markets': self._exchange_interface.markets,
+                    'currencies': self._exchange_interface.currencies,
+                }, cache_file)
+
+            os.replace(temp_path, path)
+        except OSError as e:
+            LOGGER.warning('Cannot write markets cache %s (%s)', path, e)
+
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
 
     def _check_valid_instrument(self):
         """Check valid instrument.
@@ -67,6 +317,8 @@ class RestApiExchange(Exchange):
 
     def _update_order_book(self, symbol, instmt_info, is_update_handler=True):
         """Callback order book.
+
+        :return: `bool` indicating whether the order book is updated.
         """
         tolerence_count = 0
         order_book = None
@@ -89,16 +341,17 @@ class RestApiExchange(Exchange):
         bids = order_book['bids']
         asks = order_book['asks']
 
+        # Sample the order book before the update if the sampling time
+        # is passed during the request
+        self._update_samples()
         is_updated = instmt_info.update_bids_asks(
             bids=bids,
             asks=asks)
 
-        if not is_updated:
-            return
+        if is_updated and is_update_handler and not self._is_sample_only:
+            instmt_info.update_table(handler=self._dispatcher)
 
-        if is_update_handler:
-            for handler in self._handlers.values():
-                instmt_info.update_table(handler=handler)
+        return is_updated
 
     def _update_trades(self, symbol, instmt_info, is_update_handler=True):
         """Update trades.
@@ -127,33 +380,16 @@ class RestApiExchange(Exchange):
                 continue
 
             if is_update_handler:
-                for handler in self._handlers.values():
-                    instmt_info.update_table(handler=handler)
-
-    def _rotate_ordre_tables(self):
-        """Rotate order table.
-        """
-        for name, handler in self._handlers.items():
-            if not handler.is_rotate:
-                continue
-
-            current_timestamp = datetime.utcnow()
-            if handler.should_rotate(current_timestamp):
-                for instmt_info in self._instruments.values():
-                    handler.rotate_table(
-                        table=instmt_info,
-                        last_datetime=handler.last_rotated_timestamp)
-
-                handler.update_last_rotate_timestamp(current_timestamp)
+                instmt_info.update_table(handler=self._dispatcher)
 
     def _load_balance(self):
         """Load balance.
         """
         current_time = datetime.now()
         time_diff = (current_time -
-                     self._last_request_time).microseconds / 1000.0
+                     self._last_request_time).total_seconds() * 1000.0
 
-        # Rate limit is represented as microseconds,
+        # Rate limit is represented as milliseconds,
         # number of requests per seconds = 1000 / rateLimit
         if time_diff < self._exchange_interface.rateLimit:
             wait_second = (
@@ -1,12 +1,15 @@
+import asyncio
 import logging
 from datetime import datetime
 import re
+from time import time
 
 from cryptofeed import FeedHandler
 from cryptofeed.defines import L2_BOOK, TRADES, BID, ASK
 from cryptofeed.callback import BookCallback, TradeCallback
 import cryptofeed.exchanges as cryptofeed_exchanges
 
+from .event_loop import EVENT_LOOPS, create_event_loop, tune_gc
 from .rest_api_exchange import RestApiExchange
 
 LOGGER = logging.getLogger(__name__)
@@ -18,27 +21,54 @@ class WebsocketExchange(RestApiExchange):
     """Websocket exchange.
     """
 
+    # Feeds sending the instrument name instead of the normalized name
+    INSTRUMENT_NAME_FEEDS = ('HUOBI_DM',)
+
     def __init__(self, **kwargs):
         """Constructor.
         """
         super().__init__(**kwargs)
         self._feed_handler = None
+        self._feed_class = None
         self._instrument_mapping = None
+        self._routes = None
+        self._event_loop = None
+        self._gc_threshold = None
+        self._is_gc_freeze = False
+        self._websocket_address = None
 
-    def load(self, **kwargs):
+    def load(self, is_load_feed=True, **kwargs):
         """Load.
+
+        :param is_load_feed: `bool` indicating whether to load the feed,
+            which is otherwise loaded by `load_feed` in the main thread.
         """
         super().load(is_initialize_instmt=False, **kwargs)
-        self._feed_handler = FeedHandler()
+        self._load_event_loop()
+        self._load_websocket_address()
         self._instrument_mapping = self._create_instrument_mapping()
         try:
-            exchange = getattr(
+            self._feed_class = getattr(
                 cryptofeed_exchanges,
                 self._get_exchange_name(self._name))
         except AttributeError as e:
             raise ImportError(
                 'Cannot load exchange %s from websocket' % self._name)
 
+        self._routes = self._create_routes(self._feed_class.id)
+
+        if is_load_feed:
+            self.load_feed()
+
+    def load_feed(self):
+        """Load the feed handler and the feed of the exchange.
+
+        The feeds of cryptofeed are bound to the event loop of the
+        thread, so they are loaded in the main thread.
+        """
+        exchange = self._feed_class
+        self._feed_handler = FeedHandler()
+
         if self._is_orders:                       
             channels = [TRADES, L2_BOOK]            
             callbacks = {
@@ -52,21 +82,101 @@ class WebsocketExchange(RestApiExchange):
             }            
 
         if self._name.lower() == 'poloniex':
-            self._feed_handler.add_feed(
-                exchange(
-                    channels=list(self._instrument_mapping.keys()),
-                    callbacks=callbacks))
+            feed = exchange(
+                channels=list(self._instrument_mapping.keys()),
+                callbacks=callbacks)
         else:
-            self._feed_handler.add_feed(
-                exchange(
-                    symbols=list(self._instrument_mapping.keys()),
-                    channels=channels,
-                    callbacks=callbacks))
+            feed = exchange(
+                symbols=list(self._instrument_mapping.keys()),
+                channels=channels,
+                callbacks=callbacks)
+
+        if self._websocket_address is not None:
+            LOGGER.info('Connecting exchange %s to %s',
+                        self._name, self._websocket_address)
+            feed.address = self._websocket_address
+
+        self._feed_handler.add_feed(feed)
 
     def run(self):
         """Run.
         """
-        self._feed_handler.run()
+        if self._event_loop is not None:
+            create_event_loop(self._event_loop)
+
+        tune_gc(threshold=self._gc_threshold, is_freeze=self._is_gc_freeze)
+
+        if self._sample_interval is not None:
+            self._schedule_sample(asyncio.get_event_loop())
+
+        if self._next_bar_close_time < float('inf'):
+            self._schedule_bar_close(asyncio.get_event_loop())
+
+        self._start_markets_cache_refresh()
+
+        try:
+            self._feed_handler.run()
+        finally:
+            self.close()
+
+    def _load_event_loop(self):
+        """Load event_loop, gc_threshold and gc_freeze.
+        """
+        if 'event_loop' in self._config:
+            self._event_loop = self._config['event_loop']
+            assert self._event_loop in EVENT_LOOPS, (
+                "event_loop ({}) must be one of {}".format(
+                    self._event_loop, EVENT_LOOPS))
+
+        if 'gc_threshold' in self._config:
+            self._gc_threshold = self._config['gc_threshold']
+            assert (isinstance(self._gc_threshold, list) and
+                    0 < len(self._gc_threshold) <= 3), (
+                "gc_threshold ({}) must be a list of at most 3 "
+                "integers".format(self._gc_threshold))
+
+        if 'gc_freeze' in self._config:
+            self._is_gc_freeze = self._config['gc_freeze']
+            assert isinstance(self._is_gc_freeze, bool), (
+                "gc_freeze ({}) must be an boolean".format(
+                    self._is_gc_freeze))
+
+    def _load_websocket_address(self):
+        """Load websocket_address.
+        """
+        if 'websocket_address' in self._config:
+            self._websocket_address = self._config['websocket_address']
+            assert isinstance(self._websocket_address, str), (
+                "websocket_address ({}) must be an string".format(
+                    self._websocket_address))
+
+    def _schedule_sample(self, loop):
+        """Schedule the next order book sampling in the event loop.
+        """
+        loop.call_later(
+            max(self._next_sample_time - time(), 0),
+            self._sample_callback,
+            loop)
+
+    def _sample_callback(self, loop):
+        """Sample callback.
+        """
+        self._update_samples()
+        self._schedule_sample(loop)
+
+    def _schedule_bar_close(self, loop):
+        """Schedule the next closing of the bars in the event loop.
+        """
+        loop.call_later(
+            max(self._next_bar_close_time - time(), 0),
+            self._bar_close_callback,
+            loop)
+
+    def _bar_close_callback(self, loop):
+        """Bar close callback.
+        """
+        self._close_bars()
+        self._schedule_bar_close(loop)
 
     @staticmethod
     def _get_exchange_name(name):
@@ -107,28 +217,52 @@ class WebsocketExchange(RestApiExchange):
 
         return mapping
 
+    def _create_routes(self, feed):
+        """Create the routes of the callbacks.
+
+        :param feed: `str` of the feed id passed to the callbacks.
+        :return: `dict` of the feed id and the pair passed to the
+            callbacks to the order book of the instrument.
+        """
+        routes = {}
+
+        for normalized_name, name in self._instrument_mapping.items():
+            if name in self._instruments:
+                instrument_key = name
+            else:
+                instrument_key = normalized_name + ':' + name
+
+            if feed in self.INSTRUMENT_NAME_FEEDS:
+                pair = name
+            else:
+                pair = normalized_name
+
+            routes[feed, pair] = self._instruments[instrument_key]
+
+        return routes
+
     def _update_order_book_callback(self, feed, pair, book, timestamp, receipt_timestamp):
         """Update order book callback.
         """
-        instrument_key = self._get_instrument_key(feed, pair)
-            
-        instmt_info = self._instruments[instrument_key]
-        
+        instmt_info = self._routes[feed, pair]
+        # Sample the order books before the update if the sampling
+        # callback is not yet run after the sampling time
+        self._update_samples()
         is_updated = instmt_info.websocket_update_bids_asks(
             bids=book[BID],
             asks=book[ASK])
 
-        if not is_updated:
+        if (not is_updated or self._is_sample_only or
+                not instmt_info.is_book_update_recorded):
             return
-        
+
+        instmt_info.update_table(handler=self._dispatcher)
 
     def _update_trade_callback(
             self, feed, pair, order_id, timestamp, side, amount, price, receipt_timestamp):
         """Update trade callback.
         """
-        instrument_key = self._get_instrument_key(feed, pair)
-            
-        instmt_info = self._instruments[instrument_key]
+        instmt_info = self._routes[feed, pair]
         trade = {}
 
         if isinstance(timestamp, str):
@@ -145,16 +279,14 @@ class WebsocketExchange(RestApiExchange):
         trade['id'] = order_id
         trade['price'] = float(price)
         trade['amount'] = float(amount)
+        trade['side'] = side
 
         current_timestamp = datetime.utcnow()
 
         if not instmt_info.update_trade(trade, current_timestamp):
             return
 
-        for handler in self._handlers.values():
-            instmt_info.update_table(handler=handler)
-
-        self._rotate_ordre_tables()
+        instmt_info.update_table(handler=self._dispatcher)
 
     def _check_valid_instrument(self):
         """Check valid instrument.
@@ -170,17 +302,3 @@ class WebsocketExchange(RestApiExchange):
                 raise RuntimeError(
                     'Instrument %s is not found in exchange %s',
                     instrument_code, self._name)
-            
-            
-    def _get_instrument_key(self, feed, pair):
-        
-        instruments_check_map_value = ['HUOBI_DM']
-        if feed in instruments_check_map_value:
-            for k,v in self._instrument_mapping.items():
-                if pair == v:
-                    instrument_key = k + ':' + v
-                    break
-        else:
-            instrument_key = self._instrument_mapping[pair]  
-            
-        return instrument_key
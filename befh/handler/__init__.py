@@ -1,3 +1,25 @@
-# flake8: noqa
-from .sql_handler import SqlHandler
-from .zmq_handler import ZmqHandler
+from importlib import import_module
+
+# The handlers are imported on first access, so that the dependencies
+# of the unused handlers, e.g. sqlalchemy and zmq, are not imported
+HANDLER_MODULES = {
+    'SqlHandler': '.sql_handler',
+    'SharedMemoryHandler': '.shared_memory_handler',
+    'ZmqHandler': '.zmq_handler',
+}
+
+
+def __getattr__(name):
+    """Import the handler lazily.
+    """
+    if name not in HANDLER_MODULES:
+        raise AttributeError(
+            'module %s has no attribute %s' % (__name__, name))
+
+    return getattr(import_module(HANDLER_MODULES[name], __name__), name)
+
+
+def __dir__():
+    """Attributes of the module.
+    """
+    return sorted(list(globals().keys()) + list(HANDLER_MODULES.keys()))
@@ -1,5 +1,8 @@
 import logging
+import multiprocessing as mp
+import os
 from time import sleep
+from zlib import crc32
 
 from .handler_operator import (
     HandlerOperator,
@@ -8,6 +11,7 @@ from .handler_operator import (
     HandlerRenameTableOperator,
     HandlerCloseOperator,
 )
+from .spill_queue import SpillQueue
 
 LOGGER = logging.getLogger(__name__)
 
@@ -17,16 +21,69 @@ class Handler:
     """
 
     MAXIMUM_FAILURE_TOLERANCE = 2
+    CONTROL_LANE = 'control'
+    TRADE_LANE = 'trade'
+    BOOK_LANE = 'book'
+    # Lanes in the order of priority
+    LANES = (CONTROL_LANE, TRADE_LANE, BOOK_LANE)
+    DEFAULT_LANE_BATCH_SIZES = {
+        CONTROL_LANE: 1000,
+        TRADE_LANE: 10000,
+        BOOK_LANE: 1000,
+    }
+    BOOK_TABLE_SUFFIXES = ('_order', '_delta')
 
     def __init__(self, is_debug, is_cold,
-                 batch_frequency=1):
+                 batch_frequency=1, workers=1, spill_path=None,
+                 spill_threshold=SpillQueue.DEFAULT_THRESHOLD,
+                 spill_segment_size=SpillQueue.DEFAULT_SEGMENT_SIZE,
+                 is_priority_lanes=False, lane_batch_sizes=None):
         """Constructor.
+
+        :param workers: `int` of the number of writer processes. The
+            tables are hash partitioned across the workers so that
+            the order within a table is preserved.
+        :param spill_path: `str` of the directory of the segment files
+            spilling the backlog of the workers. The backlog is kept
+            in memory if not specified.
+        :param spill_threshold: `int` of the number of operators in
+            memory before spilling to disk.
+        :param spill_segment_size: `int` of the bytes of a segment
+            file.
+        :param is_priority_lanes: `bool` indicating whether to queue
+            the operators of each worker in the lanes of control
+            operators, trades and order book updates, which are
+            executed in the order of priority.
+        :param lane_batch_sizes: `dict` of the lane to the maximum
+            number of its operators executed in a batch, overriding
+            `DEFAULT_LANE_BATCH_SIZES`.
         """
+        assert isinstance(workers, int) and workers > 0, (
+            "Workers ({}) must be a positive integer".format(workers))
+        lane_batch_sizes = dict(
+            self.DEFAULT_LANE_BATCH_SIZES, **(lane_batch_sizes or {}))
+        assert set(lane_batch_sizes.keys()) == set(self.LANES), (
+            "Lane batch sizes ({}) must be of the lanes {}".format(
+                lane_batch_sizes, self.LANES))
+        assert all(isinstance(size, int) and size > 0
+                   for size in lane_batch_sizes.values()), (
+            "Lane batch sizes ({}) must be positive integers".format(
+                lane_batch_sizes))
         self._is_debug = is_debug
         self._is_cold = is_cold
         self._batch_frequency = batch_frequency
+        self._workers = workers
+        self._spill_path = spill_path
+        self._spill_threshold = spill_threshold
+        self._spill_segment_size = spill_segment_size
+        self._is_priority_lanes = is_priority_lanes
+        self._lane_batch_sizes = lane_batch_sizes
+        self._worker = 0
         self._is_running = False
         self._queue = None
+        self._queues = []
+        self._lane_queues = []
+        self._close_element = None
 
     @property
     def is_rotate(self):
@@ -40,16 +97,82 @@ class Handler:
         """
         return self._queue
 
-    def load(self, queue):
+    @property
+    def queues(self):
+        """Queues, one per worker.
+
+        They are the control lanes if the priority lanes are enabled.
+        """
+        return self._queues
+
+    @property
+    def lane_queues(self):
+        """`dict` of the lane to the queue, one per worker, if the
+        priority lanes are enabled.
+        """
+        return self._lane_queues
+
+    @property
+    def workers(self):
+        """Number of workers.
+        """
+        return self._workers
+
+    def load(self, queue_factory=mp.Queue):
         """Load.
+
+        :param queue_factory: Callable returning a new queue. One
+            queue is created for each worker.
         """
         LOGGER.info('Loading handler %s', self.__class__.__name__)
-        self._queue = queue
+        if self._is_priority_lanes:
+            self._lane_queues = [
+                {lane: queue_factory() for lane in self.LANES}
+                for _ in range(self._workers)]
+            self._queues = [
+                lane_queues[self.CONTROL_LANE]
+                for lane_queues in self._lane_queues]
+        else:
+            self._queues = [queue_factory() for _ in range(self._workers)]
+
+        self._queue = self._queues[0]
+
+    def get_worker(self, table_name):
+        """Get the index of the worker writing the table.
+        """
+        if self._workers == 1:
+            return 0
+
+        table_name = HandlerOperator.parse_table_name(table_name)
+        return crc32(table_name.encode('utf-8')) % self._workers
+
+    def get_queue(self, table_name, lane=CONTROL_LANE):
+        """Get the queue of the worker writing the table.
+
+        :param lane: `str` of the lane, which is ignored if the
+            priority lanes are not enabled.
+        """
+        if self._is_priority_lanes:
+            return self._lane_queues[self.get_worker(table_name)][lane]
+
+        return self._queues[self.get_worker(table_name)]
+
+    def get_lane(self, table_name):
+        """Get the lane of the rows of the table.
+        """
+        if table_name.endswith(self.BOOK_TABLE_SUFFIXES):
+            return self.BOOK_LANE
+
+        return self.TRADE_LANE
 
     def prepare_create_table(self, table_name, fields, **kwargs):
         """Prepare create table.
+
+        The table is created in the lane of its rows, so that it is
+        created before the rows are inserted.
         """
-        self._queue.put(HandlerCreateTableOperator(
+        queue = self.get_queue(table_name, lane=self.get_lane(table_name))
+        queue.put(HandlerCreateTableOperator(
             table_name=table_name,
             fields=fields,
             **kwargs))
@@ -64,11 +187,36 @@ class Handler:
     def prepare_insert(self, table_name, fields, **kwargs):
         """Prepare insert.
         """
-        self._queue.put(HandlerInsertOperator(
+        queue = self.get_queue(table_name, lane=self.get_lane(table_name))
+        queue.put(HandlerInsertOperator(
             table_name=table_name,
             fields=fields,
             **kwargs))
 
+    def prepare_encoded(self, table_name, data):
+        """Prepare the operator encoded by `HandlerOperator.encode`.
+        """
+        self.get_encoded_target(table_name)(data)
+
+    def get_encoded_target(self, table_name):
+        """Get the target of the encoded operators of the table.
+
+        :return: Callable taking the bytes encoded by
+            `HandlerOperator.encode`, which is bound once by the
+            dispatcher and called on every operator of the table.
+        """
+        return self.get_queue(
+            table_name, lane=self.get_lane(table_name)).put
+
+    def get_operator_target(self, table_name):
+        """Get the target of the operators of the table executed in
+        the process preparing them.
+
+        :return: Callable taking the `HandlerOperator`, or None if the
+            operators are only put into the queue.
+        """
+        return None
+
     def insert(self, **kwargs):
         """Insert.
         """
@@ -80,8 +228,12 @@ class Handler:
             self, from_name, to_name, fields=None,
             keep_table=True, **kwargs):
         """Prepare rename table.
+
+        The table is renamed in the lane of its rows, so that the rows
+        queued before are inserted before the rename.
         """
-        self._queue.put(HandlerRenameTableOperator(
+        queue = self.get_queue(from_name, lane=self.get_lane(from_name))
+        queue.put(HandlerRenameTableOperator(
             from_name=from_name,
             to_name=to_name,
             fields=fields,
@@ -95,6 +247,17 @@ class Handler:
             'Not implemented on handler %s' %
             self.__class__.__name__)
 
+    def get_archive_tasks(self, table_names, date):
+        """Get the tasks archiving the tables of the date.
+
+        :param table_names: `list` of the table names.
+        :param date: `datetime` of the date.
+        :return: `list` of `dict` of the keyword arguments of
+            `befh.handler.sql_archive.archive_table`. The handler does
+            not archive any table by default.
+        """
+        return []
+
     def update_order_book(self, exchange, symbol, bids, asks):
         """Update order book.
         """
@@ -109,47 +272,185 @@ class Handler:
             'Not implemented on exchange %s' %
             self.__class__.__name__)
 
-    def run(self):
+    def run(self, worker=0):
         """Run.
+
+        :param worker: `int` of the worker index. Only the queue of
+            the worker is consumed.
         """
-        LOGGER.info('Running %s', self.__class__.__name__)
+        LOGGER.info('Running %s (worker %d)',
+                    self.__class__.__name__, worker)
 
+        self._worker = worker
+        self._queue = self._queues[worker]
         self._is_running = True
 
+        if self._is_priority_lanes:
+            self._run_lanes(worker)
+            return
+
+        if self._spill_path is not None:
+            self._queue = self._create_spill_queue(
+                source=self._queue,
+                name='%s_%d' % (self.__class__.__name__.lower(), worker))
+
         while self._is_running:
             while not self._queue.empty():
                 element = self._queue.get()
-                assert isinstance(element, HandlerOperator), (
-                    "Element type is not handler operator (%s)" % (
-                        element.__class__.__name__))
-
-                failure_count = 0
-
-                while failure_count < self.MAXIMUM_FAILURE_TOLERANCE:
-                    try:
-                        element.execute(handler=self)
-                        break
-                    except Exception as exception:
-                        failure_count += 1
-                        if not self._should_rerun(element, exception):
-                            # If the command should fail, the exception
-                            # is raised within the method; otherwise
-                            # it is the case that whether to rerun
-                            break
-
-                        LOGGER.warning(
-                            'Element will be executed again due to the '
-                            'failure with count %d', failure_count)
+                self.execute(element)
 
+            self._flush_queues([self._queue])
             sleep(self._batch_frequency)
 
+        if self._spill_path is not None:
+            self._queue.stop()
+
         LOGGER.info('Completed running  %s', self.__class__.__name__)
 
+    def _run_lanes(self, worker):
+        """Run the priority lanes of the worker.
+
+        Each batch takes at most the batch size of operators from each
+        lane in the order of priority, and is flushed before the next
+        batch, so that the trades are not held behind the backlog of
+        the order book updates. The close operator is deferred until
+        all the lanes are drained.
+        """
+        lanes = [
+            (lane, self._lane_queues[worker][lane],
+             self._lane_batch_sizes[lane])
+            for lane in self.LANES]
+
+        if self._spill_path is not None:
+            lanes = [
+                (lane, self._create_spill_queue(
+                    source=queue,
+                    name='%s_%d_%s' % (
+                        self.__class__.__name__.lower(), worker, lane)),
+                 batch_size)
+                for lane, queue, batch_size in lanes]
+
+        queues = [queue for _, queue, _ in lanes]
+
+        while self._is_running:
+            while self._execute_lanes(lanes):
+                self._flush_queues(queues)
+
+            if self._close_element is not None:
+                self.execute(self._close_element)
+                self._close_element = None
+                continue
+
+            self._flush_queues(queues)
+            sleep(self._batch_frequency)
+
+        if self._spill_path is not None:
+            for queue in queues:
+                queue.stop()
+
+        LOGGER.info('Completed running  %s', self.__class__.__name__)
+
+    def _execute_lanes(self, lanes):
+        """Execute a batch of the operators in the lanes.
+
+        :param lanes: `list` of the lane, the queue and the batch size
+            in the order of priority.
+        :return: `int` of the number of operators taken.
+        """
+        count = 0
+
+        for lane, queue, batch_size in lanes:
+            for _ in range(batch_size):
+                if queue.empty():
+                    break
+
+                element = queue.get()
+                count += 1
+
+                if lane == self.CONTROL_LANE:
+                    if isinstance(element, bytes):
+                        element = HandlerOperator.decode(element)
+
+                    if isinstance(element, HandlerCloseOperator):
+                        self._close_element = element
+                        continue
+
+                self.execute(element)
+
+        return count
+
+    def _flush_queues(self, queues):
+        """Flush the handler and commit the operators taken from the
+        spill queues.
+
+        :param queues: `list` of the queues consumed by the worker.
+        """
+        self.flush()
+
+        if self._spill_path is not None:
+            for queue in queues:
+                queue.commit()
+
+    def _create_spill_queue(self, source, name):
+        """Create and start the queue spilling the source queue.
+
+        :param name: `str` of the directory name of the segments.
+        """
+        spill_queue = SpillQueue(
+            source=source,
+            path=os.path.join(self._spill_path, name),
+            threshold=self._spill_threshold,
+            segment_size=self._spill_segment_size)
+        spill_queue.start()
+        return spill_queue
+
+    def execute(self, element):
+        """Execute the handler operator.
+
+        :param element: `HandlerOperator` or the bytes encoded by
+            `HandlerOperator.encode`.
+        """
+        if isinstance(element, bytes):
+            element = HandlerOperator.decode(element)
+
+        assert isinstance(element, HandlerOperator), (
+            "Element type is not handler operator (%s)" % (
+                element.__class__.__name__))
+
+        failure_count = 0
+
+        while failure_count < self.MAXIMUM_FAILURE_TOLERANCE:
+            try:
+                element.execute(handler=self)
+                break
+            except Exception as exception:
+                failure_count += 1
+                if not self._should_rerun(element, exception):
+                    # If the command should fail, the exception
+                    # is raised within the method; otherwise
+                    # it is the case that whether to rerun
+                    break
+
+                LOGGER.warning(
+                    'Element will be executed again due to the '
+                    'failure with count %d', failure_count)
+
+    def flush(self, force=False):
+        """Flush the operations buffered in the handler.
+
+        It is called after each batch is drained from the queue.
+
+        :param force: `bool` indicating whether to flush regardless
+            of the flush thresholds.
+        """
+        pass
+
     def prepare_close(self):
         """Close.
         """
         LOGGER.debug('Publishing close operator')
-        self._queue.put(HandlerCloseOperator())
+        for queue in self._queues:
+            queue.put(HandlerCloseOperator())
 
     def close(self):
         """Close.
@@ -0,0 +1,95 @@
+from .handler_operator import (
+    HandlerCreateTableOperator,
+    HandlerInsertOperator,
+)
+
+
+class HandlerDispatcher:
+    """Handler dispatcher.
+
+    The dispatcher prepares the operators in the same way as a handler,
+    but encodes each operator once and puts the same bytes into the
+    queue of every handler, so that the cost of encoding does not grow
+    with the number of handlers. The targets of each table are bound
+    when the table is created, so that an insert only looks up the
+    table name. The handlers executing the operators in process, e.g.
+    the shared memory handler, receive the operator without encoding.
+    """
+
+    def __init__(self, handlers):
+        """Constructor.
+
+        :param handlers: `dict` of the handlers.
+        """
+        self._handlers = list(handlers.values())
+        self._targets = {}
+
+    @property
+    def handlers(self):
+        """Handlers.
+        """
+        return self._handlers
+
+    def prepare_create_table(self, table_name, fields, **kwargs):
+        """Prepare create table.
+        """
+        self._dispatch(
+            table_name=table_name,
+            operator=HandlerCreateTableOperator(
+                table_name=table_name,
+                fields=fields,
+                **kwargs))
+
+    def prepare_insert(self, table_name, fields, **kwargs):
+        """Prepare insert.
+        """
+        self._dispatch(
+            table_name=table_name,
+            operator=HandlerInsertOperator(
+                table_name=table_name,
+                fields=fields,
+                **kwargs))
+
+    def get_targets(self, table_name):
+        """Get the targets of the table in the handlers.
+
+        :return: `tuple` of the `list` of the callables taking the
+            encoded operator and the `list` of the callables taking
+            the operator.
+        """
+        targets = self._targets.get(table_name)
+
+        if targets is None:
+            encoded_targets = [
+                handler.get_encoded_target(table_name)
+                for handler in self._handlers]
+            operator_targets = [
+                handler.get_operator_target(table_name)
+                for handler in self._handlers]
+            targets = (
+                [target for target in encoded_targets if target is not None],
+                [target for target in operator_targets if target is not None])
+            self._targets[table_name] = targets
+
+        return targets
+
+    def _dispatch(self, table_name, operator):
+        """Encode the operator and put it into the handler queues.
+        """
+        targets = self._targets.get(table_name)
+
+        if targets is None:
+            targets = self.get_targets(table_name)
+
+        encoded_targets, operator_targets = targets
+
+        for target in operator_targets:
+            target(operator)
+
+        if not encoded_targets:
+            return
+
+        data = operator.encode()
+
+        for target in encoded_targets:
+            target(data)
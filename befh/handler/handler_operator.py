@@ -1,3 +1,7 @@
+from datetime import datetime
+import pickle
+
+
 class HandlerOperator:
     """Handler operator.
     """
@@ -8,11 +12,39 @@ class HandlerOperator:
         self.allow_fail = allow_fail
         self.should_rerun = should_rerun
 
+    @property
+    def date_time(self):
+        """`datetime` of the row of the operator, or None if the
+        operator does not insert a row.
+        """
+        return None
+
+    @property
+    def table_name(self):
+        """`str` of the table of the row of the operator, or None if the
+        operator does not insert a row.
+        """
+        return None
+
     def execute(self, handler):
         """Execute.
         """
         raise NotImplementedError(
             'Execute is not implemented')
+
+    def encode(self):
+        """Encode the operator into bytes.
+
+        The fields are encoded at once, so that the later updates of
+        the fields are not captured by the queue.
+        """
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def decode(data):
+        """Decode the operator from bytes.
+        """
+        return pickle.loads(data)
     
     @staticmethod
     def parse_table_name(table_name):
@@ -62,6 +94,24 @@ class HandlerInsertOperator(HandlerOperator):
         self._table_name = self.parse_table_name(table_name)
         self._fields = fields
 
+    @property
+    def table_name(self):
+        """Table name of the row.
+        """
+        return self._table_name
+
+    @property
+    def date_time(self):
+        """`datetime` of the row, or None if the row does not have the
+        date_time field.
+        """
+        field = self._fields.get('date_time')
+
+        if field is None or not isinstance(field.value, datetime):
+            return None
+
+        return field.value
+
     def execute(self, handler):
         """Execute.
         """
@@ -0,0 +1,187 @@
+import csv
+from datetime import datetime
+from decimal import Decimal
+from io import BytesIO, StringIO
+import struct
+
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    Float,
+    Integer,
+    Numeric,
+    SmallInteger,
+    String,
+    TypeDecorator)
+
+BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+BINARY_TRAILER = struct.pack('!h', -1)
+CSV_NULL = '\\N'
+
+POSTGRES_EPOCH = datetime(2000, 1, 1)
+NUMERIC_POSITIVE = 0x0000
+NUMERIC_NEGATIVE = 0x4000
+NUMERIC_NAN = 0xC000
+
+
+def create_copy_statement(table_name, column_names, copy_format):
+    """Create the COPY FROM STDIN statement.
+
+    :param table_name: `str` of the quoted table name.
+    :param column_names: `list` of the quoted column names.
+    :param copy_format: `str` of either "csv" or "binary".
+    """
+    if copy_format == 'binary':
+        options = 'FORMAT binary'
+    elif copy_format == 'csv':
+        options = "FORMAT csv, NULL '%s'" % CSV_NULL
+    else:
+        raise NotImplementedError(
+            'Copy format %s is not implemented' % copy_format)
+
+    return (
+        'COPY {table_name} ({column_names}) FROM STDIN '
+        'WITH ({options})').format(
+        table_name=table_name,
+        column_names=','.join(column_names),
+        options=options)
+
+
+def encode_csv(rows, column_names):
+    """Encode the rows into the CSV format of COPY.
+
+    :param rows: `list` of `dict` mapping the column name to value.
+    :param column_names: `list` of the column names.
+    :return: `StringIO` of the encoded rows.
+    """
+    data = StringIO()
+    writer = csv.writer(data, lineterminator='\n')
+
+    for row in rows:
+        writer.writerow([
+            CSV_NULL if row[name] is None else row[name]
+            for name in column_names])
+
+    data.seek(0)
+    return data
+
+
+def encode_binary(rows, columns):
+    """Encode the rows into the binary format of COPY.
+
+    :param rows: `list` of `dict` mapping the column name to value.
+    :param columns: `list` of SQLAlchemy `Column` in the copy order.
+    :return: `BytesIO` of the encoded rows.
+    """
+    encoders = [(column.name, get_binary_encoder(column.type))
+                for column in columns]
+    field_count = struct.pack('!h', len(encoders))
+
+    data = BytesIO()
+    data.write(BINARY_HEADER)
+
+    for row in rows:
+        data.write(field_count)
+        for name, encoder in encoders:
+            value = row[name]
+            if value is None:
+                data.write(struct.pack('!i', -1))
+            else:
+                value = encoder(value)
+                data.write(struct.pack('!i', len(value)))
+                data.write(value)
+
+    data.write(BINARY_TRAILER)
+    data.seek(0)
+    return data
+
+
+def get_binary_encoder(column_type):
+    """Get the binary encoder of the SQLAlchemy column type.
+    """
+    if isinstance(column_type, TypeDecorator):
+        # Variants of the dialects are encoded as the generic type
+        column_type = column_type.impl
+
+    if isinstance(column_type, BigInteger):
+        return struct.Struct('!q').pack
+    elif isinstance(column_type, SmallInteger):
+        return struct.Struct('!h').pack
+    elif isinstance(column_type, Integer):
+        return struct.Struct('!i').pack
+    elif isinstance(column_type, Float):
+        return struct.Struct('!d').pack
+    elif isinstance(column_type, Numeric):
+        scale = column_type.scale
+        return lambda value: encode_numeric(value, scale)
+    elif isinstance(column_type, DateTime):
+        return encode_timestamp
+    elif isinstance(column_type, String):
+        return lambda value: str(value).encode('utf-8')
+
+    raise NotImplementedError(
+        'Binary copy of column type %s is not implemented' % column_type)
+
+
+def encode_timestamp(value):
+    """Encode the timestamp as microseconds since 2000-01-01.
+    """
+    delta = value - POSTGRES_EPOCH
+    return struct.pack(
+        '!q',
+        (delta.days * 86400 + delta.seconds) * 1000000 +
+        delta.microseconds)
+
+
+def encode_numeric(value, scale=None):
+    """Encode the numeric in base 10000 digits.
+
+    :param value: `float`, `int` or `Decimal`.
+    :param scale: `int` of the decimal places of the column.
+    """
+    if not isinstance(value, Decimal):
+        value = Decimal(repr(value))
+
+    if value.is_nan():
+        return struct.pack('!hhHh', 0, 0, NUMERIC_NAN, 0)
+
+    sign = NUMERIC_NEGATIVE if value < 0 else NUMERIC_POSITIVE
+    value = abs(value)
+
+    if scale is not None:
+        value = value.quantize(Decimal(1).scaleb(-scale))
+
+    _, digits, exponent = value.as_tuple()
+    digits = ''.join(str(d) for d in digits)
+    dscale = max(0, -exponent)
+
+    if exponent >= 0:
+        integer_part = digits + '0' * exponent
+        fraction_part = ''
+    else:
+        point = len(digits) + exponent
+        integer_part = digits[:max(point, 0)]
+        fraction_part = '0' * max(-point, 0) + digits[max(point, 0):]
+
+    integer_part = integer_part.zfill((len(integer_part) + 3) // 4 * 4)
+    fraction_part = fraction_part.ljust((len(fraction_part) + 3) // 4 * 4, '0')
+
+    groups = [int(integer_part[i:i + 4])
+              for i in range(0, len(integer_part), 4)]
+    weight = len(groups) - 1
+    groups += [int(fraction_part[i:i + 4])
+               for i in range(0, len(fraction_part), 4)]
+
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+
+    while groups and groups[-1] == 0:
+        groups.pop()
+
+    if not groups:
+        weight = 0
+
+    return struct.pack(
+        '!hhHh%dh' % len(groups),
+        len(groups), weight, sign, dscale, *groups)
@@ -1,7 +1,10 @@
-from datetime import datetime
+from calendar import timegm
+from collections import OrderedDict
+from datetime import datetime, timedelta
 import logging
 
 from .handler import Handler
+from .handler_operator import HandlerOperator, HandlerRenameTableOperator
 
 LOGGER = logging.getLogger(__name__)
 
@@ -19,6 +22,9 @@ class RotateHandler(Handler):
         self._is_rotate = is_rotate
         self._rotate_frequency = rotate_frequency
         self._last_rotated_timestamp = None
+        self._rotate_tables = OrderedDict()
+        # Last rotated timestamp and next rotation datetime of each table
+        self._rotate_periods = {}
 
     @property
     def is_rotate(self):
@@ -34,43 +40,152 @@ class RotateHandler(Handler):
 
     @property
     def last_rotated_timestamp(self):
-        """Last rotated timestamp.
+        """Last rotated timestamp of the tables registered from now on.
         """
         return self._last_rotated_timestamp
 
+    def get_last_rotated_timestamp(self, table_name):
+        """Get the last rotated timestamp of the table.
+
+        :param table_name: `str` of the registered table name.
+        :return: `datetime` of the start of the period of the table,
+            or None if the table is not registered.
+        """
+        period = self._rotate_periods.get(table_name)
+        return period[0] if period is not None else None
+
     def load(self, **kwargs):
         """Load.
         """
         super().load(**kwargs)
-        self._last_rotated_timestamp = datetime.utcnow()
+        self.update_last_rotate_timestamp(datetime.utcnow())
+
+    def execute(self, element):
+        """Execute the handler operator.
 
-    def should_rotate(self, timestamp):
-        """Check if all the tables should be rotated.
+        Each table is rotated before its first row with the date_time
+        past the rotation boundary of the table, so that the rows queued
+        before the boundary are inserted into the table of their period
+        however late they are executed, even if the rows of the other
+        tables, e.g. in the other lanes, are already past the boundary.
         """
-        return (
-            timestamp.strftime(self.rotate_frequency) !=
-            self._last_rotated_timestamp.strftime(
-                self.rotate_frequency))
+        if self._is_rotate:
+            if isinstance(element, bytes):
+                element = HandlerOperator.decode(element)
+
+            period = self._rotate_periods.get(element.table_name)
+            date_time = element.date_time
+
+            if (period is not None and date_time is not None and
+                    date_time >= period[1]):
+                self._rotate_table(element.table_name, date_time)
+
+        super().execute(element)
+
+    def register_rotate_table(self, table_name, fields):
+        """Register the table to rotate in the handler.
 
-    def update_last_rotate_timestamp(self, timestamp):
+        The period of a newly registered table starts from the last
+        rotated timestamp of the handler.
+        """
+        self._rotate_tables[table_name] = fields
+
+        if table_name not in self._rotate_periods:
+            self._rotate_periods[table_name] = self._get_rotate_period(
+                self._last_rotated_timestamp)
+
+    def update_last_rotate_timestamp(self, timestamp, table_name=None):
         """Update last rotate timestamp.
+
+        :param timestamp: `datetime` of the start of the period.
+        :param table_name: `str` of the table to update. If None, the
+            timestamp is updated for the handler and all the registered
+            tables.
         """
+        period = self._get_rotate_period(timestamp)
+
+        if table_name is not None:
+            self._rotate_periods[table_name] = period
+            return
+
         self._last_rotated_timestamp = timestamp
+        for name in self._rotate_tables:
+            self._rotate_periods[name] = period
+
+    @staticmethod
+    def get_next_rotate_time(timestamp, rotate_frequency):
+        """Get the epoch seconds when the formatted timestamp changes.
 
-    def rotate_table(self, table, last_datetime, allow_fail=False):
-        """Rotate table.
+        The formatted timestamp only changes at the boundary of a
+        second, minute, hour, day, month or year, so the earliest of
+        these boundaries with a different formatted value is the next
+        rotation time.
+
+        :param timestamp: `datetime` in UTC.
+        :param rotate_frequency: `str` of the `strftime` format.
+        :return: `int` of epoch seconds, or infinity if the format
+            never changes.
         """
-        from_name = table.table_name
-        to_name = "%s_%s" % (
-            from_name, self.last_rotated_timestamp.strftime(
-                self.rotate_frequency))
+        current = timestamp.strftime(rotate_frequency)
+        second = timestamp.replace(microsecond=0)
+        day = second.replace(hour=0, minute=0, second=0)
+
+        if day.month == 12:
+            next_month = day.replace(year=day.year + 1, month=1, day=1)
+        else:
+            next_month = day.replace(month=day.month + 1, day=1)
+
+        boundaries = [
+            second + timedelta(seconds=1),
+            second.replace(second=0) + timedelta(minutes=1),
+            second.replace(minute=0, second=0) + timedelta(hours=1),
+            day + timedelta(days=1),
+            next_month,
+            day.replace(year=day.year + 1, month=1, day=1),
+        ]
 
+        for boundary in boundaries:
+            if boundary.strftime(rotate_frequency) != current:
+                return timegm(boundary.utctimetuple())
+
+        return float('inf')
+
+    def _get_rotate_period(self, timestamp):
+        """Get the period starting from the timestamp.
+
+        :return: `tuple` of the timestamp and the `datetime` of the
+            next rotation.
+        """
+        if timestamp is None:
+            return None, datetime.max
+
+        next_rotate_time = self.get_next_rotate_time(
+            timestamp=timestamp,
+            rotate_frequency=self._rotate_frequency)
+
+        if next_rotate_time == float('inf'):
+            return timestamp, datetime.max
+
+        return timestamp, datetime.utcfromtimestamp(next_rotate_time)
+
+    def _rotate_table(self, table_name, timestamp):
+        """Rotate the table.
+
+        :param table_name: `str` of the registered table name.
+        :param timestamp: `datetime` of the first row of the next
+            period of the table.
+        """
+        last_rotated_timestamp, _ = self._rotate_periods[table_name]
+        to_name = "%s_%s" % (
+            table_name,
+            last_rotated_timestamp.strftime(self._rotate_frequency))
         LOGGER.info('Rotate table from %s to %s',
-                    from_name,
+                    table_name,
                     to_name)
-        self.prepare_rename_table(
-            from_name=from_name,
+        super().execute(HandlerRenameTableOperator(
+            from_name=table_name,
             to_name=to_name,
-            fields=table.fields,
-            allow_fail=allow_fail,
-            keep_table=True)
+            fields=self._rotate_tables[table_name],
+            allow_fail=True,
+            keep_table=True))
+        self.update_last_rotate_timestamp(timestamp, table_name=table_name)
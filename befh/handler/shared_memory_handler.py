@@ -0,0 +1,339 @@
+from datetime import datetime
+import logging
+import mmap
+import os
+import struct
+from threading import Lock
+
+from .handler import Handler
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = b'BEFHSHM1'
+# Magic, depth, number of slots and bytes of a slot
+HEADER = struct.Struct('<8sIII')
+HEADER_SIZE = 64
+NAME_SIZE = 64
+SEQUENCE = struct.Struct('<Q')
+ALIGNMENT = 64
+EPOCH = datetime(1970, 1, 1)
+
+
+def get_field_names(depth):
+    """Get the names of the fields stored in a slot.
+
+    :param depth: `int` of the order book depth.
+    :return: `list` of the field names in the order of the order book
+        table.
+    """
+    names = ['date_time', 'update_type', 't', 'tq']
+
+    for i in range(1, depth + 1):
+        names += ['b%d' % i, 'bq%d' % i, 'a%d' % i, 'aq%d' % i]
+
+    return names
+
+
+def create_payload(depth):
+    """Create the struct of the fields stored in a slot.
+    """
+    return struct.Struct('<%dd' % len(get_field_names(depth)))
+
+
+def get_slot_size(depth):
+    """Get the bytes of a slot, which is aligned to the cache line.
+    """
+    size = SEQUENCE.size + create_payload(depth).size
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def get_slot_offset(slots, slot_size, slot):
+    """Get the offset of the slot in the region.
+    """
+    return HEADER_SIZE + NAME_SIZE * slots + slot_size * slot
+
+
+class SharedMemoryHandler(Handler):
+    """Shared memory handler.
+
+    The handler keeps the latest order book of each instrument in a
+    memory-mapped file with one fixed-size slot per instrument, so
+    that any number of local processes read the current book without
+    subscribing to the feed. The slots are allocated when the tables
+    are created on load, and are written in the processes of the
+    exchanges under a seqlock, instead of the handler workers.
+
+    A slot is written whenever a row is inserted into the order book
+    table, so it is as fresh as the table. By default the websocket
+    exchanges insert a row on trades only, and the slot keeps the book
+    of the latest trade in between. With "trade_table" enabled, every
+    order book update is written, but the trade price and quantity are
+    -1 as they are recorded in the trade table instead. The delta
+    storage records the book as level changes, which cannot be written
+    as a snapshot, so its tables are rejected.
+
+    The file starts with a header and the directory of the table names
+    of the slots. Each slot holds a sequence number, which is odd
+    while the slot is written, followed by the fields of the order
+    book table as doubles, with "date_time" in epoch seconds. The file
+    is read by `SharedMemoryReader`.
+
+    Python has no memory fence, so the seqlock relies on the stores
+    of the writer being visible to the readers in program order, and
+    on the loads of a reader not being reordered, as guaranteed by
+    the total store order of x86-64. On a weakly ordered architecture,
+    e.g. ARM, a torn snapshot may pass the sequence check.
+
+    The file is created under a temporary name and moved into place
+    on load, so the readers of a previous run keep their mapping
+    intact, but must be reopened to read the new file.
+    """
+
+    DEFAULT_SLOTS = 1024
+    DEFAULT_DEPTH = 5
+
+    def __init__(self, path, slots=DEFAULT_SLOTS, depth=DEFAULT_DEPTH,
+                 **kwargs):
+        """Constructor.
+
+        :param path: `str` of the memory-mapped file, e.g.
+            "/dev/shm/befh".
+        :param slots: `int` of the maximum number of instruments.
+        :param depth: `int` of the order book depth stored in a slot.
+            The levels beyond the depth of the subscription are -1.
+        """
+        super().__init__(**kwargs)
+        assert isinstance(slots, int) and slots > 0, (
+            "Slots ({}) must be a positive integer".format(slots))
+        assert isinstance(depth, int) and depth > 0, (
+            "Depth ({}) must be a positive integer".format(depth))
+        self._path = path
+        self._slots = slots
+        self._depth = depth
+        self._field_names = get_field_names(depth)
+        self._payload = create_payload(depth)
+        self._slot_size = get_slot_size(depth)
+        self._lock = Lock()
+        self._offsets = {}
+        self._mmap = None
+
+    def load(self, **kwargs):
+        """Load.
+        """
+        super().load(**kwargs)
+        LOGGER.info('Mapping %d slots of depth %d into %s',
+                    self._slots, self._depth, self._path)
+
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        size = get_slot_offset(self._slots, self._slot_size, self._slots)
+        temp_path = '%s.%d.tmp' % (self._path, os.getpid())
+        with open(temp_path, 'w+b') as shm_file:
+            shm_file.truncate(size)
+            self._mmap = mmap.mmap(shm_file.fileno(), size)
+
+        HEADER.pack_into(
+            self._mmap, 0, MAGIC, self._depth, self._slots,
+            self._slot_size)
+        os.replace(temp_path, self._path)
+
+    def get_encoded_target(self, table_name):
+        """Get the target of the encoded operators of the table.
+
+        The operators are not queued to the handler workers.
+        """
+        return None
+
+    def get_operator_target(self, table_name):
+        """Get the target of the operators of the table.
+
+        The operators are executed in the process of the exchange.
+        """
+        return self.execute
+
+    def create_table(self, table_name, fields, **kwargs):
+        """Allocate the slot of the order book table.
+
+        :raises RuntimeError: If the table is of the delta storage.
+        """
+        if table_name.endswith('_delta'):
+            raise RuntimeError(
+                'Table %s of the delta storage is not supported by the '
+                'shared memory handler' % table_name)
+
+        if 'b1' not in fields or 'a1' not in fields:
+            return
+
+        with self._lock:
+            if table_name in self._offsets:
+                return
+
+            slot = len(self._offsets)
+            name = table_name.encode('utf-8')
+
+            if slot >= self._slots:
+                raise RuntimeError(
+                    'No free slot for table %s in %s of %d slots' % (
+                        table_name, self._path, self._slots))
+
+            if len(name) > NAME_SIZE:
+                raise RuntimeError(
+                    'Table name %s is longer than %d bytes' % (
+                        table_name, NAME_SIZE))
+
+            self._mmap[HEADER_SIZE + NAME_SIZE * slot:
+                       HEADER_SIZE + NAME_SIZE * (slot + 1)] = (
+                name.ljust(NAME_SIZE, b'\0'))
+            self._offsets[table_name] = get_slot_offset(
+                self._slots, self._slot_size, slot)
+
+        LOGGER.info('Allocated slot %d for table %s', slot, table_name)
+
+    def insert(self, table_name, fields):
+        """Write the order book into the slot under the seqlock.
+        """
+        offset = self._offsets.get(table_name)
+
+        if offset is None:
+            return
+
+        values = []
+        for name in self._field_names:
+            field = fields.get(name)
+
+            if field is None:
+                values.append(-1)
+            elif isinstance(field.value, datetime):
+                values.append((field.value - EPOCH).total_seconds())
+            else:
+                values.append(field.value)
+
+        shm = self._mmap
+        sequence, = SEQUENCE.unpack_from(shm, offset)
+        SEQUENCE.pack_into(shm, offset, sequence + 1)
+        self._payload.pack_into(shm, offset + SEQUENCE.size, *values)
+        SEQUENCE.pack_into(shm, offset, sequence + 2)
+
+    def run(self, **kwargs):
+        """Run.
+
+        The order books are written by the exchanges, so the worker
+        has nothing to consume.
+        """
+        LOGGER.info('Running %s on %s', self.__class__.__name__, self._path)
+
+    def prepare_close(self):
+        """Close.
+        """
+        pass
+
+
+class SharedMemoryReader:
+    """Reader of the order books written by `SharedMemoryHandler`.
+
+    A read copies the slot out of the mapped memory without any system
+    call, and retries while the slot is being written, so that the
+    snapshot is always consistent. The retries are bounded, so that a
+    read does not spin forever on a slot left locked by a writer which
+    died in the middle of a write.
+    """
+
+    MAXIMUM_READ_RETRIES = 100000
+
+    def __init__(self, path):
+        """Constructor.
+
+        :param path: `str` of the memory-mapped file of the handler.
+        """
+        with open(path, 'rb') as shm_file:
+            self._mmap = mmap.mmap(
+                shm_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, depth, slots, slot_size = HEADER.unpack_from(self._mmap, 0)
+        assert magic == MAGIC, (
+            "File ({}) is not written by the shared memory handler".format(
+                path))
+        self._depth = depth
+        self._slots = slots
+        self._slot_size = slot_size
+        self._field_names = get_field_names(depth)
+        self._payload = create_payload(depth)
+        self._offsets = {}
+
+    @property
+    def depth(self):
+        """Order book depth.
+        """
+        return self._depth
+
+    @property
+    def field_names(self):
+        """Names of the fields of a snapshot.
+        """
+        return self._field_names
+
+    @property
+    def table_names(self):
+        """Names of the tables allocated in the file.
+        """
+        self._load_directory()
+        return list(self._offsets.keys())
+
+    def read(self, table_name):
+        """Read the latest order book of the table.
+
+        :param table_name: `str` of the order book table name, e.g.
+            "bitmex_xbtusd_order".
+        :return: `tuple` of the values of `field_names`, or None if
+            the table is not written yet.
+        :raises RuntimeError: If no consistent snapshot is read within
+            the maximum retries.
+        """
+        offset = self._offsets.get(table_name)
+
+        if offset is None:
+            self._load_directory()
+            offset = self._offsets.get(table_name)
+            if offset is None:
+                return None
+
+        shm = self._mmap
+        payload_offset = offset + SEQUENCE.size
+
+        for _ in range(self.MAXIMUM_READ_RETRIES):
+            sequence, = SEQUENCE.unpack_from(shm, offset)
+
+            if sequence == 0:
+                return None
+
+            if sequence & 1:
+                continue
+
+            values = self._payload.unpack_from(shm, payload_offset)
+
+            if SEQUENCE.unpack_from(shm, offset)[0] == sequence:
+                return values
+
+        raise RuntimeError(
+            'Slot of table %s is still written after %d retries' % (
+                table_name, self.MAXIMUM_READ_RETRIES))
+
+    def close(self):
+        """Close.
+        """
+        self._mmap.close()
+
+    def _load_directory(self):
+        """Load the table names of the allocated slots.
+        """
+        for slot in range(len(self._offsets), self._slots):
+            start = HEADER_SIZE + NAME_SIZE * slot
+            name = self._mmap[start:start + NAME_SIZE].rstrip(b'\0')
+
+            if not name:
+                break
+
+            self._offsets[name.decode('utf-8')] = get_slot_offset(
+                self._slots, self._slot_size, slot)
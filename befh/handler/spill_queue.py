@@ -0,0 +1,393 @@
+from collections import deque
+import logging
+import os
+import queue
+import struct
+from threading import Lock, Thread
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SpillQueue:
+    """Queue spilling the backlog of a handler worker to disk.
+
+    A drain thread moves the operators from the source queue into
+    memory as soon as they arrive. Once the operators in memory exceed
+    the threshold, the following operators are appended to a log of
+    segment files in batches, and are read back sequentially in order
+    after the operators in memory are consumed. The queue returns to
+    memory when the log is fully consumed.
+
+    A segment is removed only once its operators are committed, i.e.
+    executed and flushed by the handler, and the position after the
+    last committed operator is kept in the cursor file. The operators
+    left in memory are written to the log when the queue is stopped.
+    The segments left by a stopped or crashed worker are replayed from
+    the cursor before the new operators when the queue is started
+    again, so an operator taken but not committed before a crash is
+    executed again.
+    """
+
+    DEFAULT_THRESHOLD = 100000
+    DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+    WRITE_BATCH_SIZE = 1000
+    # Seconds of an idle source queue before the pending batch is
+    # written
+    FLUSH_INTERVAL = 0.5
+    SEGMENT_SUFFIX = '.log'
+    CURSOR_NAME = 'cursor'
+    RECORD_HEADER = struct.Struct('!I')
+
+    def __init__(self, source, path, threshold=DEFAULT_THRESHOLD,
+                 segment_size=DEFAULT_SEGMENT_SIZE):
+        """Constructor.
+
+        :param source: Queue of the operators, e.g. `mp.Queue`.
+        :param path: `str` of the directory of the segment files.
+        :param threshold: `int` of the number of operators kept in
+            memory before spilling.
+        :param segment_size: `int` of the bytes of a segment file
+            before the next one is created.
+        """
+        assert isinstance(threshold, int) and threshold > 0, (
+            "Spill threshold ({}) must be a positive integer".format(
+                threshold))
+        self._source = source
+        self._path = path
+        self._threshold = threshold
+        self._segment_size = segment_size
+        self._lock = Lock()
+        self._memory = deque()
+        self._segments = deque()
+        self._consumed_segments = []
+        self._last_segment = -1
+        self._batch = []
+        self._write_file = None
+        self._read_file = None
+        self._next_record = None
+        # Segment and offset after the last operator taken from the log
+        self._read_position = None
+        self._committed_position = None
+        self._is_spilling = False
+        self._is_running = False
+        self._thread = None
+
+    @property
+    def is_spilling(self):
+        """Whether the operators are spilled to disk.
+        """
+        return self._is_spilling
+
+    def start(self):
+        """Recover the segments on disk and start the drain thread.
+        """
+        os.makedirs(self._path, exist_ok=True)
+        segments = sorted(
+            int(name[:-len(self.SEGMENT_SUFFIX)])
+            for name in os.listdir(self._path)
+            if name.endswith(self.SEGMENT_SUFFIX))
+        cursor = self._read_cursor()
+
+        if cursor is not None:
+            # The segments before the cursor were committed before
+            # they were removed
+            for segment in segments:
+                if segment < cursor[0]:
+                    os.remove(self._get_segment_path(segment))
+
+            segments = [
+                segment for segment in segments if segment >= cursor[0]]
+
+        self._segments.extend(segments)
+
+        if self._segments:
+            LOGGER.warning('Replaying %d spilled segments in %s',
+                           len(self._segments), self._path)
+            self._last_segment = self._segments[-1]
+            self._is_spilling = True
+
+            if cursor is not None and cursor[0] == self._segments[0]:
+                self._read_file = open(
+                    self._get_segment_path(cursor[0]), 'rb')
+                self._read_file.seek(cursor[1])
+                self._read_position = self._committed_position = cursor
+
+            self._open_write_file(self._last_segment + 1)
+
+        self._is_running = True
+        self._thread = Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the drain thread and write the remaining operators.
+
+        The operators taken from the queue are committed, so they must
+        be executed and flushed before. The operators in memory and
+        in the source queue are written to the log to be replayed
+        when the queue is started again.
+        """
+        self._is_running = False
+        if self._thread is not None:
+            self._thread.join()
+
+        while True:
+            try:
+                element = self._source.get_nowait()
+            except queue.Empty:
+                break
+
+            self.put(element)
+
+        self.commit()
+
+        with self._lock:
+            self._write_batch()
+
+            if self._memory:
+                # The operators in memory precede the ones in the log
+                segment = (
+                    self._segments[0] - 1 if self._segments
+                    else self._last_segment + 1)
+                with open(self._get_segment_path(segment), 'ab') as file:
+                    self._write_records(file, [
+                        self._encode(element) for element in self._memory])
+
+                LOGGER.warning(
+                    'Wrote %d operators in memory into %s',
+                    len(self._memory), self._path)
+                self._memory.clear()
+
+            for file in (self._read_file, self._write_file):
+                if file is not None:
+                    file.close()
+
+            self._read_file = None
+            self._write_file = None
+
+    def commit(self):
+        """Commit the operators taken from the queue.
+
+        It must be called after the operators taken are executed and
+        flushed. The fully consumed segments are removed and the
+        cursor is moved after the last operator taken.
+        """
+        with self._lock:
+            for segment in self._consumed_segments:
+                os.remove(self._get_segment_path(segment))
+
+            self._consumed_segments = []
+
+            if self._read_position != self._committed_position:
+                self._write_cursor(self._read_position)
+                self._committed_position = self._read_position
+
+    def put(self, element):
+        """Put the operator.
+        """
+        with self._lock:
+            if (not self._is_spilling and
+                    len(self._memory) < self._threshold):
+                self._memory.append(element)
+                return
+
+            if not self._is_spilling:
+                LOGGER.warning(
+                    'Spilling the backlog over %d operators into %s',
+                    self._threshold, self._path)
+                self._is_spilling = True
+                self._open_write_file(self._last_segment + 1)
+
+            self._batch.append(self._encode(element))
+
+            if len(self._batch) >= self.WRITE_BATCH_SIZE:
+                self._write_batch()
+
+    def get(self):
+        """Get the next operator without blocking.
+
+        :return: `HandlerOperator` or its encoded bytes, or None if
+            the queue is empty.
+        """
+        with self._lock:
+            if self._memory:
+                return self._memory.popleft()
+
+            data = self._peek()
+            if data is not None:
+                self._read_position = (
+                    self._segments[0], self._read_file.tell())
+
+            self._next_record = None
+            return data
+
+    def empty(self):
+        """Whether the queue is empty.
+        """
+        with self._lock:
+            return not self._memory and self._peek() is None
+
+    def _drain(self):
+        """Move the operators from the source queue.
+        """
+        while self._is_running:
+            try:
+                element = self._source.get(timeout=self.FLUSH_INTERVAL)
+            except queue.Empty:
+                with self._lock:
+                    self._write_batch()
+                continue
+
+            self.put(element)
+
+    def _write_batch(self):
+        """Append the pending batch to the last segment.
+        """
+        if not self._batch:
+            return
+
+        self._write_records(self._write_file, self._batch)
+        self._batch = []
+
+        if self._write_file.tell() >= self._segment_size:
+            self._open_write_file(self._segments[-1] + 1)
+
+    def _peek(self):
+        """Read the next record of the log in advance.
+
+        :return: `bytes` of the record, or None if the log is fully
+            consumed.
+        """
+        if self._next_record is None and self._is_spilling:
+            self._next_record = self._read_record()
+
+            if self._next_record is None:
+                # The pending batch is consumed through the log
+                self._write_batch()
+                self._next_record = self._read_record()
+
+            if self._next_record is None:
+                self._reset()
+
+        return self._next_record
+
+    def _read_record(self):
+        """Read the next record of the log.
+
+        :return: `bytes` of the record, or None if all the written
+            records are read.
+        """
+        while self._segments:
+            if self._read_file is None:
+                self._read_file = open(
+                    self._get_segment_path(self._segments[0]), 'rb')
+
+            position = self._read_file.tell()
+            header = self._read_file.read(self.RECORD_HEADER.size)
+
+            if len(header) == self.RECORD_HEADER.size:
+                length, = self.RECORD_HEADER.unpack(header)
+                data = self._read_file.read(length)
+                if len(data) == length:
+                    return data
+
+            if len(self._segments) == 1:
+                # The last segment is still written
+                self._read_file.seek(position)
+                return None
+
+            if header:
+                LOGGER.warning(
+                    'Dropped the record truncated by a crash in %s',
+                    self._get_segment_path(self._segments[0]))
+
+            self._read_file.close()
+            self._read_file = None
+            self._consumed_segments.append(self._segments.popleft())
+
+        return None
+
+    def _open_write_file(self, segment):
+        """Open the segment for writing.
+        """
+        if self._write_file is not None:
+            self._write_file.close()
+
+        self._segments.append(segment)
+        self._last_segment = segment
+        self._write_file = open(self._get_segment_path(segment), 'ab')
+
+    def _reset(self):
+        """Return to memory after the log is consumed.
+
+        The segments are removed when the operators are committed.
+        """
+        for file in (self._read_file, self._write_file):
+            if file is not None:
+                file.close()
+
+        LOGGER.info('Drained the spilled backlog in %s', self._path)
+        self._consumed_segments.extend(self._segments)
+        self._segments.clear()
+        self._read_file = None
+        self._write_file = None
+        self._read_position = None
+        self._is_spilling = False
+
+    def _write_records(self, file, records):
+        """Append the length prefixed records to the file.
+        """
+        file.write(b''.join(
+            self.RECORD_HEADER.pack(len(data)) + data for data in records))
+        file.flush()
+
+    @staticmethod
+    def _encode(element):
+        """Encode the operator into bytes.
+        """
+        if not isinstance(element, bytes):
+            element = element.encode()
+
+        return element
+
+    def _read_cursor(self):
+        """Read the cursor file.
+
+        :return: `tuple` of the segment and the offset after the last
+            committed operator, or None if there is no cursor.
+        """
+        try:
+            with open(self._get_cursor_path(), 'r') as file:
+                segment, offset = file.read().split()
+        except FileNotFoundError:
+            return None
+
+        return int(segment), int(offset)
+
+    def _write_cursor(self, position):
+        """Replace the cursor file, or remove it if the position is
+        None.
+        """
+        path = self._get_cursor_path()
+
+        if position is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+
+        with open(path + '.tmp', 'w') as file:
+            file.write('%d %d' % position)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(path + '.tmp', path)
+
+    def _get_cursor_path(self):
+        """Get the path of the cursor file.
+        """
+        return os.path.join(self._path, self.CURSOR_NAME)
+
+    def _get_segment_path(self, segment):
+        """Get the path of the segment file.
+        """
+        return os.path.join(
+            self._path, '%012d%s' % (segment, self.SEGMENT_SUFFIX))
@@ -0,0 +1,317 @@
+from datetime import timedelta
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from sqlalchemy import (
+    MetaData,
+    Numeric,
+    Table,
+    and_,
+    create_engine,
+    func,
+    select)
+
+from befh.reader import (
+    DEFAULT_ROTATE_FREQUENCY,
+    get_table_names,
+    read_table,
+    format_date_time)
+
+LOGGER = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = ('sqlite', 'parquet')
+ARCHIVE_CHUNK_SIZE = 100000
+PARQUET_COMPRESSION = 'zstd'
+# Archive processes wait for each other's write lock on the same
+# SQLite database instead of failing
+SQLITE_TIMEOUT = 600
+
+
+def archive_table(connection, table_name, date, archive_path,
+                  archive_format='sqlite',
+                  rotate_frequency=DEFAULT_ROTATE_FREQUENCY,
+                  is_delete=False):
+    """Archive the rows of the date into a compressed file.
+
+    The rows of the date in the table and its rotated tables are copied
+    into "{archive_path}/{date}/{table_name}.db.gz" or
+    "{archive_path}/{date}/{table_name}.parquet". If is_delete is set,
+    the archive is read back, and only if it holds all the rows, the
+    rows are deleted from the database and the rotated tables left
+    empty are dropped.
+
+    :param connection: `str` of the database url.
+    :param table_name: `str` of the table name.
+    :param date: `datetime` of the date.
+    :param archive_path: `str` of the archive directory.
+    :param archive_format: `str` of either "sqlite" or "parquet".
+    :param rotate_frequency: `str` of the `strftime` format of the
+        rotated table suffix.
+    :param is_delete: `bool` indicating whether to delete the archived
+        rows from the database.
+    :return: `int` of the number of archived rows.
+    """
+    assert archive_format in ARCHIVE_FORMATS, (
+        "Archive format ({}) must be one of {}".format(
+            archive_format, ARCHIVE_FORMATS))
+
+    start_time = date
+    end_time = date + timedelta(days=1)
+    engine = _create_engine(connection)
+
+    try:
+        source_names = get_table_names(
+            connection=engine,
+            table_name=table_name,
+            start_time=start_time,
+            end_time=end_time,
+            rotate_frequency=rotate_frequency)
+
+        if not source_names:
+            return 0
+
+        directory = os.path.join(archive_path, date.strftime('%Y%m%d'))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, table_name)
+
+        if archive_format == 'parquet':
+            path += '.parquet'
+            row_count = _archive_parquet(
+                engine=engine,
+                source_names=source_names,
+                path=path,
+                start_time=start_time,
+                end_time=end_time)
+        else:
+            row_count = _archive_sqlite(
+                engine=engine,
+                source_names=source_names,
+                table_name=table_name,
+                path=path + '.db',
+                start_time=start_time,
+                end_time=end_time)
+            path += '.db.gz'
+
+        if not is_delete:
+            return row_count
+
+        archived_row_count = _count_archived_rows(
+            path=path,
+            table_name=table_name,
+            archive_format=archive_format)
+
+        if archived_row_count != row_count:
+            raise RuntimeError(
+                'Archive {} has {} rows instead of {}, so the rows are '
+                'not deleted'.format(path, archived_row_count, row_count))
+
+        _delete_rows(
+            engine=engine,
+            source_names=source_names,
+            table_name=table_name,
+            start_time=start_time,
+            end_time=end_time,
+            row_count=row_count)
+    finally:
+        engine.dispose()
+
+    return row_count
+
+
+def vacuum_database(connection):
+    """Reclaim the space of the archived rows in the database.
+    """
+    engine = _create_engine(connection)
+
+    try:
+        if engine.dialect.name in ('sqlite', 'postgresql'):
+            with engine.connect() as conn:
+                conn.execution_options(
+                    isolation_level='AUTOCOMMIT').execute('VACUUM')
+        else:
+            LOGGER.info('Skip vacuuming database of dialect %s',
+                        engine.dialect.name)
+    finally:
+        engine.dispose()
+
+
+def _archive_sqlite(engine, source_names, table_name, path, start_time,
+                    end_time):
+    """Copy the rows into a gzip compressed SQLite database.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+    archive_engine = create_engine('sqlite:///%s' % path)
+    row_count = 0
+
+    try:
+        with engine.connect() as conn, archive_engine.connect() as archive:
+            archive.execute('PRAGMA journal_mode = OFF')
+            archive.execute('PRAGMA synchronous = OFF')
+            archive_table = None
+
+            for source_name in source_names:
+                source = Table(source_name, MetaData(), autoload=True,
+                               autoload_with=conn)
+
+                for column in source.columns:
+                    # Copy the numerics as floats without Decimal objects
+                    if isinstance(column.type, Numeric):
+                        column.type.asdecimal = False
+
+                if archive_table is None:
+                    archive_table = source.tometadata(
+                        MetaData(), name=table_name)
+                    archive_table.create(archive)
+
+                result = conn.execution_options(
+                    stream_results=True).execute(
+                    select([source]).where(
+                        _in_time_range(source, start_time, end_time)
+                    ).order_by(source.c.id))
+
+                while True:
+                    rows = result.fetchmany(ARCHIVE_CHUNK_SIZE)
+                    if not rows:
+                        break
+
+                    # The ids are renumbered across the source tables
+                    with archive.begin():
+                        archive.execute(
+                            archive_table.insert(),
+                            [{name: value for name, value in row.items()
+                              if name != 'id'} for row in rows])
+
+                    row_count += len(rows)
+    finally:
+        archive_engine.dispose()
+
+    with open(path, 'rb') as source_file, \
+            gzip.open(path + '.gz', 'wb') as archive_file:
+        shutil.copyfileobj(source_file, archive_file)
+
+    os.remove(path)
+    return row_count
+
+
+def _archive_parquet(engine, source_names, path, start_time, end_time):
+    """Copy the rows into a compressed Parquet file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    row_count = 0
+
+    try:
+        for source_name in source_names:
+            for frame in read_table(
+                    connection=engine,
+                    table_name=source_name,
+                    start_time=start_time,
+                    end_time=end_time,
+                    chunk_size=ARCHIVE_CHUNK_SIZE,
+                    is_data_frame=True):
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+
+                if writer is None:
+                    # The columns of which all the values are null in the
+                    # first chunk are strings
+                    schema = pa.schema([
+                        pa.field(field.name, pa.string())
+                        if pa.types.is_null(field.type) else field
+                        for field in table.schema])
+                    writer = pq.ParquetWriter(
+                        path, schema, compression=PARQUET_COMPRESSION)
+
+                writer.write_table(table.cast(writer.schema))
+                row_count += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return row_count
+
+
+def _count_archived_rows(path, table_name, archive_format):
+    """Read the archive back and count its rows.
+    """
+    if archive_format == 'parquet':
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path).num_rows
+
+    # Decompressing the whole file verifies the checksum of gzip
+    with tempfile.NamedTemporaryFile(suffix='.db') as database_file:
+        with gzip.open(path, 'rb') as archive_file:
+            shutil.copyfileobj(archive_file, database_file)
+        database_file.flush()
+
+        conn = sqlite3.connect(database_file.name)
+        try:
+            return conn.execute(
+                'select count(*) from "{}"'.format(table_name)).fetchone()[0]
+        finally:
+            conn.close()
+
+
+def _delete_rows(engine, source_names, table_name, start_time, end_time,
+                 row_count):
+    """Delete the archived rows and drop the empty rotated tables.
+
+    The rows are deleted in a single transaction, which is rolled back
+    if the number of the deleted rows is not the number of the archived
+    rows.
+    """
+    with engine.connect() as conn:
+        sources = [
+            Table(source_name, MetaData(), autoload=True,
+                  autoload_with=conn)
+            for source_name in source_names]
+
+        with conn.begin():
+            deleted_row_count = sum(
+                conn.execute(source.delete().where(
+                    _in_time_range(source, start_time, end_time))).rowcount
+                for source in sources)
+
+            if deleted_row_count != row_count:
+                raise RuntimeError(
+                    'Table {} has {} rows to delete instead of the {} '
+                    'archived rows'.format(
+                        table_name, deleted_row_count, row_count))
+
+        for source in sources:
+            if source.name == table_name:
+                continue
+
+            remaining_row_count = conn.execute(
+                select([func.count()]).select_from(source)).scalar()
+
+            if remaining_row_count == 0:
+                LOGGER.info('Dropping archived table %s', source.name)
+                source.drop(conn)
+
+
+def _in_time_range(table, start_time, end_time):
+    """Get the condition of the date time in the time range.
+    """
+    column = table.c.date_time
+    return and_(
+        column >= format_date_time(start_time, column),
+        column < format_date_time(end_time, column))
+
+
+def _create_engine(connection):
+    """Create the engine of the archive process.
+    """
+    if connection.startswith('sqlite'):
+        return create_engine(
+            connection, connect_args={'timeout': SQLITE_TIMEOUT})
+
+    return create_engine(connection)
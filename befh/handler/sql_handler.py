@@ -1,15 +1,30 @@
 import logging
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock
+from time import time
+from zlib import crc32
 
 from sqlalchemy import (
     create_engine,
+    event,
     Table,
     Column,
+    Index,
+    BigInteger,
+    DateTime,
     Integer,
     String,
     Numeric,
     MetaData)
+from sqlalchemy.dialects import mysql
 
+from .handler_operator import HandlerOperator
+from .postgres_copy import (
+    create_copy_statement,
+    encode_binary,
+    encode_csv)
 from .rotate_handler import RotateHandler
 
 LOGGER = logging.getLogger(__name__)
@@ -19,12 +34,109 @@ class SqlHandler(RotateHandler):
     """Sql handler.
     """
 
-    def __init__(self, connection, **kwargs):
+    STAGING_TABLE_NAME = '{table_name}_next'
+    TIMESTAMP_FORMATS = ('string', 'epoch', 'native')
+    TIME_INDEX_COLUMN = 'date_time'
+    # Maximum length of the identifiers in PostgreSQL
+    MAXIMUM_INDEX_NAME_LENGTH = 63
+    EPOCH = datetime(1970, 1, 1)
+    MAXIMUM_TRANSACTION_SIZE = 10000
+    # Seconds before COPY is retried on a table after a failure, which
+    # is doubled on each consecutive failure
+    COPY_RETRY_INTERVAL = 60
+    MAXIMUM_COPY_RETRY_INTERVAL = 3600
+    # Failures of COPY which will keep happening, e.g. the driver does
+    # not support COPY
+    PERMANENT_COPY_ERRORS = (AttributeError, NotImplementedError)
+    SQLITE_ANALYSIS_LIMIT = 1000
+    SQLITE_PROFILES = {
+        'throughput': OrderedDict([
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'NORMAL'),
+            ('cache_size', -262144),
+            ('mmap_size', 268435456),
+            ('temp_store', 'MEMORY'),
+        ]),
+    }
+
+    def __init__(self, connection, is_copy=False, copy_format='csv',
+                 copy_size=10000, copy_interval=1, sqlite_profile=None,
+                 sqlite_pragmas=None, archive_path='archive',
+                 archive_format='sqlite', timestamp_format='string',
+                 is_time_index=False, **kwargs):
         """Constructor.
+
+        :param connection: `str` of the connection url. The placeholder
+            "{worker}" is replaced by the worker index and "{exchange}"
+            by the exchange name of the table, so that the tables are
+            spread across database files.
+        :param is_copy: `bool` indicating whether to bulk load the rows
+            by COPY on PostgreSQL.
+        :param copy_format: `str` of the COPY format, either "csv" or
+            "binary".
+        :param copy_size: `int` of the number of rows buffered in a
+            table before it is flushed.
+        :param copy_interval: `float` of the seconds between flushing
+            all the buffered tables.
+        :param sqlite_profile: `str` of the SQLite profile. Profile
+            "throughput" sets WAL journaling, normal synchronous, large
+            page cache and mmap size on connect, and writes each
+            drained batch in one transaction.
+        :param sqlite_pragmas: `dict` of the SQLite pragmas overriding
+            the profile.
+        :param archive_path: `str` of the directory of the archives.
+        :param archive_format: `str` of the archive format, either
+            "sqlite" for gzip compressed SQLite databases or "parquet".
+        :param timestamp_format: `str` of the format of the timestamp
+            columns. "string" stores '%Y%m%d %H:%M:%S.%f' strings,
+            "epoch" stores BIGINT epoch microseconds and "native"
+            stores the timestamp type of the database.
+        :param is_time_index: `bool` indicating whether to create an
+            index on the date_time column of the new tables.
         """
         super().__init__(**kwargs)
+        assert copy_format in ('csv', 'binary'), (
+            "Copy format ({}) must be either csv or binary".format(
+                copy_format))
+        assert (sqlite_profile is None or
+                sqlite_profile in self.SQLITE_PROFILES), (
+            "SQLite profile ({}) must be one of {}".format(
+                sqlite_profile, list(self.SQLITE_PROFILES.keys())))
+        assert timestamp_format in self.TIMESTAMP_FORMATS, (
+            "Timestamp format ({}) must be one of {}".format(
+                timestamp_format, self.TIMESTAMP_FORMATS))
+        assert archive_format in ('sqlite', 'parquet'), (
+            "Archive format ({}) must be either sqlite or parquet".format(
+                archive_format))
         self._connection = connection
+        self._is_copy = is_copy
+        self._copy_format = copy_format
+        self._copy_size = copy_size
+        self._copy_interval = copy_interval
+        self._copy_buffers = {}
+        self._copy_fields = {}
+        self._copy_retries = {}
+        self._last_copy_time = time()
+        self._sqlite_profile = sqlite_profile
+        self._sqlite_pragmas = OrderedDict(
+            self.SQLITE_PROFILES.get(sqlite_profile, {}))
+        self._sqlite_pragmas.update(sqlite_pragmas or {})
+        self._archive_path = archive_path
+        self._timestamp_format = timestamp_format
+        self._is_time_index = is_time_index
+        self._archive_format = archive_format
         self._engine = None
+        self._is_loaded = False
+        self._engines = {}
+        self._conns = {}
+        self._transactions = {}
+        self._table_names = {}
+        self._tables = {}
+        self._insert_statements = {}
+        self._staging_lock = Lock()
+        self._staging_tables = {}
+        self._pending_tasks = []
+        self._background_executor = None
 
     @property
     def engine(self):
@@ -38,21 +150,62 @@ class SqlHandler(RotateHandler):
         """
         return self._queue
 
-    def load(self, queue):
+    def load(self, **kwargs):
         """Load.
         """
-        super().load(queue=queue)
-        self._engine = create_engine(self._connection)
+        super().load(**kwargs)
+        if not self._is_exchange_connection():
+            self._engine = self._create_engine(self._get_connection_url())
+        self._is_loaded = True
+
+    def run(self, worker=0, **kwargs):
+        """Run.
+        """
+        # Each worker owns its engines and connection pools, which
+        # must not be shared with the parent process
+        self._worker = worker
+        self._engines = {}
+        self._conns = {}
+        self._transactions = {}
+        self._table_names = {}
+        if not self._is_exchange_connection():
+            self._engine = self._get_engine()
+        super().run(worker=worker, **kwargs)
+
+    def get_archive_tasks(self, table_names, date):
+        """Get the tasks archiving the tables of the date.
+        """
+        tasks = []
+
+        for table_name in table_names:
+            worker = self.get_worker(table_name)
+            table_name = HandlerOperator.parse_table_name(table_name)
+            tasks.append({
+                'connection': self._get_connection_url(
+                    table_name=table_name, worker=worker),
+                'table_name': table_name,
+                'date': date,
+                'archive_path': self._archive_path,
+                'archive_format': self._archive_format,
+                'rotate_frequency': self.rotate_frequency,
+            })
+
+        return tasks
 
     def create_table(self, table_name, fields, **kwargs):
         """Create table.
         """
-        assert self._engine, "Engine is not initialized"
+        assert self._is_loaded, "Engine is not initialized"
+
+        self.register_rotate_table(
+            table_name=table_name,
+            fields=fields)
+        self._commit_transactions()
 
         # Check if the table exists
-        if table_name in self._engine.table_names():
+        if self._has_table(table_name):
             if self._is_cold:
-                self._engine.execute(
+                self._get_connection(table_name).execute(
                     'delete table {table_name}'.format(
                         table_name=table_name))
                 LOGGER.info(
@@ -60,54 +213,89 @@ class SqlHandler(RotateHandler):
                     table_name)
             else:
                 LOGGER.info('Table %s is created', table_name)
+                self._load_table(
+                    table_name=table_name,
+                    fields=fields)
+                self._prepare_staging_table(
+                    table_name=table_name,
+                    fields=fields)
                 return
 
-        LOGGER.info('Creating table %s', table_name)
-        columns = []
-
-        for field_name, field in fields.items():
-            columns.append(self._create_column(
-                field_name=field_name,
-                field=field))
+        if self._recover_staging_table(table_name):
+            self._load_table(table_name=table_name, fields=fields)
+            self._prepare_staging_table(
+                table_name=table_name,
+                fields=fields)
+            return
 
-        meta_data = MetaData()
-        Table(table_name, meta_data, *columns)
-        meta_data.create_all(self._engine)
+        LOGGER.info('Creating table %s', table_name)
+        self._tables[table_name] = self._create_table_schema(
+            table_name=table_name,
+            fields=fields,
+            connection=self._get_connection(table_name))
+        self._update_table_names(table_name, added=table_name)
         LOGGER.info('Created table %s', table_name)
+        self._prepare_staging_table(
+            table_name=table_name,
+            fields=fields)
 
     def insert(self, table_name, fields):
         """Insert.
         """
-        assert self._engine, "Engine is not initialized"
+        assert self._is_loaded, "Engine is not initialized"
 
-        fields = [
-            (k, v) for k, v in fields.items() if not v.is_auto_increment]
-        fields = list(zip(*fields))
+        # The rows after the buffered ones are buffered to keep the order
+        if (table_name in self._copy_buffers or
+                self._is_copy_table(table_name)):
+            buffer = self._copy_buffers.setdefault(table_name, [])
+            buffer.append(self._get_parameters(fields))
+            self._copy_fields[table_name] = fields
+            if len(buffer) >= self._copy_size:
+                self._try_flush_table(table_name)
+            return
 
-        column_names = (','.join(fields[0]))
-        values = (','.join([str(f) for f in fields[1]]))
+        statement = self._insert_statements.get(table_name)
 
-        sql_statement = (
-            "insert into {table_name} ({column_names}) values "
-            "({values})").format(
+        if statement is None:
+            statement = self._compile_insert_statement(
                 table_name=table_name,
-                column_names=column_names,
-                values=values)
+                fields=fields)
 
-        self._engine.execute(sql_statement)
+        self._begin_transaction(table_name)
+        self._get_connection(table_name).execute(
+            statement, self._get_parameters(fields))
 
     def rename_table(self, from_name, to_name, fields=None, keep_table=True):
         """Rename table.
+
+        If the staging table of the next period has been created in
+        advance, the rotation only swaps the table names. Otherwise,
+        the table is renamed and created again inline.
         """
-        from alembic.migration import MigrationContext
-        from alembic.operations import Operations
+        # The buffered rows belong to the table before rotation
+        self._flush_table(table_name=from_name, fields=fields)
+        self._commit_transactions()
+        self._invalidate_table(from_name)
+        self._invalidate_table(to_name)
+
+        if keep_table and self._pop_staging_table(from_name):
+            self._swap_staging_table(
+                from_name=from_name,
+                to_name=to_name,
+                fields=fields)
+            return
 
         # Refresh the connection again
-        self._engine = create_engine(self._connection)
-        conn = self._engine.connect()
-        ctx = MigrationContext.configure(conn)
-        op = Operations(ctx)
-        op.rename_table(from_name, to_name)
+        url = self._get_connection_url(from_name)
+        self._reset_connection(url)
+        self._engines[url] = self._create_engine(url)
+        # The index is renamed with the table, so that its name is free
+        # for the index of the table created again
+        self._rename_tables(
+            conn=self._get_connection(from_name),
+            names=[(from_name, to_name)],
+            index_column=self.TIME_INDEX_COLUMN)
+        self._update_table_names(from_name, added=to_name, removed=from_name)
 
         if keep_table:
             assert fields is not None, (
@@ -116,8 +304,652 @@ class SqlHandler(RotateHandler):
                 table_name=from_name,
                 fields=fields)
 
-    @staticmethod
-    def _create_column(field_name, field):
+    def flush(self, force=False):
+        """Flush the rows buffered for COPY and commit the transactions
+        of the batch.
+        """
+        self._commit_transactions()
+
+        while self._pending_tasks:
+            function, args = self._pending_tasks.pop(0)
+            function(*args)
+
+        if not self._copy_buffers:
+            return
+
+        if not force and time() - self._last_copy_time < self._copy_interval:
+            return
+
+        for table_name in list(self._copy_buffers.keys()):
+            self._try_flush_table(table_name)
+
+        self._last_copy_time = time()
+
+    def close(self):
+        """Close.
+        """
+        self.flush(force=True)
+        super().close()
+
+        if self._background_executor is not None:
+            self._background_executor.shutdown(wait=True)
+            self._background_executor = None
+
+        self._reset_connection()
+
+    def _is_copy_table(self, table_name):
+        """Indicate whether the rows of the table are loaded by COPY.
+        """
+        if not self._is_copy:
+            return False
+
+        retry = self._copy_retries.get(table_name)
+
+        if retry is not None and time() < retry[0]:
+            return False
+
+        return self._get_engine(table_name).dialect.name == 'postgresql'
+
+    def _begin_transaction(self, table_name):
+        """Begin the transaction of the batch on SQLite profile.
+
+        The transaction is committed once it reaches the maximum size,
+        or when the batch is flushed.
+        """
+        if self._sqlite_profile is None:
+            return
+
+        url = self._get_connection_url(table_name)
+        transaction = self._transactions.get(url)
+
+        # Commit the full transaction before the row, so that the row
+        # is executed in the following transaction
+        if (transaction is not None and
+                transaction[1] >= self.MAXIMUM_TRANSACTION_SIZE):
+            del self._transactions[url]
+            transaction[0].commit()
+            transaction = None
+
+        if transaction is None:
+            if self._get_engine(table_name).dialect.name != 'sqlite':
+                return
+
+            transaction = [self._get_connection(table_name).begin(), 0]
+            self._transactions[url] = transaction
+
+        transaction[1] += 1
+
+    def _commit_transactions(self):
+        """Commit the transactions of the batch.
+        """
+        while self._transactions:
+            _, (transaction, _) = self._transactions.popitem()
+            transaction.commit()
+
+    def _flush_table(self, table_name, fields=None):
+        """Flush the rows buffered for the table.
+
+        The rows are inserted by the compiled insert statement if
+        COPY fails, and the table falls back to insert until COPY is
+        retried after a backoff. The rows are kept in the buffer until
+        they are written.
+
+        :param fields: `dict` of the fields of the table, which are
+            the fields of the last buffered row if not specified.
+        """
+        rows = self._copy_buffers.get(table_name)
+
+        if not rows:
+            return
+
+        table = self._tables.get(table_name)
+
+        if table is None:
+            # The table is invalidated by the rotation
+            table = self._create_table_object(
+                table_name=table_name,
+                fields=fields or self._copy_fields[table_name],
+                meta_data=MetaData())
+            self._tables[table_name] = table
+
+        if self._is_copy_table(table_name):
+            try:
+                self._copy_rows(table=table, rows=rows)
+                self._copy_retries.pop(table_name, None)
+                del self._copy_buffers[table_name]
+                return
+            except Exception as exception:
+                interval = self._get_copy_retry_interval(
+                    table_name, exception)
+                LOGGER.warning(
+                    'Failed to copy %d rows into table %s and fall back '
+                    'to insert for %.0fs (%s)',
+                    len(rows), table_name, interval, str(exception))
+                self._copy_retries[table_name] = (
+                    time() + interval, interval)
+
+        statement = self._insert_statements.get(table_name)
+        self._get_connection(table_name).execute(
+            statement if statement is not None else table.insert(),
+            rows)
+        del self._copy_buffers[table_name]
+
+    def _try_flush_table(self, table_name):
+        """Flush the rows buffered for the table, which are kept in
+        the buffer for the next flush if they cannot be written.
+        """
+        try:
+            self._flush_table(table_name=table_name)
+        except Exception:
+            LOGGER.exception(
+                'Failed to flush %d rows into table %s, which are kept '
+                'for the next flush',
+                len(self._copy_buffers[table_name]), table_name)
+
+    def _get_copy_retry_interval(self, table_name, exception):
+        """Get the seconds before COPY is retried on the table after
+        the failure.
+        """
+        if isinstance(exception, self.PERMANENT_COPY_ERRORS):
+            return float('inf')
+
+        retry = self._copy_retries.get(table_name)
+
+        if retry is None:
+            return self.COPY_RETRY_INTERVAL
+
+        return min(retry[1] * 2, self.MAXIMUM_COPY_RETRY_INTERVAL)
+
+    def _copy_rows(self, table, rows):
+        """Copy the rows into the table by COPY FROM STDIN.
+        """
+        quote = self._get_engine(table.name).dialect.identifier_preparer.quote
+        columns = [table.columns[name] for name in rows[0].keys()]
+        column_names = [column.name for column in columns]
+
+        if self._copy_format == 'binary':
+            data = encode_binary(rows=rows, columns=columns)
+        else:
+            data = encode_csv(rows=rows, column_names=column_names)
+
+        statement = create_copy_statement(
+            table_name=quote(table.name),
+            column_names=[quote(name) for name in column_names],
+            copy_format=self._copy_format)
+
+        conn = self._get_connection(table.name)
+        with conn.begin():
+            cursor = conn.connection.cursor()
+            try:
+                cursor.copy_expert(statement, data)
+            finally:
+                cursor.close()
+
+    def _create_engine(self, url):
+        """Create the engine and set the SQLite pragmas on connect.
+        """
+        engine = create_engine(url)
+
+        if self._sqlite_pragmas and engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', self._set_sqlite_pragmas)
+
+        return engine
+
+    def _set_sqlite_pragmas(self, dbapi_connection, connection_record):
+        """Set the SQLite pragmas on the new connection.
+        """
+        cursor = dbapi_connection.cursor()
+        for name, value in self._sqlite_pragmas.items():
+            cursor.execute('PRAGMA {name}={value}'.format(
+                name=name, value=value))
+        cursor.close()
+
+    def _get_engine(self, table_name=None):
+        """Get the engine of the database storing the table.
+        """
+        url = self._get_connection_url(table_name)
+        engine = self._engines.get(url)
+
+        if engine is None:
+            engine = self._create_engine(url)
+            self._engines[url] = engine
+
+        return engine
+
+    def _get_connection(self, table_name=None):
+        """Get the connection held by the worker.
+        """
+        url = self._get_connection_url(table_name)
+        conn = self._conns.get(url)
+
+        if conn is None or conn.closed:
+            conn = self._get_engine(table_name).connect()
+            self._conns[url] = conn
+
+        return conn
+
+    def _reset_connection(self, url=None):
+        """Close the held connections, or only the one of the url.
+        """
+        if url is None:
+            urls = list(self._conns.keys())
+        else:
+            urls = [url]
+
+        for url in urls:
+            self._transactions.pop(url, None)
+            conn = self._conns.pop(url, None)
+
+            if conn is None:
+                continue
+
+            try:
+                conn.close()
+            except Exception as exception:
+                LOGGER.debug('Failed to close connection (%s)',
+                             str(exception))
+
+    def _has_table(self, table_name):
+        """Check if the table exists from the cached table names.
+
+        The database catalog is only queried on the first call.
+        """
+        url = self._get_connection_url(table_name)
+        table_names = self._table_names.get(url)
+
+        if table_names is None:
+            table_names = set(self._get_engine(table_name).table_names(
+                connection=self._get_connection(table_name)))
+            self._table_names[url] = table_names
+
+        return table_name in table_names
+
+    def _update_table_names(self, table_name, added=None, removed=None):
+        """Update the cached table names of the database storing
+        the table.
+        """
+        table_names = self._table_names.get(
+            self._get_connection_url(table_name))
+
+        if table_names is None:
+            return
+
+        if removed is not None:
+            table_names.discard(removed)
+
+        if added is not None:
+            table_names.add(added)
+
+    def _load_table(self, table_name, fields):
+        """Load the existing table schema into the cache.
+        """
+        try:
+            self._tables[table_name] = Table(
+                table_name, MetaData(),
+                autoload=True,
+                autoload_with=self._get_connection(table_name))
+        except Exception as exception:
+            LOGGER.warning(
+                'Failed to reflect table %s (%s)',
+                table_name, str(exception))
+
+    def _invalidate_table(self, table_name):
+        """Invalidate the cached table schema and insert statement.
+        """
+        self._tables.pop(table_name, None)
+        self._insert_statements.pop(table_name, None)
+
+    def _compile_insert_statement(self, table_name, fields):
+        """Compile the insert statement and cache it.
+        """
+        table = self._tables.get(table_name)
+
+        if table is None:
+            table = self._create_table_object(
+                table_name=table_name,
+                fields=fields,
+                meta_data=MetaData())
+            self._tables[table_name] = table
+
+        column_keys = [
+            k for k, v in fields.items() if not v.is_auto_increment]
+        statement = table.insert().compile(
+            dialect=self._get_engine(table_name).dialect,
+            column_keys=column_keys)
+        self._insert_statements[table_name] = statement
+
+        return statement
+
+    def _create_table_schema(self, table_name, fields, connection):
+        """Create the table schema from the fields.
+        """
+        meta_data = MetaData()
+        table = self._create_table_object(
+            table_name=table_name,
+            fields=fields,
+            meta_data=meta_data)
+        meta_data.create_all(connection)
+
+        return table
+
+    def _create_table_object(self, table_name, fields, meta_data):
+        """Create the table object from the fields.
+        """
+        columns = []
+
+        for field_name, field in fields.items():
+            columns.append(self._create_column(
+                field_name=field_name,
+                field=field))
+
+        if self._is_time_index and self.TIME_INDEX_COLUMN in fields:
+            columns.append(Index(
+                self.get_index_name(table_name, self.TIME_INDEX_COLUMN),
+                self.TIME_INDEX_COLUMN))
+
+        return Table(table_name, meta_data, *columns)
+
+    def _submit_background_task(self, engine, function, *args):
+        """Run the task in a background thread so that the inserts are
+        not blocked. SQLite only allows a single writer, so its tasks
+        are run in the worker between the batches instead.
+        """
+        if engine.dialect.name == 'sqlite':
+            self._pending_tasks.append((function, args))
+            return
+
+        if self._background_executor is None:
+            self._background_executor = ThreadPoolExecutor(max_workers=1)
+
+        self._background_executor.submit(function, *args)
+
+    def _prepare_staging_table(self, table_name, fields):
+        """Create the table of the next period ahead of the rotation
+        in the background.
+        """
+        if not self.is_rotate:
+            return
+
+        with self._staging_lock:
+            if table_name in self._staging_tables:
+                return
+
+            self._staging_tables[table_name] = False
+
+        engine = self._get_engine(table_name)
+        self._submit_background_task(
+            engine, self._create_staging_table, engine, table_name, fields)
+
+    def _create_staging_table(self, engine, table_name, fields):
+        """Create staging table.
+        """
+        staging_name = self.STAGING_TABLE_NAME.format(table_name=table_name)
+
+        try:
+            with engine.connect() as conn:
+                self._create_table_schema(
+                    table_name=staging_name,
+                    fields=fields,
+                    connection=conn)
+        except Exception as exception:
+            LOGGER.warning(
+                'Failed to create staging table %s (%s)',
+                staging_name, str(exception))
+            with self._staging_lock:
+                self._staging_tables.pop(table_name, None)
+            return
+
+        LOGGER.debug('Created staging table %s', staging_name)
+        with self._staging_lock:
+            self._staging_tables[table_name] = True
+
+    def _pop_staging_table(self, table_name):
+        """Pop the staging table if it is ready to swap.
+        """
+        with self._staging_lock:
+            if self._staging_tables.get(table_name):
+                del self._staging_tables[table_name]
+                return True
+
+        return False
+
+    def _swap_staging_table(self, from_name, to_name, fields):
+        """Swap the staging table into the live table.
+
+        Both renames are a single statement on MySQL, where DDL is not
+        transactional, and a single transaction on the other databases.
+        If the swap fails, the live table is restored from the staging
+        table or created again, so that the inserts keep going.
+        """
+        staging_name = self.STAGING_TABLE_NAME.format(table_name=from_name)
+        conn = self._get_connection(from_name)
+
+        try:
+            self._rename_tables(
+                conn=conn,
+                names=[(from_name, to_name), (staging_name, from_name)],
+                index_column=self.TIME_INDEX_COLUMN)
+        except Exception:
+            LOGGER.exception(
+                'Failed to swap table %s into %s', staging_name, from_name)
+            self._table_names.pop(self._get_connection_url(from_name), None)
+            self._ensure_live_table(table_name=from_name, fields=fields)
+            raise
+
+        self._update_table_names(
+            from_name, added=to_name, removed=staging_name)
+
+        LOGGER.info('Swapped table %s into %s', staging_name, from_name)
+
+        # The rotated table is finalized and the staging table of the
+        # following period is created in the background
+        engine = self._get_engine(from_name)
+        self._submit_background_task(
+            engine, self._finalize_table, engine, to_name)
+        self._prepare_staging_table(
+            table_name=from_name,
+            fields=fields)
+
+    @classmethod
+    def get_index_name(cls, table_name, column):
+        """Get the index name of the column of the table.
+
+        The name which is longer than the identifiers allowed by the
+        database is truncated with the checksum of the full name.
+        """
+        name = 'ix_{}_{}'.format(table_name, column)
+
+        if len(name) > cls.MAXIMUM_INDEX_NAME_LENGTH:
+            name = '{}_{:08x}'.format(
+                name[:cls.MAXIMUM_INDEX_NAME_LENGTH - 9],
+                crc32(name.encode('utf-8')))
+
+        return name
+
+    @classmethod
+    def _rename_tables(cls, conn, names, index_column=None):
+        """Rename the tables atomically.
+
+        Index names are unique in the schema of SQLite and PostgreSQL,
+        so the index of the column is renamed with its table, and the
+        name of the live table is free for the index of the staging
+        table. SQLite cannot rename an index, so it is created again.
+
+        :param names: `list` of the tuples of the name to rename from
+            and the name to rename to, which are renamed in order.
+        :param index_column: `str` of the indexed column of the tables.
+        """
+        from alembic.migration import MigrationContext
+        from alembic.operations import Operations
+
+        quote = conn.dialect.identifier_preparer.quote
+
+        if conn.dialect.name == 'mysql':
+            # The index names are unique only in the table
+            conn.execute('RENAME TABLE {}'.format(', '.join(
+                '{} TO {}'.format(quote(from_name), quote(to_name))
+                for from_name, to_name in names)))
+            return
+
+        # Tuples of the renamed table, its index name and its new index
+        # name
+        indexes = []
+        if index_column is not None:
+            indexes = [
+                (to_name,
+                 cls.get_index_name(from_name, index_column),
+                 cls.get_index_name(to_name, index_column))
+                for from_name, to_name in names]
+
+        with conn.begin():
+            if conn.dialect.name == 'sqlite':
+                indexes = [
+                    index for index in indexes
+                    if conn.execute(
+                        "select 1 from sqlite_master where type = 'index' "
+                        "and name = ?", (index[1],)).first()]
+                for _, from_index, _ in indexes:
+                    conn.execute('DROP INDEX {}'.format(quote(from_index)))
+
+            op = Operations(MigrationContext.configure(conn))
+            for from_name, to_name in names:
+                op.rename_table(from_name, to_name)
+
+            for table_name, from_index, to_index in indexes:
+                if conn.dialect.name == 'sqlite':
+                    conn.execute('CREATE INDEX {} ON {} ({})'.format(
+                        quote(to_index), quote(table_name),
+                        quote(index_column)))
+                else:
+                    conn.execute(
+                        'ALTER INDEX IF EXISTS {} RENAME TO {}'.format(
+                            quote(from_index), quote(to_index)))
+
+    def _recover_staging_table(self, table_name):
+        """Rename the staging table into the missing live table, which
+        is left by a swap interrupted between the renames.
+
+        :return: `bool` indicating whether the table is recovered.
+        """
+        if not self.is_rotate:
+            return False
+
+        staging_name = self.STAGING_TABLE_NAME.format(table_name=table_name)
+
+        if not self._has_table(staging_name):
+            return False
+
+        LOGGER.warning('Recovering table %s from %s',
+                       table_name, staging_name)
+        self._rename_tables(
+            conn=self._get_connection(table_name),
+            names=[(staging_name, table_name)],
+            index_column=self.TIME_INDEX_COLUMN)
+        self._update_table_names(
+            table_name, added=table_name, removed=staging_name)
+        return True
+
+    def _ensure_live_table(self, table_name, fields):
+        """Restore the live table after a failed swap.
+        """
+        try:
+            if (not self._has_table(table_name) and
+                    not self._recover_staging_table(table_name)):
+                self._tables[table_name] = self._create_table_schema(
+                    table_name=table_name,
+                    fields=fields,
+                    connection=self._get_connection(table_name))
+                self._update_table_names(table_name, added=table_name)
+        except Exception:
+            LOGGER.exception('Failed to restore table %s', table_name)
+            return
+
+        self._prepare_staging_table(table_name=table_name, fields=fields)
+
+    def _finalize_table(self, engine, table_name):
+        """Finalize the rotated table by updating its statistics for
+        the query planner.
+        """
+        if engine.dialect.name == 'mysql':
+            statement = 'ANALYZE TABLE {}'
+        else:
+            statement = 'ANALYZE {}'
+
+        try:
+            with engine.connect() as conn:
+                if engine.dialect.name == 'sqlite':
+                    # Sample the rows, as the worker waits for it
+                    conn.execute(
+                        'PRAGMA analysis_limit={}'.format(
+                            self.SQLITE_ANALYSIS_LIMIT))
+                conn.execute(statement.format(
+                    engine.dialect.identifier_preparer.quote(table_name)))
+        except Exception as exception:
+            LOGGER.warning(
+                'Failed to finalize table %s (%s)',
+                table_name, str(exception))
+            return
+
+        LOGGER.debug('Finalized table %s', table_name)
+
+    def _is_exchange_connection(self):
+        """Whether the connection is resolved per exchange, so that
+        there is no engine before the table name is known.
+        """
+        return '{exchange}' in self._connection
+
+    def _get_connection_url(self, table_name=None, worker=None):
+        """Get the connection url of the table in the worker, which is
+        the current worker if not specified.
+
+        The placeholder "{worker}" in the connection is replaced by
+        the worker index, e.g. "sqlite:///.data/order_book_{worker}.db"
+        writes the tables of each worker into a separate database file.
+        The placeholder "{exchange}" is replaced by the exchange name,
+        which is the prefix of the table name.
+        """
+        if worker is None:
+            worker = self._worker
+
+        url = self._connection.replace('{worker}', str(worker))
+
+        if table_name is not None:
+            url = url.replace('{exchange}', table_name.split('_')[0])
+
+        assert '{exchange}' not in url, (
+            "Connection ({}) requires the table name to resolve the "
+            "exchange".format(self._connection))
+
+        return url
+
+    def _get_parameters(self, fields):
+        """Get the bound parameters of the insert statement.
+        """
+        parameters = {}
+
+        for name, field in fields.items():
+            if field.is_auto_increment:
+                continue
+
+            value = field.value
+            if isinstance(value, datetime):
+                value = self._format_timestamp(value)
+
+            parameters[name] = value
+
+        return parameters
+
+    def _format_timestamp(self, value):
+        """Format the timestamp in the timestamp format.
+        """
+        if self._timestamp_format == 'epoch':
+            return (value - self.EPOCH) // timedelta(microseconds=1)
+        elif self._timestamp_format == 'native':
+            return value
+
+        return value.strftime('%Y%m%d %H:%M:%S.%f')
+
+    def _create_column(self, field_name, field):
         """Create column.
         """
         field_params = {}
@@ -131,7 +963,14 @@ class SqlHandler(RotateHandler):
                 precision=field.size,
                 scale=field.decimal)
         elif field.field_type is datetime:
-            field_type = String(26)
+            if self._timestamp_format == 'epoch':
+                field_type = BigInteger
+            elif self._timestamp_format == 'native':
+                # MySQL truncates the microseconds by default
+                field_type = DateTime().with_variant(
+                    mysql.DATETIME(fsp=6), 'mysql')
+            else:
+                field_type = String(26)
         else:
             raise NotImplementedError(
                 'Field type {type} not implemented'.format(
@@ -161,6 +1000,7 @@ class SqlHandler(RotateHandler):
         elif 'MySQL server has gone away' in str(exception):
             # Only for MySQL case:
             # Shuold rerun on MySQL server gone
+            self._reset_connection()
             return True
         else:
             raise
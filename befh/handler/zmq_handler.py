@@ -16,14 +16,16 @@ class ZmqHandler(Handler):
         """Constructor.
         """
         super().__init__(**kwargs)
+        assert self._workers == 1, (
+            "ZeroMQ handler does not support multiple workers")
         self._connection = connection
         self._context = zmq.Context()
         self._socket = None
 
-    def load(self, queue):
+    def load(self, **kwargs):
         """Load.
         """
-        super().load(queue=queue)
+        super().load(**kwargs)
         LOGGER.info('Binding connection %s as a publisher',
                     self._connection)
 
@@ -57,11 +59,11 @@ class ZmqHandler(Handler):
 
         return value.value
 
-    def run(self):
+    def run(self, **kwargs):
         """Run.
         """
         # The socket has to be initialized here due to pyzmq #1232
         # https://github.com/zeromq/pyzmq/issues/1232
         self._socket = self._context.socket(zmq.PUB)
         self._socket.bind(self._connection)
-        super().run()
+        super().run(**kwargs)
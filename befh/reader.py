@@ -0,0 +1,275 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    MetaData,
+    Table,
+    DateTime,
+    Integer,
+    Float,
+    Numeric,
+    create_engine,
+    inspect,
+    select)
+
+DATE_TIME_FORMAT = '%Y%m%d %H:%M:%S.%f'
+DATE_TIME_COLUMNS = ('date_time', 'trade_time')
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_ROTATE_FREQUENCY = '%Y%m%d'
+
+# Positions of the characters of '%Y%m%d %H:%M:%S.%f' in the ISO 8601
+# format '%Y-%m-%dT%H:%M:%S.%f', which NumPy parses natively
+ISO_INDEXES = ((0, 4, 0), (5, 7, 4), (8, 10, 6), (11, 26, 9))
+ISO_SEPARATORS = ((4, '-'), (7, '-'), (10, 'T'))
+NULL_DATE_TIME = '19700101 00:00:00.000000'
+EPOCH = datetime(1970, 1, 1)
+
+
+def read_table(connection, table_name, start_time=None, end_time=None,
+               columns=None, chunk_size=DEFAULT_CHUNK_SIZE,
+               is_data_frame=False, date_time_columns=DATE_TIME_COLUMNS):
+    """Read the table in chunks.
+
+    The rows are fetched through a server side cursor, so the memory
+    is bounded by the chunk size regardless of the table size.
+
+    :param connection: SQLAlchemy engine, connection or `str` of the
+        database url.
+    :param table_name: `str` of the table name.
+    :param start_time: `datetime` of the inclusive start of date_time.
+    :param end_time: `datetime` of the exclusive end of date_time.
+    :param columns: `list` of the column names. All the columns are
+        read if not specified.
+    :param chunk_size: `int` of the number of rows in each chunk.
+    :param is_data_frame: `bool` indicating whether the chunks are
+        pandas data frames instead of NumPy structured arrays.
+    :param date_time_columns: Column names parsed as `datetime64[us]`.
+    :return: Generator of the chunks ordered by id.
+    """
+    with _connect(connection) as conn:
+        table = Table(table_name, MetaData(), autoload=True,
+                      autoload_with=conn)
+        selected = [
+            column for column in table.columns
+            if columns is None or column.name in columns]
+
+        for column in selected:
+            # Fetch the numerics as floats instead of Decimal objects
+            if isinstance(column.type, Numeric):
+                column.type.asdecimal = False
+
+        statement = select(selected)
+
+        if start_time is not None:
+            statement = statement.where(
+                table.c.date_time >= format_date_time(
+                    start_time, table.c.date_time))
+
+        if end_time is not None:
+            statement = statement.where(
+                table.c.date_time < format_date_time(
+                    end_time, table.c.date_time))
+
+        if 'id' in table.c:
+            statement = statement.order_by(table.c.id)
+
+        dtype = [
+            (column.name, _get_dtype(column, date_time_columns))
+            for column in selected]
+        result = conn.execution_options(stream_results=True).execute(
+            statement)
+
+        try:
+            while True:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+
+                chunk = _to_structured_array(rows, dtype)
+
+                if is_data_frame:
+                    import pandas as pd
+                    chunk = pd.DataFrame(chunk)
+
+                yield chunk
+        finally:
+            result.close()
+
+
+def read_tables(connection, table_name, start_time=None, end_time=None,
+                rotate_frequency=DEFAULT_ROTATE_FREQUENCY, **kwargs):
+    """Read the time range across the rotated tables in chunks.
+
+    The chunks of the rotated tables are read in chronological order,
+    followed by the current table.
+
+    :param rotate_frequency: `str` of the `strftime` format of the
+        rotated table suffix.
+    :param kwargs: Other parameters passed to `read_table`.
+    """
+    table_names = get_table_names(
+        connection=connection,
+        table_name=table_name,
+        start_time=start_time,
+        end_time=end_time,
+        rotate_frequency=rotate_frequency)
+
+    for name in table_names:
+        yield from read_table(
+            connection=connection,
+            table_name=name,
+            start_time=start_time,
+            end_time=end_time,
+            **kwargs)
+
+
+def get_table_names(connection, table_name, start_time=None,
+                    end_time=None,
+                    rotate_frequency=DEFAULT_ROTATE_FREQUENCY):
+    """Get the names of the rotated and current tables covering the
+    time range.
+
+    A rotated table "{table_name}_{suffix}" is recorded from the time of
+    its suffix until the suffix of the next rotated table. The staging
+    tables of the rotation are excluded.
+
+    :return: `list` of the table names in chronological order.
+    """
+    with _connect(connection) as conn:
+        existing_names = inspect(conn).get_table_names()
+
+    prefix = table_name + '_'
+    rotated_tables = []
+
+    for name in existing_names:
+        if not name.startswith(prefix):
+            continue
+
+        try:
+            rotated_time = datetime.strptime(
+                name[len(prefix):], rotate_frequency)
+        except ValueError:
+            continue
+
+        rotated_tables.append((rotated_time, name))
+
+    rotated_tables.sort()
+    table_names = []
+
+    for i, (rotated_time, name) in enumerate(rotated_tables):
+        if end_time is not None and rotated_time >= end_time:
+            break
+
+        if (start_time is not None and i + 1 < len(rotated_tables) and
+                rotated_tables[i + 1][0] <= start_time):
+            continue
+
+        table_names.append(name)
+
+    if table_name in existing_names:
+        table_names.append(table_name)
+
+    return table_names
+
+
+def parse_date_time(values):
+    """Parse the date time values into `datetime64[us]` in a vectorized
+    way.
+
+    :param values: Sequence of `str` formatted as '%Y%m%d %H:%M:%S.%f',
+        `int` of epoch microseconds, `datetime` or None.
+    :return: NumPy array of `datetime64[us]`, where None is NaT.
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype=object)
+    is_null = np.equal(values, None)
+    non_null = values[~is_null]
+
+    if non_null.size > 0 and not isinstance(non_null[0], str):
+        if isinstance(non_null[0], datetime):
+            non_null = np.array(non_null.tolist(), dtype='datetime64[us]')
+        else:
+            non_null = np.array(non_null.tolist(), dtype='int64').astype(
+                'datetime64[us]')
+
+        parsed = np.full(len(values), np.datetime64('NaT'),
+                         dtype='datetime64[us]')
+        parsed[~is_null] = non_null
+        return parsed
+
+    strings = np.where(is_null, NULL_DATE_TIME, values).astype('U24')
+    chars = strings.view('U1').reshape(-1, 24)
+    iso_chars = np.empty((len(strings), 26), dtype='U1')
+
+    for start, end, source in ISO_INDEXES:
+        iso_chars[:, start:end] = chars[:, source:source + end - start]
+
+    for index, separator in ISO_SEPARATORS:
+        iso_chars[:, index] = separator
+
+    parsed = iso_chars.view('U26').ravel().astype('datetime64[us]')
+    parsed[is_null] = np.datetime64('NaT')
+    return parsed
+
+
+def _connect(connection):
+    """Connect to the database.
+
+    :return: Context manager of the connection.
+    """
+    if isinstance(connection, str):
+        connection = create_engine(connection)
+
+    return connection.connect()
+
+
+def _get_dtype(column, date_time_columns):
+    """Get the NumPy dtype of the column.
+    """
+    if column.name in date_time_columns:
+        return 'datetime64[us]'
+    elif isinstance(column.type, Integer):
+        return 'int64'
+    elif isinstance(column.type, (Float, Numeric)):
+        return 'float64'
+
+    return 'O'
+
+
+def _to_structured_array(rows, dtype):
+    """Convert the rows into a NumPy structured array.
+    """
+    import numpy as np
+
+    array = np.empty(len(rows), dtype=dtype)
+
+    for (name, column_dtype), values in zip(dtype, zip(*rows)):
+        if column_dtype == 'datetime64[us]':
+            array[name] = parse_date_time(values)
+        elif column_dtype == 'float64':
+            array[name] = np.array(values, dtype=float)
+        else:
+            array[name] = values
+
+    return array
+
+
+def format_date_time(timestamp, column=None):
+    """Format the timestamp as stored in the date time column.
+
+    :param timestamp: `datetime` of the timestamp.
+    :param column: SQLAlchemy `Column` of the date time, which is
+        either a string, an integer of epoch microseconds or a native
+        timestamp. The timestamp is formatted as a string if it is not
+        specified.
+    """
+    if not isinstance(timestamp, datetime):
+        return timestamp
+
+    if column is not None:
+        if isinstance(column.type, Integer):
+            return (timestamp - EPOCH) // timedelta(microseconds=1)
+        elif isinstance(column.type, DateTime):
+            return timestamp
+
+    return timestamp.strftime(DATE_TIME_FORMAT)
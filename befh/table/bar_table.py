@@ -0,0 +1,174 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from .table import (
+    Table,
+    Field,
+    IntIdField,
+    DateTimeField,
+    PriceField,
+    QuantityField)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class BarCountField(Field):
+    """Bar trade count field.
+    """
+
+    @property
+    def field_type(self):
+        """Field type.
+        """
+        return int
+
+
+class Bar(Table):
+    """OHLCV bar aggregated from the trades.
+
+    The bar of the interval is updated in constant time on each trade,
+    and is closed once a trade of a later interval arrives, or by the
+    timer once the interval is passed. Intervals without any trade are
+    not recorded.
+    """
+
+    TABLE_NAME = '{exchange}_{symbol}_bar_{interval}s'
+    CLOSE_DELAY = 1.0
+
+    def __init__(self, exchange, symbol, interval):
+        """Constructor.
+
+        :param interval: `int` of the bar interval in seconds.
+        """
+        super().__init__()
+        self._exchange = exchange
+        self._symbol = symbol
+        self._interval = interval
+        self._start_time = None
+        self._open = None
+        self._high = None
+        self._low = None
+        self._close = None
+        self._volume = 0.0
+        self._notional = 0.0
+        self._count = 0
+
+    @property
+    def interval(self):
+        """Interval.
+        """
+        return self._interval
+
+    @property
+    def table_name(self):
+        """Table name.
+        """
+        return self.TABLE_NAME.format(
+            exchange=self._exchange.lower(),
+            symbol=self._symbol.replace('/', '').lower(),
+            interval=self._interval)
+
+    @property
+    def fields(self):
+        """Fields of the current bar.
+        """
+        if self._volume > 0:
+            vwap = self._notional / self._volume
+        else:
+            vwap = self._close
+
+        fields = OrderedDict()
+        for field in [
+                IntIdField(name='id'),
+                DateTimeField(
+                    name='date_time',
+                    value=self._start_time or EPOCH),
+                PriceField(name='open', value=self._open),
+                PriceField(name='high', value=self._high),
+                PriceField(name='low', value=self._low),
+                PriceField(name='close', value=self._close),
+                QuantityField(name='volume', value=self._volume),
+                PriceField(name='vwap', value=vwap),
+                BarCountField(name='count', value=self._count)]:
+            fields[field.name] = field
+
+        return fields
+
+    def update(self, timestamp, price, quantity):
+        """Update the bar with the trade.
+
+        A trade before the current bar is aggregated into the current
+        bar, as the closed bars are already recorded.
+
+        :param timestamp: `datetime` of the trade in UTC.
+        :param price: `float` of the trade price.
+        :param quantity: `float` of the trade quantity.
+        :return: `OrderedDict` of the fields of the closed bar, or None
+            if the trade is in the current bar.
+        """
+        start_time = self.get_start_time(timestamp, self._interval)
+        closed_fields = None
+
+        if self._start_time is None:
+            self._start_time = start_time
+        elif start_time > self._start_time:
+            if self._count > 0:
+                closed_fields = self.fields
+            self._start_time = start_time
+            self._count = 0
+
+        if self._count == 0:
+            self._open = price
+            self._high = price
+            self._low = price
+            self._volume = 0.0
+            self._notional = 0.0
+        else:
+            self._high = max(self._high, price)
+            self._low = min(self._low, price)
+
+        self._close = price
+        self._volume += quantity
+        self._notional += price * quantity
+        self._count += 1
+
+        return closed_fields
+
+    def close(self, timestamp=None):
+        """Close the bar once its interval is passed.
+
+        The bar is closed CLOSE_DELAY seconds after the end of the
+        interval, so that the trades delayed by the network still fall
+        in their bar.
+
+        :param timestamp: `datetime` of the current time in UTC, or None
+            to close the open bar regardless of the time, e.g. on
+            shutdown.
+        :return: `OrderedDict` of the fields of the closed bar, or None
+            if no bar is closed.
+        """
+        if self._count == 0:
+            return None
+
+        if timestamp is not None:
+            if timestamp < self._start_time + timedelta(
+                    seconds=self._interval + self.CLOSE_DELAY):
+                return None
+
+        closed_fields = self.fields
+        self._count = 0
+
+        if timestamp is not None:
+            self._start_time = self.get_start_time(timestamp, self._interval)
+
+        return closed_fields
+
+    @staticmethod
+    def get_start_time(timestamp, interval):
+        """Get the start time of the bar containing the timestamp.
+
+        :param timestamp: `datetime` in UTC.
+        :param interval: `int` of the bar interval in seconds.
+        """
+        seconds = int((timestamp - EPOCH).total_seconds())
+        return EPOCH + timedelta(seconds=seconds - seconds % interval)
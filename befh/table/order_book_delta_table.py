@@ -0,0 +1,314 @@
+from collections import OrderedDict
+
+from .order_book_table import OrderBook, OrderBookUpdateTypeField
+from .table import (
+    Field,
+    IntIdField,
+    DateTimeField,
+    PriceField,
+    QuantityField)
+
+
+class OrderBookSideField(Field):
+    """Order book side field.
+    """
+
+    TRADE = 0
+    BID = 1
+    ASK = 2
+
+    @property
+    def field_type(self):
+        """Field type.
+        """
+        return int
+
+
+class OrderBookLevelField(Field):
+    """Order book level field.
+    """
+
+    @property
+    def field_type(self):
+        """Field type.
+        """
+        return int
+
+
+class OrderBookDelta(OrderBook):
+    """Order book recorded as a change log.
+
+    Each row records a single level as (date_time, side, level, price,
+    qty). Only the changed levels are recorded on an order book update,
+    and all the levels are recorded periodically as a keyframe, so that
+    the full order book at any timestamp is reconstructed from the
+    latest keyframe and the following changes.
+    """
+
+    TABLE_NAME = '{exchange}_{symbol}_delta'
+    SNAPSHOT_UPDATE_TYPES = (
+        OrderBookUpdateTypeField.KEYFRAME,
+        OrderBookUpdateTypeField.SAMPLE)
+    DEFAULT_KEYFRAME_INTERVAL = 60
+
+    def __init__(self, exchange, symbol, depth=5,
+                 keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, **kwargs):
+        """Constructor.
+
+        :param keyframe_interval: `float` of the seconds between
+            the keyframes.
+        """
+        super().__init__(
+            exchange=exchange, symbol=symbol, depth=depth, **kwargs)
+        self._keyframe_interval = keyframe_interval
+        self._update_count = 0
+        self._keyframe_update_count = None
+        self._keyframe_time = None
+
+    @property
+    def is_book_update_recorded(self):
+        """Is book update recorded.
+        """
+        return True
+
+    def _get_fields(self):
+        """Get fields.
+        """
+        return self._create_row(
+            update_type=OrderBookUpdateTypeField.ORDER_BOOK,
+            side=OrderBookSideField.TRADE,
+            level=0,
+            price=-1,
+            quantity=-1)
+
+    def update_table(self, handler):
+        """Update table.
+
+        The rows of the update are the same for all the handlers.
+        """
+        self._update_bar_tables(handler)
+
+        if self._update_trade_table(handler):
+            return
+
+        for fields in self._get_update_rows():
+            handler.prepare_insert(
+                table_name=self.table_name,
+                fields=self._to_ordered_fields(fields))
+
+    def update_bids_asks(self, bids, asks):
+        """Update bids and asks.
+        """
+        self._update_count += 1
+        return super().update_bids_asks(bids=bids, asks=asks)
+
+    def websocket_update_bids_asks(self, bids, asks):
+        """Update bids and asks.
+        """
+        self._update_count += 1
+        return super().websocket_update_bids_asks(bids=bids, asks=asks)
+
+    def update_trade(self, trade, current_timestamp):
+        """Update trades.
+        """
+        is_updated = super().update_trade(
+            trade=trade,
+            current_timestamp=current_timestamp)
+
+        if is_updated:
+            self._update_count += 1
+
+        return is_updated
+
+    def get_sample_rows(self, timestamp):
+        """Get the rows sampling all the levels at the timestamp.
+        """
+        if self._book_version == self._sampled_book_version:
+            return []
+
+        self._sampled_book_version = self._book_version
+
+        return [
+            self._to_ordered_fields(fields)
+            for fields in self._get_levels_rows(
+                update_type=OrderBookUpdateTypeField.SAMPLE,
+                is_changed_only=False,
+                date_time=timestamp)]
+
+    @classmethod
+    def reconstruct(cls, rows):
+        """Reconstruct the order book from the rows.
+
+        :param rows: Iterable of (date_time, update_type, side, level,
+            price, qty) ordered by id, starting from a keyframe or
+            a sample.
+        :return: `dict` of "date_time", "bids" and "asks", where the
+            bids and asks are lists of (price, qty) ordered by level.
+        """
+        bids = {}
+        asks = {}
+        date_time = None
+        is_keyframe = False
+
+        for date_time, update_type, side, level, price, quantity in rows:
+            if update_type in cls.SNAPSHOT_UPDATE_TYPES:
+                if not is_keyframe:
+                    bids.clear()
+                    asks.clear()
+                is_keyframe = True
+            else:
+                is_keyframe = False
+
+            if side == OrderBookSideField.BID:
+                bids[level] = (price, quantity)
+            elif side == OrderBookSideField.ASK:
+                asks[level] = (price, quantity)
+
+        return {
+            'date_time': date_time,
+            'bids': [bids[level] for level in sorted(bids.keys())],
+            'asks': [asks[level] for level in sorted(asks.keys())],
+        }
+
+    @classmethod
+    def read_order_book(cls, connection, table_name, timestamp):
+        """Read the order book at the timestamp from the database.
+
+        :param connection: SQLAlchemy engine or connection.
+        :param table_name: `str` of the table name.
+        :param timestamp: `datetime` of the order book time.
+        :return: `dict` of the order book, or None if no keyframe or
+            sample is recorded before the timestamp.
+        """
+        from sqlalchemy import MetaData, Table, and_, func, select
+        from befh.reader import format_date_time
+
+        table = Table(table_name, MetaData(), autoload=True,
+                      autoload_with=connection)
+        timestamp = format_date_time(timestamp, table.c.date_time)
+
+        keyframe_time = connection.execute(
+            select([func.max(table.c.date_time)]).where(and_(
+                table.c.update_type.in_(cls.SNAPSHOT_UPDATE_TYPES),
+                table.c.date_time <= timestamp))).scalar()
+
+        if keyframe_time is None:
+            return None
+
+        rows = connection.execute(
+            select([
+                table.c.date_time,
+                table.c.update_type,
+                table.c.side,
+                table.c.level,
+                table.c.price,
+                table.c.qty]).where(and_(
+                    table.c.date_time >= keyframe_time,
+                    table.c.date_time <= timestamp)).order_by(table.c.id))
+
+        return cls.reconstruct(
+            (date_time, update_type, side, level,
+             float(price), float(quantity))
+            for date_time, update_type, side, level, price, quantity
+            in rows)
+
+    def _get_update_rows(self):
+        """Get the rows of the latest update.
+        """
+        update_type = self._update_type.value
+
+        if self._is_keyframe():
+            rows = self._get_levels_rows(
+                update_type=OrderBookUpdateTypeField.KEYFRAME,
+                is_changed_only=False)
+        elif update_type == OrderBookUpdateTypeField.ORDER_BOOK:
+            rows = self._get_levels_rows(
+                update_type=OrderBookUpdateTypeField.ORDER_BOOK,
+                is_changed_only=True)
+        else:
+            rows = []
+
+        if update_type == OrderBookUpdateTypeField.TRADE:
+            rows.append(self._create_row(
+                update_type=OrderBookUpdateTypeField.TRADE,
+                side=OrderBookSideField.TRADE,
+                level=0,
+                price=self._trade[self.TRADE_PX_INDEX].value,
+                quantity=self._trade[self.TRADE_QTY_INDEX].value))
+
+        return rows
+
+    def _is_keyframe(self):
+        """Indicate whether the latest update is recorded as a keyframe.
+
+        The decision is made once per update, so that every handler
+        receives the same rows.
+        """
+        if self._keyframe_update_count == self._update_count:
+            return True
+
+        current_time = self._update_time.value
+
+        if (self._keyframe_time is None or
+                (current_time - self._keyframe_time).total_seconds() >=
+                self._keyframe_interval):
+            self._keyframe_update_count = self._update_count
+            self._keyframe_time = current_time
+            return True
+
+        return False
+
+    def _get_levels_rows(self, update_type, is_changed_only,
+                         date_time=None):
+        """Get the rows of the order book levels.
+        """
+        rows = []
+
+        for side, levels, prev_levels in [
+                (OrderBookSideField.BID, self._bids, self._prev_bids),
+                (OrderBookSideField.ASK, self._asks, self._prev_asks)]:
+            for i in range(0, self._depth):
+                price, quantity = levels[i]
+                prev_price, prev_quantity = prev_levels[i]
+
+                if (is_changed_only and
+                        price == prev_price and
+                        quantity == prev_quantity):
+                    continue
+
+                rows.append(self._create_row(
+                    update_type=update_type,
+                    side=side,
+                    level=i + 1,
+                    price=price.value,
+                    quantity=quantity.value,
+                    date_time=date_time))
+
+        return rows
+
+    def _create_row(self, update_type, side, level, price, quantity,
+                    date_time=None):
+        """Create the fields of a row.
+        """
+        if date_time is None:
+            date_time = self._update_time.value
+
+        return [
+            IntIdField(name='id'),
+            DateTimeField(name='date_time', value=date_time),
+            OrderBookUpdateTypeField(name='update_type', value=update_type),
+            OrderBookSideField(name='side', value=side),
+            OrderBookLevelField(name='level', value=level),
+            PriceField(name='price', value=price),
+            QuantityField(name='qty', value=quantity),
+        ]
+
+    @staticmethod
+    def _to_ordered_fields(fields):
+        """Convert the list of fields into an ordered dict.
+        """
+        ordered_fields = OrderedDict()
+        for field in fields:
+            ordered_fields[field.name] = field
+
+        return ordered_fields
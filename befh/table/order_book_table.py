@@ -2,6 +2,7 @@ from datetime import datetime
 from collections import OrderedDict
 from copy import deepcopy
 
+from .bar_table import Bar
 from .table import (
     Table,
     Field,
@@ -11,6 +12,8 @@ from .table import (
     PriceField,
     QuantityField)
 
+MILLISECONDS_TIMESTAMP_THRESHOLD = 1e11
+
 
 class OrderBookUpdateTypeField(Field):
     """Order book update type field.
@@ -18,6 +21,8 @@ class OrderBookUpdateTypeField(Field):
 
     ORDER_BOOK = 1
     TRADE = 2
+    KEYFRAME = 3
+    SAMPLE = 4
 
     @property
     def field_type(self):
@@ -26,11 +31,59 @@ class OrderBookUpdateTypeField(Field):
         return int
 
 
+class TradeIdField(Field):
+    """Trade id field.
+    """
+
+    @property
+    def field_type(self):
+        """Field type.
+        """
+        return str
+
+    @property
+    def field_length(self):
+        """Field length.
+        """
+        return 64
+
+
+class TradeSideField(Field):
+    """Trade side field.
+    """
+
+    UNKNOWN = 0
+    BUY = 1
+    SELL = 2
+
+    @property
+    def field_type(self):
+        """Field type.
+        """
+        return int
+
+    @classmethod
+    def parse(cls, side):
+        """Parse the side of ccxt and cryptofeed.
+        """
+        if side is None:
+            return cls.UNKNOWN
+
+        side = str(side).lower()
+        if side in ('buy', 'bid'):
+            return cls.BUY
+        elif side in ('sell', 'ask'):
+            return cls.SELL
+
+        return cls.UNKNOWN
+
+
 class OrderBook(Table):
     """Order book.
     """
 
     TABLE_NAME = '{exchange}_{symbol}_order'
+    TRADE_TABLE_NAME = '{exchange}_{symbol}_trade'
     DEFAULT_NUM_TIMESTAMPS_STORED = 10
 
     TRADE_PX_INDEX = 0
@@ -38,20 +91,35 @@ class OrderBook(Table):
     TRADE_ID_INDEX = 2
     TRADE_TIMESTAMP_INDEX = 3
 
-    def __init__(self, exchange, symbol, depth=5):
+    def __init__(self, exchange, symbol, depth=5, is_trade_table=False,
+                 bar_intervals=None):
         """Constructor.
 
         :param depth: `int` of order book depth.
+        :param is_trade_table: `bool` indicating whether the trades are
+            recorded in a separate trade table, and the order book
+            table is only recorded on order book updates.
+        :param bar_intervals: `list` of `int` of the intervals in
+            seconds of the bars aggregated from the trades.
         """
         self._exchange = exchange
         self._symbol = symbol
         self._depth = depth
+        self._is_trade_table = is_trade_table
         self._bids = self.create_depths('b', depth)
         self._asks = self.create_depths('a', depth)
         self._prev_bids = self.create_depths('b', depth)
         self._prev_asks = self.create_depths('a', depth)
         self._trade = self.create_trade()
         self._prev_trade = self.create_trade()
+        self._trade_side = TradeSideField.UNKNOWN
+        self._trade_time = None
+        self._book_version = 0
+        self._sampled_book_version = 0
+        self._bars = [
+            Bar(exchange=exchange, symbol=symbol, interval=interval)
+            for interval in bar_intervals or []]
+        self._closed_bars = []
         self._update_type = OrderBookUpdateTypeField(
             name='update_type',
             value=0)
@@ -91,6 +159,45 @@ class OrderBook(Table):
             exchange=self._exchange.lower(),
             symbol=self._symbol.replace('/', '').lower())
 
+    @property
+    def trade_table_name(self):
+        """Trade table name.
+        """
+        return self.TRADE_TABLE_NAME.format(
+            exchange=self._exchange.lower(),
+            symbol=self._symbol.replace('/', '').lower())
+
+    @property
+    def tables(self):
+        """List of (table name, fields) recorded by the order book.
+        """
+        tables = [(self.table_name, self.fields)]
+
+        if self._is_trade_table:
+            tables.append((self.trade_table_name, self.trade_fields))
+
+        for bar in self._bars:
+            tables.append((bar.table_name, bar.fields))
+
+        return tables
+
+    @property
+    def is_book_update_recorded(self):
+        """Indicate whether the order book updates are recorded in
+        addition to the trades.
+        """
+        return self._is_trade_table
+
+    @property
+    def trade_fields(self):
+        """Trade fields.
+        """
+        fields = OrderedDict()
+        for field in self._get_trade_fields():
+            fields[field.name] = field
+
+        return fields
+
     @property
     def fields(self):
         """Fields.
@@ -103,21 +210,46 @@ class OrderBook(Table):
 
     def _get_fields(self):
         """Get fields.
+
+        The trade columns are recorded in the trade table instead if
+        it is enabled.
         """
         fields = [
             IntIdField(name='id'),
             self._update_time,
             self._update_type,
-            self._trade[self.TRADE_PX_INDEX],
-            self._trade[self.TRADE_QTY_INDEX]
         ]
 
+        if not self._is_trade_table:
+            fields += [
+                self._trade[self.TRADE_PX_INDEX],
+                self._trade[self.TRADE_QTY_INDEX]]
+
         for i in range(0, self._depth):
             fields += self._bids[i]
             fields += self._asks[i]
 
         return fields
 
+    def _get_trade_fields(self):
+        """Get trade fields.
+        """
+        return [
+            IntIdField(name='id'),
+            DateTimeField(name='date_time', value=self._update_time.value),
+            DateTimeField(name='trade_time', value=self._trade_time),
+            TradeIdField(
+                name='tid',
+                value=str(self._trade[self.TRADE_ID_INDEX].value)),
+            PriceField(
+                name='price',
+                value=self._trade[self.TRADE_PX_INDEX].value),
+            QuantityField(
+                name='qty',
+                value=self._trade[self.TRADE_QTY_INDEX].value),
+            TradeSideField(name='side', value=self._trade_side),
+        ]
+
     def create_table(self, handler):
         """Create table.
         """
@@ -128,10 +260,59 @@ class OrderBook(Table):
     def update_table(self, handler):
         """Update table.
         """
+        self._update_bar_tables(handler)
+
+        if self._update_trade_table(handler):
+            return
+
         handler.prepare_insert(
             table_name=self.table_name,
             fields=self.fields)
 
+    def get_sample_rows(self, timestamp):
+        """Get the rows sampling the order book at the timestamp.
+
+        :param timestamp: `datetime` of the sampling time.
+        :return: `list` of the fields of each row, which is empty if
+            the order book is not changed since the last sample.
+        """
+        if self._book_version == self._sampled_book_version:
+            return []
+
+        self._sampled_book_version = self._book_version
+        fields = self.fields
+        fields['date_time'] = DateTimeField(
+            name='date_time', value=timestamp)
+        fields['update_type'] = OrderBookUpdateTypeField(
+            name='update_type', value=OrderBookUpdateTypeField.SAMPLE)
+
+        return [fields]
+
+    def _update_trade_table(self, handler):
+        """Update the trade table if the latest update is a trade.
+
+        :return: `bool` indicating whether the trade table is updated.
+        """
+        if (not self._is_trade_table or
+                self._update_type.value != OrderBookUpdateTypeField.TRADE):
+            return False
+
+        handler.prepare_insert(
+            table_name=self.trade_table_name,
+            fields=self.trade_fields)
+        return True
+
+    def _update_bar_tables(self, handler):
+        """Insert the bars closed by the latest trade.
+        """
+        if self._update_type.value != OrderBookUpdateTypeField.TRADE:
+            return
+
+        for table_name, fields in self._closed_bars:
+            handler.prepare_insert(
+                table_name=table_name,
+                fields=fields)
+
     def is_possible_trade(self):
         """Check if any trade is detected.
         """
@@ -140,9 +321,9 @@ class OrderBook(Table):
         elif self._bids[0][1] != self._prev_bids[0][1]:
             return True
 
-        if self._bids[0][0] != self._prev_bids[0][0]:
+        if self._asks[0][0] != self._prev_asks[0][0]:
             return True
-        elif self._bids[0][1] != self._prev_bids[0][1]:
+        elif self._asks[0][1] != self._prev_asks[0][1]:
             return True
 
         return False
@@ -186,6 +367,9 @@ class OrderBook(Table):
         self._update_type.value = (
             OrderBookUpdateTypeField.ORDER_BOOK)
 
+        if is_update:
+            self._book_version += 1
+
         return is_update
     
     
@@ -239,6 +423,9 @@ class OrderBook(Table):
         self._update_type.value = (
             OrderBookUpdateTypeField.ORDER_BOOK)
 
+        if is_update:
+            self._book_version += 1
+
         return is_update
     
 
@@ -273,10 +460,57 @@ class OrderBook(Table):
         self._trade[self.TRADE_QTY_INDEX].value = trade['amount']
         self._trade[self.TRADE_ID_INDEX].value = trade['id']
         self._trade[self.TRADE_TIMESTAMP_INDEX].value = trade['timestamp']
+        self._trade_side = TradeSideField.parse(trade.get('side'))
+        self._trade_time = self._parse_trade_time(trade['timestamp'])
         self._prev_update_time.value = self._update_time.value
         self._update_time.value = current_timestamp
         self._update_type.value = OrderBookUpdateTypeField.TRADE
+        self._update_bars(self._trade_time or current_timestamp)
         #self._trades_per_timestamp.setdefault(timestamp, []).append(
             #trade_id)
 
         return True
+
+    def _update_bars(self, timestamp):
+        """Aggregate the latest trade into the bars.
+        """
+        self._closed_bars = []
+
+        for bar in self._bars:
+            fields = bar.update(
+                timestamp=timestamp,
+                price=self._trade[self.TRADE_PX_INDEX].value,
+                quantity=self._trade[self.TRADE_QTY_INDEX].value)
+
+            if fields is not None:
+                self._closed_bars.append((bar.table_name, fields))
+
+    def get_closed_bar_rows(self, timestamp=None):
+        """Close the bars of which the interval is passed.
+
+        :param timestamp: `datetime` of the current time in UTC, or None
+            to close all the open bars, e.g. on shutdown.
+        :return: `list` of the table name and the fields of the closed
+            bars.
+        """
+        rows = []
+
+        for bar in self._bars:
+            fields = bar.close(timestamp)
+
+            if fields is not None:
+                rows.append((bar.table_name, fields))
+
+        return rows
+
+    @staticmethod
+    def _parse_trade_time(timestamp):
+        """Parse the trade timestamp in seconds or milliseconds.
+        """
+        if not isinstance(timestamp, (int, float)) or timestamp <= 0:
+            return None
+
+        if timestamp > MILLISECONDS_TIMESTAMP_THRESHOLD:
+            timestamp /= 1000.0
+
+        return datetime.utcfromtimestamp(timestamp)
@@ -0,0 +1,334 @@
+import asyncio
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import logging
+import random
+from threading import Event, Thread
+from time import time
+
+import websockets
+
+LOGGER = logging.getLogger(__name__)
+
+ORDER_BOOK_TABLE = 'orderBookL2'
+TRADE_TABLE = 'trade'
+SIDES = ('Buy', 'Sell')
+
+
+class FakeBitmexServer:
+    """Fake BitMEX realtime API server.
+
+    The server speaks the orderBookL2 and trade tables of the BitMEX
+    websocket protocol on "ws://{host}:{port}/realtime", so that a
+    cryptofeed BitMEX feed connects to it through the websocket_address
+    of the subscription. The active instruments are served on
+    "http://{host}:{rest_port}/api/v1/instrument/active".
+
+    Each connection receives the updates of its subscribed instruments
+    at the message rate, plus a burst of messages every burst interval.
+    The trade match id is the send time in epoch seconds, so that the
+    latency of the trades is measured at the receiver.
+    """
+
+    DEFAULT_RATE = 100.0
+    DEFAULT_DEPTH = 25
+    DEFAULT_TRADE_RATIO = 0.1
+    TICK_SIZE = 0.5
+    # Seconds between the sends of the due messages
+    SEND_INTERVAL = 0.001
+
+    def __init__(self, symbols, rate=DEFAULT_RATE, depth=DEFAULT_DEPTH,
+                 trade_ratio=DEFAULT_TRADE_RATIO, burst_size=0,
+                 burst_interval=1.0, host='127.0.0.1', port=0,
+                 rest_port=0, seed=0):
+        """Constructor.
+
+        :param symbols: `list` of the instrument symbols.
+        :param rate: `float` of the messages per second per instrument.
+        :param depth: `int` of the number of levels on each side.
+        :param trade_ratio: `float` of the fraction of the messages
+            which are trades.
+        :param burst_size: `int` of the number of messages sent at once
+            every burst interval in addition to the message rate.
+        :param burst_interval: `float` of the seconds between the
+            bursts.
+        :param port: `int` of the websocket port. A free port is
+            chosen if it is 0.
+        :param rest_port: `int` of the REST API port. A free port is
+            chosen if it is 0.
+        :param seed: `int` of the random seed of the updates.
+        """
+        assert 0 <= trade_ratio <= 1, (
+            "Trade ratio ({}) must be between 0 and 1".format(trade_ratio))
+        self._symbols = list(symbols)
+        self._rate = rate
+        self._depth = depth
+        self._trade_ratio = trade_ratio
+        self._burst_size = burst_size
+        self._burst_interval = burst_interval
+        self._host = host
+        self._port = port
+        self._rest_port = rest_port
+        self._random = random.Random(seed)
+        self._books = {
+            symbol: self._create_book(100.0 * (i + 1))
+            for i, symbol in enumerate(self._symbols)}
+        self._loop = None
+        self._server = None
+        self._rest_server = None
+        self._message_count = 0
+        self._trade_count = 0
+
+    @property
+    def address(self):
+        """Websocket address.
+        """
+        return 'ws://%s:%d/realtime' % (self._host, self._port)
+
+    @property
+    def rest_address(self):
+        """REST API address.
+        """
+        return 'http://%s:%d' % (self._host, self._rest_port)
+
+    @property
+    def message_count(self):
+        """Number of the messages sent.
+        """
+        return self._message_count
+
+    @property
+    def trade_count(self):
+        """Number of the trades sent.
+        """
+        return self._trade_count
+
+    def start(self):
+        """Start the servers in background threads.
+        """
+        self._rest_server = HTTPServer(
+            (self._host, self._rest_port), self._create_rest_handler())
+        self._rest_port = self._rest_server.server_address[1]
+        Thread(target=self._rest_server.serve_forever, daemon=True).start()
+
+        is_started = Event()
+        Thread(target=self._run, args=(is_started,), daemon=True).start()
+        is_started.wait()
+        LOGGER.info('Started fake BitMEX server on %s', self.address)
+
+    def stop(self):
+        """Stop the servers.
+        """
+        self._rest_server.shutdown()
+        self._loop.call_soon_threadsafe(self._server.close)
+
+    def _run(self, is_started):
+        """Run the websocket server in the event loop of the thread.
+        """
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(self._serve())
+        self._port = self._server.sockets[0].getsockname()[1]
+        is_started.set()
+        self._loop.run_forever()
+
+    async def _serve(self):
+        """Create the websocket server in the running event loop.
+        """
+        return await websockets.serve(self._handle, self._host, self._port)
+
+    def _create_rest_handler(self):
+        """Create the request handler class of the REST API.
+        """
+        instruments = json.dumps([
+            {'symbol': symbol, 'state': 'Open'}
+            for symbol in self._symbols]).encode('utf-8')
+
+        class RestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/api/v1/instrument/active':
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(instruments)))
+                self.end_headers()
+                self.wfile.write(instruments)
+
+            def log_message(self, *args):
+                pass
+
+        return RestHandler
+
+    async def _handle(self, websocket, path=None):
+        """Handle a websocket connection.
+        """
+        subscriptions = {ORDER_BOOK_TABLE: [], TRADE_TABLE: []}
+        producer = None
+
+        await websocket.send(json.dumps({
+            'info': 'Welcome to the fake BitMEX Realtime API.',
+            'version': 'fake',
+            'timestamp': self._get_timestamp(),
+        }))
+
+        try:
+            async for message in websocket:
+                request = json.loads(message)
+
+                if request.get('op') != 'subscribe':
+                    await websocket.send(json.dumps({
+                        'error': 'Unknown operation',
+                        'request': request}))
+                    continue
+
+                for arg in request['args']:
+                    table, _, symbol = arg.partition(':')
+
+                    if (table not in subscriptions or
+                            symbol not in self._books):
+                        await websocket.send(json.dumps({
+                            'success': False,
+                            'error': 'Unknown table: %s' % arg,
+                            'request': request}))
+                        continue
+
+                    subscriptions[table].append(symbol)
+                    await websocket.send(json.dumps({
+                        'success': True,
+                        'subscribe': arg,
+                        'request': request}))
+
+                    if table == ORDER_BOOK_TABLE:
+                        await websocket.send(self._create_partial(symbol))
+
+                if producer is None:
+                    producer = asyncio.ensure_future(
+                        self._produce(websocket, subscriptions))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if producer is not None:
+                producer.cancel()
+
+    async def _produce(self, websocket, subscriptions):
+        """Send the updates at the message rate and in bursts.
+        """
+        start_time = time()
+        next_burst_time = start_time + self._burst_interval
+        regular_count = 0
+
+        try:
+            while True:
+                now = time()
+                symbols = sorted(set(
+                    subscriptions[ORDER_BOOK_TABLE] +
+                    subscriptions[TRADE_TABLE]))
+                due_count = int(
+                    (now - start_time) * self._rate * len(symbols) -
+                    regular_count)
+                regular_count += due_count
+
+                if self._burst_size > 0 and now >= next_burst_time:
+                    due_count += self._burst_size
+                    next_burst_time += self._burst_interval
+
+                for _ in range(due_count):
+                    message = self._create_update(
+                        self._random.choice(symbols), subscriptions)
+                    if message is not None:
+                        await websocket.send(message)
+
+                await asyncio.sleep(self.SEND_INTERVAL)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def _create_book(self, mid_price):
+        """Create the levels of an order book.
+
+        :return: `dict` of the side to `dict` of the level id to the
+            price and size.
+        """
+        book = {}
+
+        for side in SIDES:
+            sign = -1 if side == 'Buy' else 1
+            book[side] = {
+                '%s%d' % (side, level): [
+                    mid_price + sign * self.TICK_SIZE * (level + 1),
+                    self._random.randint(1, 1000)]
+                for level in range(self._depth)}
+
+        return book
+
+    def _create_partial(self, symbol):
+        """Create the partial message of the order book.
+        """
+        return json.dumps({
+            'table': ORDER_BOOK_TABLE,
+            'action': 'partial',
+            'data': [
+                self._create_level(symbol, side, level_id)
+                for side in SIDES
+                for level_id in self._books[symbol][side]]})
+
+    def _create_update(self, symbol, subscriptions):
+        """Create an update message of the order book or the trades.
+
+        :return: `str` of the message, or None if the instrument is not
+            subscribed in the table.
+        """
+        is_trade = self._random.random() < self._trade_ratio
+        table = TRADE_TABLE if is_trade else ORDER_BOOK_TABLE
+
+        if symbol not in subscriptions[table]:
+            return None
+
+        side = self._random.choice(SIDES)
+        self._message_count += 1
+
+        if is_trade:
+            self._trade_count += 1
+            # A buy trade takes the best ask and a sell trade the best
+            # bid
+            opposite = 'Sell' if side == 'Buy' else 'Buy'
+            price = self._books[symbol][opposite]['%s0' % opposite][0]
+            return json.dumps({
+                'table': TRADE_TABLE,
+                'action': 'insert',
+                'data': [{
+                    'timestamp': self._get_timestamp(),
+                    'symbol': symbol,
+                    'side': side,
+                    'size': self._random.randint(1, 100),
+                    'price': price,
+                    'trdMatchID': '%.6f' % time(),
+                }]})
+
+        level_id = self._random.choice(list(self._books[symbol][side]))
+        self._books[symbol][side][level_id][1] = self._random.randint(
+            1, 1000)
+        return json.dumps({
+            'table': ORDER_BOOK_TABLE,
+            'action': 'update',
+            'data': [self._create_level(symbol, side, level_id)]})
+
+    def _create_level(self, symbol, side, level_id):
+        """Create the data of a level.
+        """
+        price, size = self._books[symbol][side][level_id]
+        return {
+            'symbol': symbol,
+            'id': level_id,
+            'side': side,
+            'size': size,
+            'price': price,
+        }
+
+    @staticmethod
+    def _get_timestamp():
+        """Get the current time in the format of BitMEX.
+        """
+        return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
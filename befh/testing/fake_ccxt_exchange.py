@@ -0,0 +1,227 @@
+from collections import Counter, deque
+import random
+from threading import Lock
+from time import sleep, time
+
+from ccxt.base.errors import (
+    BadSymbol,
+    DDoSProtection,
+    NetworkError,
+    RequestTimeout)
+
+
+class FakeCcxtExchange:
+    """Fake ccxt exchange serving synthetic markets, order books and
+    trades in process.
+
+    The order book of an instrument changes before a request with the
+    probability of its activity, and each change comes with a trade.
+    Each request waits for the latency, and fails with RequestTimeout
+    or NetworkError at the error rates. A request made within the rate
+    limit of the previous one fails with DDoSProtection if the rate
+    limit is enforced.
+
+    It is plugged into a REST API exchange by the subscription, e.g.
+
+        interface: befh.testing.fake_ccxt_exchange.FakeCcxtExchange
+        interface_config:
+            rateLimit: 100
+            symbols: [BTC/USD, ETH/USD]
+            activities: {BTC/USD: 0.9}
+    """
+
+    DEFAULT_SYMBOLS = ('BTC/USD',)
+    DEFAULT_RATE_LIMIT = 100
+    DEFAULT_ACTIVITY = 0.5
+    DEFAULT_DEPTH = 20
+    MAXIMUM_TRADES = 100
+    TICK_SIZE = 0.5
+
+    def __init__(self, config=None):
+        """Constructor.
+
+        :param config: `dict` of the ccxt configuration with the
+            following keys of the fake exchange.
+            "symbols": `list` of the instrument symbols.
+            "rateLimit": `int` of the milliseconds between requests.
+            "activity": `float` of the probability that the order book
+            changes between two requests.
+            "activities": `dict` of the activity of each symbol.
+            "latency": `float` of the seconds of each request.
+            "timeout_rate": `float` of the probability of
+            RequestTimeout.
+            "network_error_rate": `float` of the probability of
+            NetworkError.
+            "enforce_rate_limit": `bool` indicating whether to fail the
+            requests within the rate limit by DDoSProtection.
+            "depth": `int` of the number of levels on each side.
+            "seed": `int` of the random seed.
+        """
+        config = config or {}
+        self.id = 'fake'
+        self.rateLimit = config.get('rateLimit', self.DEFAULT_RATE_LIMIT)
+        self.markets = None
+        self.currencies = None
+        self._symbols = list(config.get('symbols', self.DEFAULT_SYMBOLS))
+        self._activities = {
+            symbol: config.get('activities', {}).get(
+                symbol, config.get('activity', self.DEFAULT_ACTIVITY))
+            for symbol in self._symbols}
+        self._latency = config.get('latency', 0.0)
+        self._timeout_rate = config.get('timeout_rate', 0.0)
+        self._network_error_rate = config.get('network_error_rate', 0.0)
+        self._is_enforce_rate_limit = config.get(
+            'enforce_rate_limit', False)
+        self._depth = config.get('depth', self.DEFAULT_DEPTH)
+        self._random = random.Random(config.get('seed', 0))
+        self._lock = Lock()
+        self._last_request_time = None
+        self._mid_prices = {
+            symbol: 100.0 * (i + 1)
+            for i, symbol in enumerate(self._symbols)}
+        self._sizes = {symbol: 1.0 for symbol in self._symbols}
+        self._trades = {
+            symbol: deque(maxlen=self.MAXIMUM_TRADES)
+            for symbol in self._symbols}
+        self._trade_id = 0
+        self.request_counts = Counter()
+        self.error_counts = Counter()
+        self.change_counts = Counter()
+
+    def load_markets(self, reload=False, params={}):
+        """Load the markets.
+        """
+        self._request('load_markets')
+
+        if self.markets is None or reload:
+            self.set_markets([
+                self._create_market(symbol) for symbol in self._symbols])
+
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        """Set the markets.
+
+        :param markets: `list` or `dict` of the markets.
+        """
+        if isinstance(markets, dict):
+            markets = list(markets.values())
+
+        self.markets = {market['symbol']: market for market in markets}
+        self.currencies = currencies or {
+            code: {'id': code, 'code': code}
+            for market in markets
+            for code in (market['base'], market['quote'])}
+        return self.markets
+
+    def fetch_order_book(self, symbol, limit=None, params={}):
+        """Fetch the order book.
+        """
+        self._request('fetch_order_book', symbol)
+
+        with self._lock:
+            if self._random.random() < self._activities[symbol]:
+                self._change(symbol)
+
+            mid_price = self._mid_prices[symbol]
+            size = self._sizes[symbol]
+
+        depth = min(limit or self._depth, self._depth)
+        return {
+            'symbol': symbol,
+            'bids': [[mid_price - self.TICK_SIZE * (i + 1), size + i]
+                     for i in range(depth)],
+            'asks': [[mid_price + self.TICK_SIZE * (i + 1), size + i]
+                     for i in range(depth)],
+            'timestamp': int(time() * 1000),
+            'datetime': None,
+            'nonce': None,
+        }
+
+    def fetch_trades(self, symbol, since=None, limit=None, params={}):
+        """Fetch the recent trades in chronological order.
+        """
+        self._request('fetch_trades', symbol)
+
+        with self._lock:
+            trades = [
+                trade for trade in self._trades[symbol]
+                if since is None or trade['timestamp'] >= since]
+
+        return trades[-limit:] if limit else trades
+
+    def _request(self, method, symbol=None):
+        """Simulate the latency, the errors and the rate limit of a
+        request.
+        """
+        if symbol is not None and symbol not in self._activities:
+            raise BadSymbol('fake does not have market symbol %s' % symbol)
+
+        if self._latency > 0:
+            sleep(self._latency)
+
+        with self._lock:
+            now = time()
+            last_request_time = self._last_request_time
+            self._last_request_time = now
+            self.request_counts[method] += 1
+            value = self._random.random()
+
+        if (self._is_enforce_rate_limit and last_request_time is not None and
+                (now - last_request_time) * 1000 < self.rateLimit):
+            self.error_counts['DDoSProtection'] += 1
+            raise DDoSProtection(
+                'fake %s is requested within the rate limit' % method)
+
+        if value < self._timeout_rate:
+            self.error_counts['RequestTimeout'] += 1
+            raise RequestTimeout('fake %s timed out' % method)
+
+        if value < self._timeout_rate + self._network_error_rate:
+            self.error_counts['NetworkError'] += 1
+            raise NetworkError('fake %s failed' % method)
+
+    def _change(self, symbol):
+        """Change the top of the order book with a trade.
+        """
+        side = self._random.choice(('buy', 'sell'))
+        # The trade takes the best level and moves the price by a tick
+        # with the half probability
+        price = self._mid_prices[symbol] + (
+            self.TICK_SIZE if side == 'buy' else -self.TICK_SIZE)
+
+        if self._random.random() < 0.5:
+            self._mid_prices[symbol] += (
+                self.TICK_SIZE if side == 'buy' else -self.TICK_SIZE)
+
+        self._sizes[symbol] = float(self._random.randint(1, 100))
+        self._trade_id += 1
+        timestamp = int(time() * 1000)
+        self._trades[symbol].append({
+            'id': str(self._trade_id),
+            'symbol': symbol,
+            'timestamp': timestamp,
+            'datetime': None,
+            'side': side,
+            'price': price,
+            'amount': float(self._random.randint(1, 10)),
+        })
+        self.change_counts[symbol] += 1
+
+    @staticmethod
+    def _create_market(symbol):
+        """Create the market of the symbol.
+        """
+        base, quote = symbol.split('/')
+        return {
+            'id': base + quote,
+            'symbol': symbol,
+            'base': base,
+            'quote': quote,
+            'baseId': base,
+            'quoteId': quote,
+            'active': True,
+            'precision': {'price': 1, 'amount': 0},
+            'limits': {},
+            'info': {},
+        }
@@ -25,6 +25,9 @@ test_requirements = [
 
 extra_requirements = {
     ":python_version>='3.5.3'": ["cryptofeed>=1.4.1"],
+    "reader": ["numpy>=1.15", "pandas>=0.24"],
+    "parquet": ["numpy>=1.15", "pandas>=0.24", "pyarrow>=1.0"],
+    "uvloop": ["uvloop>=0.12"],
 }
 
 
@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import gc
+import importlib.util
+import json
+from time import perf_counter
+
+from sortedcontainers import SortedDict
+
+from befh.exchange.event_loop import create_event_loop, tune_gc
+from befh.table.order_book_table import OrderBook
+
+MESSAGES = 100000
+LATENCY_MESSAGES = 5000
+LATENCY_RATE = 1000
+DEPTH = 5
+GC_THRESHOLD = [100000, 50, 100]
+DEFAULT_GC_THRESHOLD = gc.get_threshold()
+
+
+class BenchmarkHandler:
+    """Handler counting the inserted rows.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+        self.count = 0
+
+    def prepare_insert(self, table_name, fields, **kwargs):
+        """Prepare insert.
+        """
+        self.count += 1
+
+
+async def produce(writer, messages, rate=None):
+    """Write the synthetic order book updates.
+
+    :param rate: `float` of the messages per second, or None to write
+        at the highest rate.
+    """
+    start_time = perf_counter()
+
+    for i in range(messages):
+        if rate is not None:
+            delay = start_time + i / rate - perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        price = 100 + i % 7
+        writer.write(json.dumps({
+            'timestamp': perf_counter(),
+            'bids': [[price - j, 1 + j] for j in range(DEPTH)],
+            'asks': [[price + 1 + j, 1 + j] for j in range(DEPTH)],
+        }).encode('utf-8') + b'\n')
+
+        if rate is not None or i % 100 == 0:
+            await writer.drain()
+
+    await writer.drain()
+    writer.close()
+
+
+async def consume(reader, order_book, handler, latencies):
+    """Read the updates and run the order book callback on each.
+
+    The order book is kept in sorted dicts as cryptofeed does.
+    """
+    bids = SortedDict()
+    asks = SortedDict()
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+
+        message = json.loads(line)
+        bids.clear()
+        bids.update(message['bids'])
+        asks.clear()
+        asks.update(message['asks'])
+
+        if order_book.websocket_update_bids_asks(bids=bids, asks=asks):
+            order_book.update_table(handler)
+
+        latencies.append(perf_counter() - message['timestamp'])
+
+
+async def run_feed(messages, rate=None):
+    """Run the synthetic feed through a local TCP connection.
+    """
+    order_book = OrderBook(exchange='Benchmark', symbol='BTC/USD')
+    handler = BenchmarkHandler()
+    latencies = []
+    connected = asyncio.Event()
+    streams = {}
+
+    async def on_connect(reader, writer):
+        streams['reader'] = reader
+        connected.set()
+
+    server = await asyncio.start_server(on_connect, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    _, writer = await asyncio.open_connection('127.0.0.1', port)
+    await connected.wait()
+
+    start_time = perf_counter()
+    await asyncio.gather(
+        produce(writer, messages, rate),
+        consume(streams['reader'], order_book, handler, latencies))
+    elapsed = perf_counter() - start_time
+
+    server.close()
+    await server.wait_closed()
+    return elapsed, latencies
+
+
+def run(event_loop, gc_threshold, messages, rate=None):
+    """Run the feed with the event loop and GC settings.
+    """
+    gc.set_threshold(*DEFAULT_GC_THRESHOLD)
+    loop = create_event_loop(event_loop)
+    tune_gc(threshold=gc_threshold)
+
+    try:
+        return loop.run_until_complete(run_feed(messages, rate))
+    finally:
+        loop.close()
+        asyncio.set_event_loop_policy(None)
+
+
+def benchmark(event_loop, gc_threshold, messages, latency_messages,
+              latency_rate):
+    """Benchmark the throughput at the highest rate, and the callback
+    latency at a fixed rate below the capacity.
+    """
+    elapsed, _ = run(event_loop, gc_threshold, messages)
+    _, latencies = run(
+        event_loop, gc_threshold, latency_messages, latency_rate)
+    latencies.sort()
+
+    print('%-8s gc %-18s %10.0f msg/s  p50 %8.1fus  p99 %8.1fus' % (
+        event_loop,
+        gc_threshold or 'default',
+        messages / elapsed,
+        latencies[len(latencies) // 2] * 1e6,
+        latencies[int(len(latencies) * 0.99)] * 1e6))
+
+
+def main():
+    """Main.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the event loop of the websocket exchange')
+    parser.add_argument('--messages', type=int, default=MESSAGES)
+    parser.add_argument(
+        '--latency-messages', type=int, default=LATENCY_MESSAGES)
+    parser.add_argument('--latency-rate', type=float, default=LATENCY_RATE)
+    args = parser.parse_args()
+
+    for event_loop in ['asyncio', 'uvloop']:
+        # create_event_loop falls into asyncio without uvloop, which
+        # would be reported as the uvloop result
+        if (event_loop == 'uvloop' and
+                importlib.util.find_spec('uvloop') is None):
+            print('%-8s skipped as it is not installed' % event_loop)
+            continue
+
+        for gc_threshold in [None, GC_THRESHOLD]:
+            benchmark(
+                event_loop=event_loop,
+                gc_threshold=gc_threshold,
+                messages=args.messages,
+                latency_messages=args.latency_messages,
+                latency_rate=args.latency_rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import argparse
+from collections import Counter
+import logging
+from threading import Thread
+from time import sleep, time
+
+from befh.exchange.rest_api_exchange import RestApiExchange
+from befh.handler.handler import Handler
+from befh.handler.handler_operator import (
+    HandlerInsertOperator,
+    HandlerOperator)
+
+INTERFACE = 'befh.testing.fake_ccxt_exchange.FakeCcxtExchange'
+INSTRUMENTS = 10
+ACTIVE_INSTRUMENTS = 2
+ACTIVE_ACTIVITY = 0.9
+QUIET_ACTIVITY = 0.02
+RATE_LIMIT = 50
+DURATION = 30.0
+
+
+class BenchmarkHandler(Handler):
+    """Handler counting the inserted rows of each table.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+        super().__init__(is_debug=False, is_cold=False)
+        self.counts = Counter()
+
+    def get_encoded_target(self, table_name):
+        """Get the target counting the inserts of the table.
+        """
+        def count(data):
+            operator = HandlerOperator.decode(data)
+            if isinstance(operator, HandlerInsertOperator):
+                self.counts[table_name] += 1
+
+        return count
+
+
+def main():
+    """Main.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the polling of the REST API exchange '
+                    'against a fake ccxt exchange')
+    parser.add_argument('--instruments', type=int, default=INSTRUMENTS)
+    parser.add_argument(
+        '--active-instruments', type=int, default=ACTIVE_INSTRUMENTS)
+    parser.add_argument(
+        '--active-activity', type=float, default=ACTIVE_ACTIVITY)
+    parser.add_argument(
+        '--quiet-activity', type=float, default=QUIET_ACTIVITY)
+    parser.add_argument(
+        '--rate-limit', type=int, default=RATE_LIMIT,
+        help='Milliseconds between requests')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--network-error-rate', type=float, default=0.0)
+    parser.add_argument('--duration', type=float, default=DURATION)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    symbols = ['C%02d/USD' % i for i in range(args.instruments)]
+    activities = {
+        symbol: (args.active_activity if i < args.active_instruments
+                 else args.quiet_activity)
+        for i, symbol in enumerate(symbols)}
+
+    exchange = RestApiExchange(
+        name='Fake',
+        config={
+            'instruments': symbols,
+            'trade_table': True,
+            'interface': INTERFACE,
+            'interface_config': {
+                'symbols': symbols,
+                'rateLimit': args.rate_limit,
+                'activities': activities,
+                'latency': args.latency,
+                'timeout_rate': args.timeout_rate,
+                'network_error_rate': args.network_error_rate,
+                'enforce_rate_limit': True,
+            },
+        },
+        is_debug=False,
+        is_cold=False)
+    handler = BenchmarkHandler()
+    exchange.load(handlers={'benchmark': handler})
+
+    interface = exchange._exchange_interface
+    interface.request_counts.clear()
+    interface.error_counts.clear()
+    interface.change_counts.clear()
+    handler.counts.clear()
+
+    Thread(target=exchange.run, daemon=True).start()
+    start_time = time()
+    sleep(args.duration)
+    elapsed = time() - start_time
+
+    request_count = sum(interface.request_counts.values())
+    print('rate limit %dms  latency %.0fms  errors %s' % (
+        args.rate_limit, args.latency * 1e3,
+        dict(interface.error_counts) or 'none'))
+    print('requests %.1f/s of %.1f/s allowed' % (
+        request_count / elapsed, 1000.0 / args.rate_limit))
+    print('%-10s %8s %10s %10s %10s' % (
+        'symbol', 'activity', 'changes/s', 'updates/s', 'trades/s'))
+
+    for symbol, instmt_info in exchange.instruments.items():
+        print('%-10s %8.2f %10.2f %10.2f %10.2f' % (
+            symbol,
+            activities[symbol],
+            interface.change_counts[symbol] / elapsed,
+            handler.counts[instmt_info.table_name] / elapsed,
+            handler.counts[instmt_info.trade_table_name] / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+from time import perf_counter
+
+from befh.handler.handler_dispatcher import HandlerDispatcher
+from befh.handler.shared_memory_handler import (
+    SharedMemoryHandler,
+    SharedMemoryReader)
+from befh.table.order_book_table import OrderBook
+
+INSTRUMENTS = 100
+DEPTH = 5
+READS = 1000000
+DURATION = 5.0
+
+
+def write(order_books, dispatcher, is_stopped):
+    """Update the order books round robin until stopped.
+
+    All the quantities of an update are the same version, so that a
+    torn snapshot is detected by the reader.
+    """
+    version = 0
+
+    while not is_stopped.is_set():
+        for order_book in order_books:
+            version += 1
+            order_book.update_bids_asks(
+                bids=[[100.0 - i, version] for i in range(DEPTH)],
+                asks=[[101.0 + i, version] for i in range(DEPTH)])
+            order_book.update_table(dispatcher)
+
+
+def read(reader, table_names, reads):
+    """Read the snapshots round robin.
+
+    :return: `tuple` of the elapsed seconds and the number of torn
+        snapshots.
+    """
+    quantity_indices = [
+        i for i, name in enumerate(reader.field_names)
+        if name.startswith(('bq', 'aq'))]
+    torn_count = 0
+    start_time = perf_counter()
+
+    for i in range(reads):
+        snapshot = reader.read(table_names[i % len(table_names)])
+        quantities = set(snapshot[index] for index in quantity_indices)
+        if len(quantities) > 1:
+            torn_count += 1
+
+    return perf_counter() - start_time, torn_count
+
+
+def main():
+    """Main.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the reads of the shared memory handler '
+                    'under a concurrent writer')
+    parser.add_argument('--instruments', type=int, default=INSTRUMENTS)
+    parser.add_argument('--reads', type=int, default=READS)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'befh.shm')
+    handler = SharedMemoryHandler(
+        path=path, depth=DEPTH, is_debug=False, is_cold=False)
+    handler.load()
+    dispatcher = HandlerDispatcher({'shared_memory': handler})
+
+    order_books = [
+        OrderBook(exchange='Benchmark', symbol='C%03d/USD' % i, depth=DEPTH)
+        for i in range(args.instruments)]
+    for order_book in order_books:
+        dispatcher.prepare_create_table(
+            table_name=order_book.table_name, fields=order_book.fields)
+        order_book.update_bids_asks(
+            bids=[[100.0 - i, 0] for i in range(DEPTH)],
+            asks=[[101.0 + i, 0] for i in range(DEPTH)])
+        order_book.update_table(dispatcher)
+
+    # Time the writes of the slots in process
+    start_time = perf_counter()
+    for order_book in order_books:
+        order_book.update_table(dispatcher)
+    write_time = (perf_counter() - start_time) / len(order_books)
+
+    reader = SharedMemoryReader(path)
+    table_names = [order_book.table_name for order_book in order_books]
+
+    idle_elapsed, _ = read(reader, table_names, args.reads)
+
+    is_stopped = mp.Event()
+    process = mp.Process(
+        target=write, args=(order_books, dispatcher, is_stopped))
+    process.start()
+
+    try:
+        elapsed, torn_count = read(reader, table_names, args.reads)
+    finally:
+        is_stopped.set()
+        process.join()
+        reader.close()
+        os.remove(path)
+
+    print('instruments %d  depth %d' % (args.instruments, DEPTH))
+    print('write      %8.2fus/update' % (write_time * 1e6))
+    print('read idle  %8.2fus/snapshot' % (idle_elapsed / args.reads * 1e6))
+    print('read busy  %8.2fus/snapshot  torn %d' % (
+        elapsed / args.reads * 1e6, torn_count))
+
+
+if __name__ == '__main__':
+    main()
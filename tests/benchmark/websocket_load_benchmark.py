@@ -0,0 +1,192 @@
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import signal
+import tempfile
+from time import time
+
+import zmq
+
+from befh.core.configuration import Configuration
+from befh.core.runner import Runner
+from befh.testing.fake_bitmex_server import FakeBitmexServer
+
+INSTRUMENTS = 10
+RATE = 100.0
+DURATION = 10.0
+WARMUP = 30.0
+ZMQ_PORT = 9124
+BITMEX_REST_ADDRESS = 'https://www.bitmex.com'
+
+
+def create_markets_cache(path, symbols):
+    """Create the markets cache of ccxt, so that the exchange is loaded
+    without requesting BitMEX.
+    """
+    markets = {
+        symbol: {
+            'id': symbol,
+            'symbol': symbol,
+            'base': symbol[:-3],
+            'quote': symbol[-3:],
+            'baseId': symbol[:-3],
+            'quoteId': symbol[-3:],
+            'active': True,
+            'precision': {'price': 1, 'amount': 0},
+            'limits': {},
+        }
+        for symbol in symbols}
+
+    with open(os.path.join(path, 'bitmex.json'), 'w') as cache_file:
+        json.dump({
+            'timestamp': time(),
+            'markets': markets,
+            'currencies': {},
+        }, cache_file)
+
+
+def override_rest_address(address):
+    """Send the requests of the BitMEX REST API, which cryptofeed uses
+    to validate the instruments, to the fake server.
+    """
+    import requests
+
+    get = requests.get
+
+    def get_fake(url, *args, **kwargs):
+        return get(url.replace(BITMEX_REST_ADDRESS, address),
+                   *args, **kwargs)
+
+    requests.get = get_fake
+
+
+def run_feed_handler(config, rest_address):
+    """Run the feed handler in a new process group.
+    """
+    os.setsid()
+    override_rest_address(rest_address)
+    runner = Runner(
+        config=Configuration(config), is_debug=False, is_cold=True)
+    runner.load()
+    runner.run()
+
+
+def receive(socket, server, duration, warmup):
+    """Receive the rows published by the ZeroMQ handler.
+
+    :param server: `FakeBitmexServer` of which the messages sent during
+        the measurement are counted.
+    :return: `tuple` of the elapsed seconds, the number of messages
+        sent, the number of rows and the trade latencies in seconds.
+    """
+    poller = zmq.Poller()
+    poller.register(socket, zmq.POLLIN)
+
+    # The measurement starts at the first row
+    if not poller.poll(warmup * 1000):
+        raise RuntimeError(
+            'No row is received in %.0f seconds' % warmup)
+
+    start_time = time()
+    message_count = server.message_count
+    row_count = 0
+    latencies = []
+
+    while time() - start_time < duration:
+        if not poller.poll(100):
+            continue
+
+        row = json.loads(socket.recv())
+        row_count += 1
+
+        if row['table_name'].endswith('_trade'):
+            latencies.append(time() - float(row['data']['tid']))
+
+    return (time() - start_time, server.message_count - message_count,
+            row_count, latencies)
+
+
+def main():
+    """Main.
+    """
+    parser = argparse.ArgumentParser(
+        description='Load test the websocket feed handler against a '
+                    'fake BitMEX server')
+    parser.add_argument('--instruments', type=int, default=INSTRUMENTS)
+    parser.add_argument(
+        '--rate', type=float, default=RATE,
+        help='Messages per second per instrument')
+    parser.add_argument('--trade-ratio', type=float,
+                        default=FakeBitmexServer.DEFAULT_TRADE_RATIO)
+    parser.add_argument('--burst-size', type=int, default=0)
+    parser.add_argument('--burst-interval', type=float, default=1.0)
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--duration', type=float, default=DURATION)
+    parser.add_argument('--warmup', type=float, default=WARMUP)
+    parser.add_argument('--zmq-port', type=int, default=ZMQ_PORT)
+    parser.add_argument('--event-loop', default='asyncio')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    symbols = ['X%03dUSD' % i for i in range(args.instruments)]
+    server = FakeBitmexServer(
+        symbols=symbols,
+        rate=args.rate,
+        trade_ratio=args.trade_ratio,
+        burst_size=args.burst_size,
+        burst_interval=args.burst_interval)
+    server.start()
+
+    connection = 'tcp://127.0.0.1:%d' % args.zmq_port
+    context = zmq.Context()
+    socket = context.socket(zmq.SUB)
+    socket.setsockopt(zmq.SUBSCRIBE, b'')
+    socket.connect(connection)
+
+    with tempfile.TemporaryDirectory() as cache_path:
+        create_markets_cache(cache_path, symbols)
+        config = {
+            'subscriptions': {
+                'Bitmex': {
+                    'instruments': symbols,
+                    'depth': args.depth,
+                    'trade_table': True,
+                    'event_loop': args.event_loop,
+                    'websocket_address': server.address,
+                    'markets_cache': cache_path,
+                },
+            },
+            'handlers': {
+                'zmq': {'connection': connection},
+            },
+        }
+        process = mp.Process(
+            target=run_feed_handler,
+            args=(config, server.rest_address))
+        process.start()
+
+        try:
+            elapsed, message_count, row_count, latencies = receive(
+                socket, server, args.duration, args.warmup)
+        finally:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.join()
+            server.stop()
+
+    latencies.sort()
+    print('instruments %d  rate %.0f msg/s/instrument  burst %d/%.1fs' % (
+        args.instruments, args.rate, args.burst_size, args.burst_interval))
+    print('sent %10.0f msg/s' % (message_count / elapsed))
+    print('rows %10.0f rows/s' % (row_count / elapsed))
+
+    if latencies:
+        print('trade latency p50 %8.2fms  p99 %8.2fms  max %8.2fms' % (
+            latencies[len(latencies) // 2] * 1e3,
+            latencies[int(len(latencies) * 0.99)] * 1e3,
+            latencies[-1] * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from befh.exchange import exchange as exchange_module
+from befh.exchange.exchange import Exchange
+from befh.table.bar_table import Bar
+from befh.table.order_book_table import OrderBook
+
+START_TIME = datetime(2020, 1, 1)
+
+
+def get_values(fields):
+    """Get the values of the bar fields except the id.
+    """
+    return dict(
+        (name, field.value) for name, field in fields.items()
+        if name != 'id')
+
+
+def at(seconds):
+    """Get the time of the seconds from the start time.
+    """
+    return START_TIME + timedelta(seconds=seconds)
+
+
+class RecordDispatcher:
+    """Dispatcher recording the inserted rows.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+        self.rows = []
+
+    def prepare_insert(self, table_name, fields):
+        """Record the row.
+        """
+        self.rows.append((table_name, get_values(fields)))
+
+
+@pytest.mark.parametrize('timestamp, interval, expected', [
+    (at(0), 60, at(0)),
+    (at(59.999), 60, at(0)),
+    (at(60), 60, at(60)),
+    (at(3601.5), 3600, at(3600)),
+    (at(1.5), 1, at(1)),
+])
+def test_get_start_time(timestamp, interval, expected):
+    """The start time is on the grid of the interval.
+    """
+    assert Bar.get_start_time(timestamp, interval) == expected
+
+
+def test_close_by_later_trade():
+    """The bar is closed by a trade of a later bar.
+    """
+    bar = Bar(exchange='Exchange', symbol='ETH/BTC', interval=60)
+
+    assert bar.table_name == 'exchange_ethbtc_bar_60s'
+    assert bar.update(at(1), price=10.0, quantity=1.0) is None
+    assert bar.update(at(2), price=12.0, quantity=1.0) is None
+    assert bar.update(at(3), price=8.0, quantity=2.0) is None
+    fields = bar.update(at(61), price=9.0, quantity=1.0)
+
+    assert get_values(fields) == {
+        'date_time': at(0),
+        'open': 10.0,
+        'high': 12.0,
+        'low': 8.0,
+        'close': 8.0,
+        'volume': 4.0,
+        'vwap': 9.5,
+        'count': 3,
+    }
+    assert get_values(bar.fields)['date_time'] == at(60)
+    assert get_values(bar.fields)['count'] == 1
+
+
+def test_close_by_timer():
+    """The bar is closed by the timer after the close delay, and a
+    later trade does not record it again.
+    """
+    bar = Bar(exchange='Exchange', symbol='ETH/BTC', interval=60)
+    bar.update(at(1), price=10.0, quantity=1.0)
+
+    assert bar.close(at(60)) is None
+    assert bar.close(at(60 + Bar.CLOSE_DELAY - 0.001)) is None
+    fields = bar.close(at(60 + Bar.CLOSE_DELAY))
+    assert get_values(fields)['date_time'] == at(0)
+    assert get_values(fields)['count'] == 1
+
+    # No bar is recorded for the intervals without any trade
+    assert bar.close(at(200)) is None
+    assert bar.update(at(250), price=11.0, quantity=1.0) is None
+    fields = bar.update(at(300), price=12.0, quantity=1.0)
+    assert get_values(fields)['date_time'] == at(240)
+    assert get_values(fields)['open'] == 11.0
+
+
+def test_late_trade_after_timer_close():
+    """A trade of the bar closed by the timer is aggregated into the
+    current bar rather than recorded as a duplicate bar.
+    """
+    bar = Bar(exchange='Exchange', symbol='ETH/BTC', interval=60)
+    bar.update(at(1), price=10.0, quantity=1.0)
+    bar.close(at(62))
+
+    assert bar.update(at(59), price=11.0, quantity=1.0) is None
+    fields = bar.close(at(122))
+    assert get_values(fields)['date_time'] == at(60)
+    assert get_values(fields)['open'] == 11.0
+
+
+def test_flush():
+    """The open bar is closed regardless of the time on flush.
+    """
+    bar = Bar(exchange='Exchange', symbol='ETH/BTC', interval=60)
+
+    assert bar.close() is None
+    bar.update(at(1), price=10.0, quantity=2.0)
+    fields = bar.close()
+    assert get_values(fields)['volume'] == 2.0
+    assert bar.close() is None
+
+
+def test_order_book_closed_bar_rows():
+    """The bars of all the intervals are closed by the time.
+    """
+    order_book = OrderBook(
+        exchange='Exchange', symbol='ETH/BTC', bar_intervals=[1, 60])
+    order_book.update_trade(
+        trade={'id': '1', 'price': 10.0, 'amount': 1.0,
+               'timestamp': (at(1) - datetime(1970, 1, 1)).total_seconds()},
+        current_timestamp=at(1))
+
+    assert [table_name for table_name, _ in order_book.get_closed_bar_rows(
+        at(3))] == ['exchange_ethbtc_bar_1s']
+    assert [table_name for table_name, _ in order_book.get_closed_bar_rows(
+    )] == ['exchange_ethbtc_bar_60s']
+    assert order_book.get_closed_bar_rows() == []
+
+
+def test_exchange_close_bars(monkeypatch):
+    """The exchange records the bars closed by the timer, and the open
+    bars on close.
+    """
+    now = [(at(1) - datetime(1970, 1, 1)).total_seconds()]
+    monkeypatch.setattr(exchange_module, 'time', lambda: now[0])
+
+    class Clock(datetime):
+        """Datetime of the current time of the test.
+        """
+
+        @classmethod
+        def utcnow(cls):
+            """Current time.
+            """
+            return datetime.utcfromtimestamp(now[0])
+
+    monkeypatch.setattr(exchange_module, 'datetime', Clock)
+    exchange = Exchange(
+        name='Exchange',
+        config={'instruments': ['ETH/BTC'], 'bar_intervals': [1, 60]},
+        is_debug=False,
+        is_cold=False)
+    exchange.load(handlers={})
+    exchange._dispatcher = dispatcher = RecordDispatcher()
+    exchange.instruments['ETH/BTC'].update_trade(
+        trade={'id': '1', 'price': 10.0, 'amount': 1.0, 'timestamp': now[0]},
+        current_timestamp=at(1))
+
+    exchange._close_bars()
+    assert dispatcher.rows == []
+
+    now[0] += 0.5
+    exchange._close_bars()
+    assert dispatcher.rows == []
+
+    now[0] += 2
+    exchange._close_bars()
+    assert [row[0] for row in dispatcher.rows] == ['exchange_ethbtc_bar_1s']
+
+    exchange.close()
+    assert [row[0] for row in dispatcher.rows] == [
+        'exchange_ethbtc_bar_1s', 'exchange_ethbtc_bar_60s']
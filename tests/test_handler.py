@@ -0,0 +1,248 @@
+from collections import OrderedDict
+import queue
+from zlib import crc32
+
+import pytest
+
+from befh.handler.handler import Handler
+from befh.handler.handler_operator import (
+    HandlerCloseOperator,
+    HandlerInsertOperator)
+from befh.table.table import IntIdField
+
+
+def create_handler(**kwargs):
+    """Create a handler with in-process queues.
+    """
+    handler = Handler(is_debug=False, is_cold=False, **kwargs)
+    handler.load(queue_factory=queue.Queue)
+    return handler
+
+
+def test_single_worker():
+    """All the tables are written by the only worker.
+    """
+    handler = create_handler()
+
+    assert handler.workers == 1
+    assert len(handler.queues) == 1
+    assert handler.get_worker('binance_ethbtc_order') == 0
+    assert handler.get_queue('binance_ethbtc_order') is handler.queue
+
+
+def test_worker_partition():
+    """The tables are partitioned by the hash of the table name.
+    """
+    handler = create_handler(workers=4)
+    table_names = ['exchange_%d_order' % i for i in range(100)]
+
+    assert len(handler.queues) == 4
+    for table_name in table_names:
+        worker = handler.get_worker(table_name)
+        assert worker == crc32(table_name.encode('utf-8')) % 4
+        assert handler.get_queue(table_name) is handler.queues[worker]
+
+    assert set(handler.get_worker(name) for name in table_names) == set(
+        range(4))
+
+
+def test_worker_partition_parsed_table_name():
+    """The table name is partitioned as the handler names the table.
+    """
+    handler = create_handler(workers=4)
+
+    assert (handler.get_worker('bitmex_xbtusd.m20_order') ==
+            handler.get_worker('bitmex_xbtusdm20_order'))
+
+
+def test_prepare_insert_preserves_table_order():
+    """The rows of a table are queued in order to its worker.
+    """
+    handler = create_handler(workers=3)
+    table_name = 'binance_ethbtc_order'
+
+    for i in range(5):
+        handler.prepare_insert(
+            table_name=table_name,
+            fields=OrderedDict(id=IntIdField(value=i)))
+
+    worker_queue = handler.queues[handler.get_worker(table_name)]
+    ids = []
+    while not worker_queue.empty():
+        operator = worker_queue.get()
+        assert isinstance(operator, HandlerInsertOperator)
+        ids.append(operator._fields['id'].value)
+
+    assert ids == list(range(5))
+    assert all(
+        handler_queue.empty() for handler_queue in handler.queues)
+
+
+def test_prepare_close_all_workers():
+    """The close operator is queued to every worker.
+    """
+    handler = create_handler(workers=3)
+    handler.prepare_close()
+
+    for handler_queue in handler.queues:
+        assert isinstance(handler_queue.get(), HandlerCloseOperator)
+
+
+def test_invalid_workers():
+    """The number of workers must be positive.
+    """
+    with pytest.raises(AssertionError):
+        Handler(is_debug=False, is_cold=False, workers=0)
+
+
+class RecordHandler(Handler):
+    """Handler recording the executed operators and flushes.
+    """
+
+    def __init__(self, **kwargs):
+        """Constructor.
+        """
+        super().__init__(
+            is_debug=False, is_cold=False, batch_frequency=0,
+            is_priority_lanes=True, **kwargs)
+        self.records = []
+
+    def create_table(self, table_name, fields, **kwargs):
+        """Record the table creation.
+        """
+        self.records.append(('create', table_name))
+
+    def insert(self, table_name, fields):
+        """Record the row.
+        """
+        self.records.append(('insert', table_name))
+
+    def rename_table(self, from_name, to_name, fields=None,
+                     keep_table=True):
+        """Record the rename.
+        """
+        self.records.append(('rename', from_name))
+
+    def flush(self, force=False):
+        """Record the flush.
+        """
+        self.records.append(('flush', None))
+
+    def close(self):
+        """Record the close.
+        """
+        self.records.append(('close', None))
+        super().close()
+
+
+def create_lane_handler(**kwargs):
+    """Create a handler of priority lanes with in-process queues.
+    """
+    handler = RecordHandler(**kwargs)
+    handler.load(queue_factory=queue.Queue)
+    return handler
+
+
+def prepare_rows(handler, table_name, count):
+    """Queue the rows of the table.
+    """
+    for i in range(count):
+        handler.prepare_insert(
+            table_name=table_name,
+            fields=OrderedDict(id=IntIdField(value=i)))
+
+
+def get_table_records(records, table_name):
+    """Get the operations of the table.
+    """
+    return [operation for operation, name in records if name == table_name]
+
+
+def test_lanes_routing():
+    """The operators of a table are queued in the lane of its rows,
+    and the close operator in the control lane.
+    """
+    handler = create_lane_handler()
+    lanes = handler.lane_queues[0]
+
+    for table_name, lane in [('binance_ethbtc_order', Handler.BOOK_LANE),
+                             ('binance_ethbtc_delta', Handler.BOOK_LANE),
+                             ('binance_ethbtc_trade', Handler.TRADE_LANE),
+                             ('binance_ethbtc_bar_60s', Handler.TRADE_LANE)]:
+        assert handler.get_lane(table_name) == lane
+        handler.prepare_create_table(table_name=table_name, fields={})
+        prepare_rows(handler, table_name, 1)
+        handler.prepare_rename_table(
+            from_name=table_name, to_name=table_name + '_20200101')
+        assert lanes[lane].qsize() == 3
+
+        while not lanes[lane].empty():
+            lanes[lane].get()
+
+    handler.prepare_close()
+    assert lanes[Handler.CONTROL_LANE].qsize() == 1
+    assert handler.queues == [lanes[Handler.CONTROL_LANE]]
+
+
+def test_lanes_table_order():
+    """The rename of a table is executed after its creation and the
+    rows queued before it, even though the other lanes have priority.
+    """
+    handler = create_lane_handler()
+    order_table = 'binance_ethbtc_order'
+    trade_table = 'binance_ethbtc_trade'
+
+    for table_name in [order_table, trade_table]:
+        handler.prepare_create_table(table_name=table_name, fields={})
+        prepare_rows(handler, table_name, 3)
+        handler.prepare_rename_table(
+            from_name=table_name, to_name=table_name + '_20200101')
+        prepare_rows(handler, table_name, 2)
+
+    handler.prepare_close()
+    handler.run()
+
+    for table_name in [order_table, trade_table]:
+        assert get_table_records(handler.records, table_name) == (
+            ['create'] + ['insert'] * 3 + ['rename'] + ['insert'] * 2)
+
+
+def test_lanes_trades_ahead_of_book_backlog():
+    """The trades queued behind a backlog of order book updates are
+    executed in the first batch.
+    """
+    handler = create_lane_handler(
+        lane_batch_sizes={Handler.BOOK_LANE: 100})
+    prepare_rows(handler, 'binance_ethbtc_order', 1000)
+    prepare_rows(handler, 'binance_ethbtc_trade', 10)
+    handler.prepare_close()
+    handler.run()
+
+    operations = [operation for operation, _ in handler.records]
+    first_flush = operations.index('flush')
+    first_batch = handler.records[:first_flush]
+
+    assert get_table_records(first_batch, 'binance_ethbtc_trade') == (
+        ['insert'] * 10)
+    assert get_table_records(first_batch, 'binance_ethbtc_order') == (
+        ['insert'] * 100)
+
+
+def test_lanes_close_after_drained():
+    """The close operator is executed after all the lanes are drained,
+    even though it is queued ahead of them.
+    """
+    handler = create_lane_handler(
+        lane_batch_sizes={Handler.TRADE_LANE: 10, Handler.BOOK_LANE: 10})
+    handler.prepare_close()
+    prepare_rows(handler, 'binance_ethbtc_order', 50)
+    prepare_rows(handler, 'binance_ethbtc_trade', 50)
+    handler.run()
+
+    operations = [operation for operation, _ in handler.records]
+
+    assert operations.count('insert') == 100
+    assert operations.index('close') > max(
+        i for i, operation in enumerate(operations)
+        if operation == 'insert')
+    assert all(lane.empty() for lane in handler.lane_queues[0].values())
@@ -0,0 +1,136 @@
+import queue
+
+import pytest
+
+from befh.handler.handler import Handler
+from befh.handler.handler_dispatcher import HandlerDispatcher
+from befh.handler.handler_operator import (
+    HandlerCreateTableOperator,
+    HandlerInsertOperator,
+    HandlerOperator)
+from befh.handler.shared_memory_handler import (
+    SharedMemoryHandler,
+    SharedMemoryReader)
+from befh.table.order_book_table import OrderBook
+
+
+@pytest.fixture
+def encode_count(monkeypatch):
+    """Count the encoded operators.
+    """
+    count = [0]
+    encode = HandlerOperator.encode
+
+    def count_encode(operator):
+        count[0] += 1
+        return encode(operator)
+
+    monkeypatch.setattr(HandlerOperator, 'encode', count_encode)
+    return count
+
+
+def create_handler(**kwargs):
+    """Create a handler with in-process queues.
+    """
+    handler = Handler(is_debug=False, is_cold=False, **kwargs)
+    handler.load(queue_factory=queue.Queue)
+    return handler
+
+
+def create_shared_memory_handler(tmp_path):
+    """Create the shared memory handler.
+    """
+    handler = SharedMemoryHandler(
+        path=str(tmp_path / 'befh'), slots=2, depth=2, is_debug=False,
+        is_cold=False)
+    handler.load(queue_factory=queue.Queue)
+    return handler
+
+
+def create_order_book():
+    """Create the order book with an update.
+    """
+    order_book = OrderBook(exchange='Exchange', symbol='ETH/BTC', depth=2)
+    order_book.update_bids_asks(
+        bids=[[100.0, 1.0], [99.0, 2.0]],
+        asks=[[101.0, 3.0], [102.0, 4.0]])
+    return order_book
+
+
+def get_all(handler_queue):
+    """Get all the elements of the queue.
+    """
+    elements = []
+    while not handler_queue.empty():
+        elements.append(handler_queue.get())
+
+    return elements
+
+
+def test_encode_once(encode_count):
+    """The row is encoded once and the same bytes are put into the
+    queue of every handler.
+    """
+    handlers = [create_handler(), create_handler(workers=2)]
+    dispatcher = HandlerDispatcher(dict(enumerate(handlers)))
+    order_book = create_order_book()
+
+    dispatcher.prepare_create_table(
+        table_name=order_book.table_name, fields=order_book.fields)
+    dispatcher.prepare_insert(
+        table_name=order_book.table_name, fields=order_book.fields)
+
+    assert encode_count[0] == 2
+    first_elements, second_elements = [
+        get_all(handler.get_queue(order_book.table_name))
+        for handler in handlers]
+    assert [
+        type(HandlerOperator.decode(element))
+        for element in first_elements] == [
+        HandlerCreateTableOperator, HandlerInsertOperator]
+    assert all(
+        first is second
+        for first, second in zip(first_elements, second_elements))
+
+
+def test_in_process_handler(tmp_path, encode_count):
+    """The handler executing the operators in process receives the
+    operator, and the operator is encoded once for the other handlers
+    only.
+    """
+    shared_memory_handler = create_shared_memory_handler(tmp_path)
+    handler = create_handler()
+    order_book = create_order_book()
+    table_name = order_book.table_name
+
+    assert shared_memory_handler.get_encoded_target(table_name) is None
+
+    dispatcher = HandlerDispatcher({
+        'shm': shared_memory_handler, 'queue': handler})
+    dispatcher.prepare_create_table(
+        table_name=table_name, fields=order_book.fields)
+    dispatcher.prepare_insert(
+        table_name=table_name, fields=order_book.fields)
+
+    assert encode_count[0] == 2
+    assert len(get_all(handler.queue)) == 2
+
+    reader = SharedMemoryReader(str(tmp_path / 'befh'))
+    snapshot = dict(zip(reader.field_names, reader.read(table_name)))
+    assert (snapshot['b1'], snapshot['aq2']) == (100.0, 4.0)
+    reader.close()
+
+
+def test_no_encoding_without_queue(tmp_path, encode_count):
+    """The operator is not encoded if no handler queues it.
+    """
+    dispatcher = HandlerDispatcher({
+        'shm': create_shared_memory_handler(tmp_path)})
+    order_book = create_order_book()
+
+    dispatcher.prepare_create_table(
+        table_name=order_book.table_name, fields=order_book.fields)
+    dispatcher.prepare_insert(
+        table_name=order_book.table_name, fields=order_book.fields)
+
+    assert encode_count[0] == 0
@@ -0,0 +1,227 @@
+from datetime import datetime, timedelta
+import queue
+
+import pytest
+
+from befh.handler.sql_handler import SqlHandler
+from befh.table import order_book_table
+from befh.table.order_book_delta_table import (
+    OrderBookDelta,
+    OrderBookSideField)
+from befh.table.order_book_table import OrderBookUpdateTypeField
+
+BID = OrderBookSideField.BID
+ASK = OrderBookSideField.ASK
+TRADE = OrderBookSideField.TRADE
+KEYFRAME = OrderBookUpdateTypeField.KEYFRAME
+SAMPLE = OrderBookUpdateTypeField.SAMPLE
+ORDER_BOOK = OrderBookUpdateTypeField.ORDER_BOOK
+START_TIME = datetime(2020, 1, 1)
+
+
+class Clock(datetime):
+    """Datetime of which the current time is set by the test.
+    """
+
+    now = START_TIME
+
+    @classmethod
+    def utcnow(cls):
+        """Current time.
+        """
+        return cls.now
+
+
+class RecordHandler:
+    """Handler recording the inserted rows.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+        self.rows = []
+
+    def prepare_insert(self, table_name, fields):
+        """Record the row as (date_time, update_type, side, level, price,
+        qty).
+        """
+        self.rows.append(tuple(fields[name].value for name in [
+            'date_time', 'update_type', 'side', 'level', 'price', 'qty']))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Clock of the order book updates.
+    """
+    monkeypatch.setattr(Clock, 'now', START_TIME)
+    monkeypatch.setattr(order_book_table, 'datetime', Clock)
+    return Clock
+
+
+def create_levels(prices, quantity):
+    """Create the levels of the prices with the same quantity.
+    """
+    return [[price, quantity] for price in prices]
+
+
+def test_reconstruct_from_keyframe():
+    """The changes are applied on the levels of the keyframe, and the
+    trades are ignored.
+    """
+    rows = [
+        (START_TIME, KEYFRAME, BID, 1, 100.0, 1.0),
+        (START_TIME, KEYFRAME, BID, 2, 99.0, 2.0),
+        (START_TIME, KEYFRAME, ASK, 1, 101.0, 3.0),
+        (START_TIME, KEYFRAME, ASK, 2, 102.0, 4.0),
+        (START_TIME, ORDER_BOOK, BID, 2, 99.5, 5.0),
+        (START_TIME, OrderBookUpdateTypeField.TRADE, TRADE, 0, 100.0, 0.5),
+        (START_TIME, ORDER_BOOK, ASK, 1, 100.5, 6.0),
+    ]
+
+    assert OrderBookDelta.reconstruct(rows) == {
+        'date_time': START_TIME,
+        'bids': [(100.0, 1.0), (99.5, 5.0)],
+        'asks': [(100.5, 6.0), (102.0, 4.0)],
+    }
+
+
+@pytest.mark.parametrize('update_type', [KEYFRAME, SAMPLE])
+def test_reconstruct_following_snapshot(update_type):
+    """A following keyframe or sample replaces all the levels.
+    """
+    rows = [
+        (START_TIME, KEYFRAME, BID, 1, 100.0, 1.0),
+        (START_TIME, KEYFRAME, BID, 2, 99.0, 2.0),
+        (START_TIME, ORDER_BOOK, ASK, 1, 101.0, 3.0),
+        (START_TIME, update_type, BID, 1, 98.0, 7.0),
+    ]
+
+    assert OrderBookDelta.reconstruct(rows) == {
+        'date_time': START_TIME,
+        'bids': [(98.0, 7.0)],
+        'asks': [],
+    }
+
+
+def test_reconstruct_empty():
+    """No rows reconstruct an empty order book.
+    """
+    assert OrderBookDelta.reconstruct([]) == {
+        'date_time': None, 'bids': [], 'asks': []}
+
+
+def test_record_and_reconstruct(clock):
+    """The recorded rows reconstruct the order book after each update,
+    and only the changed levels are recorded between the keyframes.
+    """
+    order_book = OrderBookDelta(
+        exchange='exchange', symbol='ETH/BTC', depth=3,
+        keyframe_interval=60)
+    handler = RecordHandler()
+    updates = [
+        (create_levels([100.0, 99.0, 98.0], 1.0),
+         create_levels([101.0, 102.0, 103.0], 1.0)),
+        (create_levels([100.0, 99.0, 98.0], 2.0),
+         create_levels([101.0, 102.0, 103.0], 1.0)),
+        (create_levels([100.5, 100.0, 99.0], 2.0),
+         create_levels([101.0, 102.0, 103.0], 1.0)),
+        (create_levels([100.5, 100.0, 99.0], 2.0),
+         create_levels([100.8, 101.0, 102.0], 3.0)),
+    ]
+    row_counts = []
+
+    for i, (bids, asks) in enumerate(updates):
+        clock.now = START_TIME + timedelta(seconds=i)
+        order_book.update_bids_asks(bids=bids, asks=asks)
+        row_count = len(handler.rows)
+        order_book.update_table(handler)
+        row_counts.append(len(handler.rows) - row_count)
+
+        assert OrderBookDelta.reconstruct(handler.rows) == {
+            'date_time': clock.now,
+            'bids': [tuple(level) for level in bids],
+            'asks': [tuple(level) for level in asks],
+        }
+
+    assert row_counts == [6, 3, 3, 3]
+    assert [row[1] for row in handler.rows[:6]] == [KEYFRAME] * 6
+
+
+def test_keyframe_interval(clock):
+    """All the levels are recorded once the keyframe interval passes.
+    """
+    order_book = OrderBookDelta(
+        exchange='exchange', symbol='ETH/BTC', depth=2,
+        keyframe_interval=60)
+    handler = RecordHandler()
+    update_types = []
+
+    for seconds, quantity in [(0, 1.0), (30, 2.0), (59, 1.0), (60, 2.0)]:
+        clock.now = START_TIME + timedelta(seconds=seconds)
+        order_book.update_bids_asks(
+            bids=create_levels([100.0, 99.0], quantity),
+            asks=create_levels([101.0, 102.0], 1.0))
+        row_count = len(handler.rows)
+        order_book.update_table(handler)
+        update_types.append(set(
+            row[1] for row in handler.rows[row_count:]))
+
+    assert update_types == [{KEYFRAME}, {ORDER_BOOK}, {ORDER_BOOK}, {KEYFRAME}]
+    # The rows from the latest keyframe reconstruct the order book
+    assert OrderBookDelta.reconstruct(handler.rows[-4:]) == {
+        'date_time': START_TIME + timedelta(seconds=60),
+        'bids': [(100.0, 2.0), (99.0, 2.0)],
+        'asks': [(101.0, 1.0), (102.0, 1.0)],
+    }
+
+
+def test_read_order_book(clock, tmp_path):
+    """The order book at the timestamp is read from the latest keyframe
+    and the following changes in the database.
+    """
+    handler = SqlHandler(
+        connection='sqlite:///%s' % (tmp_path / 'test.db'),
+        is_debug=False,
+        is_cold=False)
+    handler.load(queue_factory=queue.Queue)
+    order_book = OrderBookDelta(
+        exchange='exchange', symbol='ETH/BTC', depth=2,
+        keyframe_interval=60)
+    handler.create_table(
+        table_name=order_book.table_name, fields=order_book.fields)
+
+    class InsertHandler:
+        """Handler inserting the rows in process.
+        """
+
+        @staticmethod
+        def prepare_insert(table_name, fields):
+            """Insert the row.
+            """
+            handler.insert(table_name=table_name, fields=fields)
+
+    for seconds, quantity in [(0, 1.0), (10, 2.0), (60, 3.0), (70, 4.0)]:
+        clock.now = START_TIME + timedelta(seconds=seconds)
+        order_book.update_bids_asks(
+            bids=create_levels([100.0, 99.0], quantity),
+            asks=create_levels([101.0, 102.0], 1.0))
+        order_book.update_table(InsertHandler)
+    handler.flush()
+
+    table_name = order_book.table_name
+    connection = handler._get_connection(table_name)
+
+    assert OrderBookDelta.read_order_book(
+        connection=connection,
+        table_name=table_name,
+        timestamp=START_TIME - timedelta(seconds=1)) is None
+
+    for seconds, quantity in [(5, 1.0), (10, 2.0), (65, 3.0), (90, 4.0)]:
+        book = OrderBookDelta.read_order_book(
+            connection=connection,
+            table_name=table_name,
+            timestamp=START_TIME + timedelta(seconds=seconds))
+        assert book['bids'] == [(100.0, quantity), (99.0, quantity)]
+        assert book['asks'] == [(101.0, 1.0), (102.0, 1.0)]
+
+    handler.close()
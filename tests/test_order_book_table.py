@@ -0,0 +1,123 @@
+from datetime import datetime
+
+from befh.table.order_book_table import (
+    OrderBook,
+    OrderBookUpdateTypeField,
+    TradeSideField)
+
+CURRENT_TIME = datetime(2020, 1, 1, 0, 0, 1)
+TRADE_TIME = datetime(2020, 1, 1)
+
+
+class RecordHandler:
+    """Handler recording the inserted rows.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+        self.rows = []
+
+    def prepare_insert(self, table_name, fields):
+        """Record the table name and the values of the row except the
+        id.
+        """
+        self.rows.append((table_name, dict(
+            (name, field.value) for name, field in fields.items()
+            if name != 'id')))
+
+
+def create_order_book(**kwargs):
+    """Create the order book with a trade and an order book update.
+    """
+    order_book = OrderBook(exchange='Exchange', symbol='ETH/BTC', **kwargs)
+    order_book.update_bids_asks(
+        bids=[[100.0, 1.0], [99.0, 2.0]],
+        asks=[[101.0, 3.0], [102.0, 4.0]])
+    return order_book
+
+
+def update_trade(order_book):
+    """Update the order book with a trade.
+    """
+    return order_book.update_trade(
+        trade={'id': 123, 'price': 100.5, 'amount': 0.5, 'side': 'sell',
+               'timestamp': 1577836800000},
+        current_timestamp=CURRENT_TIME)
+
+
+def test_trade_table():
+    """The trades are recorded in the trade table, and the order book
+    table is recorded on order book updates.
+    """
+    order_book = create_order_book(depth=2, is_trade_table=True)
+    handler = RecordHandler()
+
+    assert order_book.trade_table_name == 'exchange_ethbtc_trade'
+    assert order_book.is_book_update_recorded
+    assert [name for name, _ in order_book.tables] == [
+        'exchange_ethbtc_order', 'exchange_ethbtc_trade']
+
+    order_book.update_table(handler)
+    assert update_trade(order_book)
+    order_book.update_table(handler)
+
+    (order_table, order_row), (trade_table, trade_row) = handler.rows
+    assert order_table == 'exchange_ethbtc_order'
+    assert order_row['update_type'] == OrderBookUpdateTypeField.ORDER_BOOK
+    assert trade_table == 'exchange_ethbtc_trade'
+    assert trade_row == {
+        'date_time': CURRENT_TIME,
+        'trade_time': TRADE_TIME,
+        'tid': '123',
+        'price': 100.5,
+        'qty': 0.5,
+        'side': TradeSideField.SELL,
+    }
+
+
+def test_trade_table_fields():
+    """The order book table does not carry the trade columns if the
+    trades are recorded in the trade table.
+    """
+    fields = create_order_book(depth=2, is_trade_table=True).fields
+
+    assert list(fields.keys()) == [
+        'id', 'date_time', 'update_type',
+        'b1', 'bq1', 'a1', 'aq1', 'b2', 'bq2', 'a2', 'aq2']
+    assert list(OrderBook(
+        exchange='Exchange', symbol='ETH/BTC', is_trade_table=True,
+    ).trade_fields.keys()) == [
+        'id', 'date_time', 'trade_time', 'tid', 'price', 'qty', 'side']
+
+
+def test_no_trade_table():
+    """The trades are recorded in the order book table by default.
+    """
+    order_book = create_order_book(depth=1)
+    handler = RecordHandler()
+
+    assert [name for name, _ in order_book.tables] == [
+        'exchange_ethbtc_order']
+    assert list(order_book.fields.keys()) == [
+        'id', 'date_time', 'update_type', 't', 'tq', 'b1', 'bq1', 'a1',
+        'aq1']
+
+    update_trade(order_book)
+    order_book.update_table(handler)
+
+    (table_name, row), = handler.rows
+    assert table_name == 'exchange_ethbtc_order'
+    assert row['update_type'] == OrderBookUpdateTypeField.TRADE
+    assert (row['t'], row['tq']) == (100.5, 0.5)
+
+
+def test_parse_trade_side():
+    """The sides of ccxt and cryptofeed are parsed.
+    """
+    assert TradeSideField.parse('buy') == TradeSideField.BUY
+    assert TradeSideField.parse('BID') == TradeSideField.BUY
+    assert TradeSideField.parse('sell') == TradeSideField.SELL
+    assert TradeSideField.parse('ask') == TradeSideField.SELL
+    assert TradeSideField.parse(None) == TradeSideField.UNKNOWN
+    assert TradeSideField.parse('other') == TradeSideField.UNKNOWN
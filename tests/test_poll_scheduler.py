@@ -0,0 +1,27 @@
+import pytest
+
+from befh.exchange.poll_scheduler import PollScheduler
+
+
+def test_empty_symbols():
+    """The scheduler requires an instrument to poll.
+    """
+    with pytest.raises(AssertionError):
+        PollScheduler(symbols=[], request_rate=10.0)
+
+
+def test_next():
+    """The instrument of the earliest poll time is polled next.
+    """
+    scheduler = PollScheduler(symbols=['A', 'B'], request_rate=10.0)
+
+    assert scheduler.next() == ('A', 0.0)
+    scheduler.update('A', is_changed=True, request_count=1, timestamp=100.0)
+    assert scheduler.next() == ('B', 0.0)
+    scheduler.update('B', is_changed=False, request_count=1, timestamp=100.0)
+
+    # The changed instrument is polled again before the unchanged one
+    symbol, poll_time = scheduler.next()
+    assert symbol == 'A'
+    assert poll_time > 100.0
+    assert scheduler.get_activity('A') > scheduler.get_activity('B')
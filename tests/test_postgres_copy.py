@@ -0,0 +1,189 @@
+import csv
+from datetime import datetime
+from decimal import Decimal
+import struct
+
+import pytest
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    Numeric,
+    String,
+    Table)
+from sqlalchemy.dialects import mysql
+
+from befh.handler.postgres_copy import (
+    BINARY_HEADER,
+    BINARY_TRAILER,
+    CSV_NULL,
+    create_copy_statement,
+    encode_binary,
+    encode_csv,
+    encode_numeric,
+    encode_timestamp,
+    get_binary_encoder)
+
+
+def decode_numeric(data):
+    """Decode the numeric of the binary format as PostgreSQL does.
+    """
+    ndigits, weight, sign, dscale = struct.unpack_from('!hhHh', data)
+    digits = struct.unpack_from('!%dh' % ndigits, data, 8)
+    assert len(data) == 8 + 2 * ndigits
+
+    if sign == 0xC000:
+        return Decimal('NaN')
+
+    value = sum((
+        Decimal(digit) * Decimal(10000) ** (weight - i)
+        for i, digit in enumerate(digits)), Decimal(0))
+    value = value.quantize(Decimal(1).scaleb(-dscale))
+
+    return -value if sign == 0x4000 else value
+
+
+def decode_binary(data, column_count):
+    """Decode the rows of the binary format as PostgreSQL does.
+
+    :return: `list` of the `list` of the field bytes, or None for NULL.
+    """
+    assert data.startswith(BINARY_HEADER)
+    assert data.endswith(BINARY_TRAILER)
+    offset = len(BINARY_HEADER)
+    rows = []
+
+    while offset < len(data) - len(BINARY_TRAILER):
+        field_count, = struct.unpack_from('!h', data, offset)
+        assert field_count == column_count
+        offset += 2
+        row = []
+
+        for _ in range(field_count):
+            length, = struct.unpack_from('!i', data, offset)
+            offset += 4
+            if length == -1:
+                row.append(None)
+            else:
+                row.append(data[offset:offset + length])
+                offset += length
+
+        rows.append(row)
+
+    return rows
+
+
+@pytest.mark.parametrize('value, scale, expected', [
+    (0, None, '0'),
+    (0.0, None, '0.0'),
+    (1, None, '1'),
+    (10000, None, '10000'),
+    (123.45, None, '123.45'),
+    (-123.45, None, '-123.45'),
+    (0.0001, None, '0.0001'),
+    (0.00012345, None, '0.00012345'),
+    (98765.4321, None, '98765.4321'),
+    (1e-10, None, '1E-10'),
+    (12345678901234, None, '12345678901234'),
+    (100.5, 8, '100.50000000'),
+    (0.123456789, 4, '0.1235'),
+    (-0.5, 2, '-0.50'),
+    (Decimal('3.14159'), None, '3.14159'),
+])
+def test_encode_numeric(value, scale, expected):
+    """The numeric is decoded into the same value and scale.
+    """
+    decoded = decode_numeric(encode_numeric(value, scale))
+
+    assert decoded == Decimal(expected)
+    assert decoded.as_tuple().exponent == min(
+        Decimal(expected).as_tuple().exponent, 0)
+
+
+def test_encode_numeric_nan():
+    """NaN is encoded with the NaN sign.
+    """
+    assert decode_numeric(encode_numeric(float('nan'))).is_nan()
+
+
+@pytest.mark.parametrize('value, expected', [
+    (datetime(2000, 1, 1), 0),
+    (datetime(2000, 1, 1, 0, 0, 1, 5), 1000005),
+    (datetime(1999, 12, 31, 23, 59, 59), -1000000),
+    (datetime(2020, 8, 7, 23, 33, 32, 205000), 650158412205000),
+])
+def test_encode_timestamp(value, expected):
+    """The timestamp is encoded in microseconds since 2000-01-01.
+    """
+    assert struct.unpack('!q', encode_timestamp(value))[0] == expected
+
+
+def test_encode_csv():
+    """NULL is encoded as the NULL marker and the values are quoted
+    as needed.
+    """
+    rows = [
+        {'id': 1, 'date_time': '20200101 00:00:00.000000', 'tid': 'a,b',
+         'price': 1.5},
+        {'id': 2, 'date_time': datetime(2020, 1, 1, 0, 0, 0, 1),
+         'tid': None, 'price': None},
+    ]
+
+    data = encode_csv(rows, ['id', 'date_time', 'tid', 'price'])
+
+    assert list(csv.reader(data)) == [
+        ['1', '20200101 00:00:00.000000', 'a,b', '1.5'],
+        ['2', '2020-01-01 00:00:00.000001', CSV_NULL, CSV_NULL],
+    ]
+
+
+def test_encode_binary():
+    """The rows are encoded field by field with NULL as length -1.
+    """
+    table = Table(
+        'test', MetaData(),
+        Column('id', Integer),
+        Column('epoch', BigInteger),
+        Column('date_time', DateTime().with_variant(
+            mysql.DATETIME(fsp=6), 'mysql')),
+        Column('tid', String(64)),
+        Column('price', Numeric(precision=20, scale=8)))
+    rows = [
+        {'id': 1, 'epoch': 2 ** 40, 'date_time': datetime(2000, 1, 1),
+         'tid': 'abc', 'price': 1.5},
+        {'id': 2, 'epoch': None, 'date_time': None, 'tid': None,
+         'price': None},
+    ]
+
+    data = encode_binary(rows, list(table.columns)).getvalue()
+    decoded = decode_binary(data, 5)
+
+    assert decoded[0] == [
+        struct.pack('!i', 1),
+        struct.pack('!q', 2 ** 40),
+        struct.pack('!q', 0),
+        b'abc',
+        encode_numeric(1.5, 8)]
+    assert decoded[1] == [struct.pack('!i', 2)] + [None] * 4
+
+
+def test_get_binary_encoder_not_implemented():
+    """A column type without binary encoder is rejected.
+    """
+    with pytest.raises(NotImplementedError):
+        get_binary_encoder(mysql.JSON())
+
+
+def test_create_copy_statement():
+    """The statement copies the columns in the format.
+    """
+    assert create_copy_statement('"t"', ['"a"', '"b"'], 'csv') == (
+        'COPY "t" ("a","b") FROM STDIN '
+        "WITH (FORMAT csv, NULL '\\N')")
+    assert create_copy_statement('"t"', ['"a"'], 'binary') == (
+        'COPY "t" ("a") FROM STDIN WITH (FORMAT binary)')
+
+    with pytest.raises(NotImplementedError):
+        create_copy_statement('"t"', ['"a"'], 'text')
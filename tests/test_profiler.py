@@ -0,0 +1,91 @@
+import os
+import signal
+from time import process_time
+import tracemalloc
+
+import pytest
+
+from befh.core.profiler import Profiler
+
+NAME = 'test'
+
+
+@pytest.fixture(autouse=True)
+def signal_handlers():
+    """Restore the signal handlers set by the profiler.
+    """
+    handlers = dict(
+        (signum, signal.getsignal(signum))
+        for signum in (signal.SIGUSR1, signal.SIGTERM, signal.SIGPROF))
+    yield
+    signal.setitimer(signal.ITIMER_PROF, 0)
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def busy(seconds):
+    """Spend the CPU time.
+    """
+    start_time = process_time()
+    values = []
+    while process_time() - start_time < seconds:
+        values.append(sum(range(1000)))
+
+    return len(values)
+
+
+def target(path):
+    """Spend the CPU time and dump the statistics by SIGUSR1.
+
+    :return: `str` of the name of the file dumped by SIGUSR1.
+    """
+    busy(0.2)
+    os.kill(os.getpid(), signal.SIGUSR1)
+    busy(0.01)
+    names = os.listdir(path)
+    assert len(names) == 1
+    return names[0]
+
+
+@pytest.mark.parametrize('mode, suffix', [
+    ('cprofile', '.prof'),
+    ('sample', '.folded'),
+    ('tracemalloc', '.tracemalloc.txt'),
+])
+def test_profile(tmp_path, mode, suffix):
+    """The statistics are dumped on SIGUSR1 while the target runs, and
+    again when it returns.
+    """
+    path = str(tmp_path / 'profile')
+    profiler = Profiler(mode=mode, path=path, sample_interval=0.001)
+
+    name = profiler.run(target=target, name=NAME, path=path)
+
+    assert name == '%s.%d%s' % (NAME, os.getpid(), suffix)
+    assert os.listdir(path) == [name]
+
+    if mode == 'cprofile':
+        import pstats
+        stats = pstats.Stats(os.path.join(path, name))
+        assert any(
+            function_name == 'busy'
+            for _, _, function_name in stats.stats.keys())
+    else:
+        with open(os.path.join(path, name)) as stats_file:
+            content = stats_file.read()
+
+        if mode == 'sample':
+            assert 'test_profiler.py:busy:' in content
+        else:
+            assert content.startswith(
+                'Top %d allocators' % Profiler.DEFAULT_TOP)
+
+
+def test_invalid_mode():
+    """The mode must be one of the modes.
+    """
+    with pytest.raises(AssertionError):
+        Profiler(mode='perf')
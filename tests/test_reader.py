@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import queue
+
+import pytest
+from sqlalchemy import create_engine
+
+from befh.handler.sql_handler import SqlHandler
+from befh.reader import (
+    get_table_names,
+    parse_date_time,
+    read_table,
+    read_tables)
+from befh.table.table import DateTimeField, IntIdField, PriceField
+
+np = pytest.importorskip('numpy')
+
+TABLE_NAME = 'exchange_ethbtc_order'
+START_TIME = datetime(2020, 1, 1)
+
+
+def create_fields(date_time, price):
+    """Create the fields of a row.
+    """
+    return OrderedDict([
+        ('id', IntIdField(name='id')),
+        ('date_time', DateTimeField(name='date_time', value=date_time)),
+        ('b1', PriceField(name='b1', value=price)),
+    ])
+
+
+def write_table(path, table_name, rows, timestamp_format='string'):
+    """Write the rows of date time and price into the table.
+    """
+    handler = SqlHandler(
+        connection='sqlite:///%s' % path,
+        timestamp_format=timestamp_format,
+        is_debug=False,
+        is_cold=False)
+    handler.load(queue_factory=queue.Queue)
+    handler.create_table(
+        table_name=table_name, fields=create_fields(None, -1))
+
+    for date_time, price in rows:
+        handler.insert(
+            table_name=table_name, fields=create_fields(date_time, price))
+
+    handler.close()
+
+
+def at(seconds):
+    """Get the time of the seconds from the start time.
+    """
+    return START_TIME + timedelta(seconds=seconds)
+
+
+def to_datetime64(values):
+    """Convert the datetimes into `datetime64[us]`.
+    """
+    return np.array(values, dtype='datetime64[us]')
+
+
+@pytest.fixture
+def path(tmp_path):
+    """Path of the SQLite database file.
+    """
+    return str(tmp_path / 'test.db')
+
+
+@pytest.mark.parametrize('values', [
+    ['20200101 00:00:00.000000', '20200101 12:34:56.789012', None],
+    [0, 1577882096789012, None],
+    [datetime(1970, 1, 1), datetime(2020, 1, 1, 12, 34, 56, 789012), None],
+])
+def test_parse_date_time(values):
+    """The strings, the epoch microseconds and the datetimes are
+    parsed, and None is NaT.
+    """
+    parsed = parse_date_time(values)
+
+    assert parsed.dtype == np.dtype('datetime64[us]')
+    assert np.isnat(parsed[2])
+
+    if isinstance(values[0], int):
+        expected = [datetime(1970, 1, 1),
+                    datetime(2020, 1, 1, 12, 34, 56, 789012)]
+    elif isinstance(values[0], str):
+        expected = [START_TIME, datetime(2020, 1, 1, 12, 34, 56, 789012)]
+    else:
+        expected = values[:2]
+
+    assert (parsed[:2] == to_datetime64(expected)).all()
+
+
+def test_parse_date_time_all_null():
+    """All None values are NaT.
+    """
+    assert np.isnat(parse_date_time([None, None])).all()
+
+
+def test_get_table_names(path):
+    """The rotated tables covering the time range are selected in
+    chronological order, followed by the current table, and the
+    staging tables are excluded.
+    """
+    engine = create_engine('sqlite:///%s' % path)
+    for table_name in [
+            TABLE_NAME + '_20200103', TABLE_NAME + '_20200101',
+            TABLE_NAME + '_20200102', TABLE_NAME + '_next',
+            TABLE_NAME, 'exchange_ethbtc_trade_20200101']:
+        engine.execute('create table %s (id integer)' % table_name)
+
+    connection = 'sqlite:///%s' % path
+
+    assert get_table_names(connection, TABLE_NAME) == [
+        TABLE_NAME + '_20200101', TABLE_NAME + '_20200102',
+        TABLE_NAME + '_20200103', TABLE_NAME]
+    assert get_table_names(
+        connection, TABLE_NAME,
+        start_time=datetime(2020, 1, 2, 12),
+        end_time=datetime(2020, 1, 3)) == [
+        TABLE_NAME + '_20200102', TABLE_NAME]
+    assert get_table_names(
+        connection, TABLE_NAME, start_time=datetime(2020, 1, 5)) == [
+        TABLE_NAME + '_20200103', TABLE_NAME]
+    assert get_table_names(
+        connection, TABLE_NAME, end_time=datetime(2020, 1, 1)) == [
+        TABLE_NAME]
+
+
+@pytest.mark.parametrize('timestamp_format', SqlHandler.TIMESTAMP_FORMATS)
+def test_read_table_bounds(path, timestamp_format):
+    """The rows are read between the inclusive start and the exclusive
+    end, whichever the timestamp format is.
+    """
+    write_table(
+        path, TABLE_NAME, [(at(i), float(i)) for i in range(5)],
+        timestamp_format=timestamp_format)
+
+    chunks = list(read_table(
+        connection='sqlite:///%s' % path,
+        table_name=TABLE_NAME,
+        start_time=at(1),
+        end_time=at(4)))
+
+    assert len(chunks) == 1
+    assert chunks[0]['date_time'].tolist() == [at(1), at(2), at(3)]
+    assert chunks[0]['b1'].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_read_table_chunks(path):
+    """The rows are read in chunks of the chunk size ordered by id,
+    with the selected columns only.
+    """
+    write_table(path, TABLE_NAME, [(at(i), float(i)) for i in range(5)])
+
+    chunks = list(read_table(
+        connection='sqlite:///%s' % path,
+        table_name=TABLE_NAME,
+        columns=['id', 'b1'],
+        chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks[0].dtype.names == ('id', 'b1')
+    assert np.concatenate(chunks)['id'].tolist() == [1, 2, 3, 4, 5]
+
+
+def test_read_table_data_frame(path):
+    """The chunks are data frames with the date time columns parsed.
+    """
+    pytest.importorskip('pandas')
+    write_table(path, TABLE_NAME, [(at(i), float(i)) for i in range(3)])
+
+    data_frame, = read_table(
+        connection='sqlite:///%s' % path,
+        table_name=TABLE_NAME,
+        is_data_frame=True)
+
+    assert list(data_frame.columns) == ['id', 'date_time', 'b1']
+    assert str(data_frame['date_time'].dtype).startswith('datetime64')
+    assert data_frame['b1'].tolist() == [0.0, 1.0, 2.0]
+
+
+def test_read_tables(path):
+    """The time range is read across the rotated and current tables.
+    """
+    write_table(path, TABLE_NAME + '_20200101', [
+        (at(0), 0.0), (at(1), 1.0)])
+    write_table(path, TABLE_NAME, [
+        (at(86400), 2.0), (at(86401), 3.0)])
+
+    chunks = list(read_tables(
+        connection='sqlite:///%s' % path,
+        table_name=TABLE_NAME,
+        start_time=at(1),
+        end_time=at(86401)))
+
+    assert np.concatenate(chunks)['b1'].tolist() == [1.0, 2.0]
@@ -0,0 +1,158 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip('ccxt')
+
+from befh.exchange import rest_api_exchange  # noqa: E402
+from befh.exchange.rest_api_exchange import RestApiExchange  # noqa: E402
+from befh.testing.fake_ccxt_exchange import (  # noqa: E402
+    FakeCcxtExchange)
+
+INTERFACE = 'befh.testing.fake_ccxt_exchange.FakeCcxtExchange'
+SYMBOLS = ['BTC/USD', 'ETH/USD']
+
+
+class StopLoop(Exception):
+    """Stop the refresh loop of the test.
+    """
+
+
+@pytest.fixture
+def now(monkeypatch):
+    """Current time of the exchange.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(rest_api_exchange, 'time', lambda: now[0])
+    return now
+
+
+def create_exchange(cache_path, **config):
+    """Create the exchange of the fake ccxt interface.
+    """
+    config = dict({
+        'instruments': SYMBOLS,
+        'interface': INTERFACE,
+        'interface_config': {'symbols': SYMBOLS},
+        'markets_cache': str(cache_path),
+    }, **config)
+    return RestApiExchange(
+        name='Fake', config=config, is_debug=False, is_cold=False)
+
+
+def load(exchange, monkeypatch):
+    """Load the exchange and record the loads of the markets.
+
+    :return: `list` of the interfaces loading the markets.
+    """
+    loads = []
+    load_markets = FakeCcxtExchange.load_markets
+
+    def record_load_markets(interface, *args, **kwargs):
+        loads.append(interface)
+        return load_markets(interface, *args, **kwargs)
+
+    monkeypatch.setattr(
+        FakeCcxtExchange, 'load_markets', record_load_markets)
+    exchange.load(handlers={}, is_initialize_instmt=False)
+    return loads
+
+
+def test_markets_cache_hit(tmp_path, monkeypatch, now):
+    """The markets are loaded from the network and written to the
+    cache, which is then read without loading the markets again.
+    """
+    exchange = create_exchange(tmp_path)
+    assert len(load(exchange, monkeypatch)) == 1
+
+    with open(exchange.markets_cache_path) as cache_file:
+        cache = json.load(cache_file)
+    assert cache['timestamp'] == 1000.0
+    assert sorted(cache['markets'].keys()) == SYMBOLS
+
+    exchange = create_exchange(tmp_path)
+    assert load(exchange, monkeypatch) == []
+    assert sorted(exchange._exchange_interface.markets.keys()) == SYMBOLS
+    assert os.listdir(str(tmp_path)) == ['fake.json']
+
+
+def test_markets_cache_corrupted(tmp_path, monkeypatch, now):
+    """A corrupted cache file falls back to the network and is
+    rewritten.
+    """
+    with open(str(tmp_path / 'fake.json'), 'w') as cache_file:
+        cache_file.write('{"timestamp": 1')
+
+    exchange = create_exchange(tmp_path)
+    assert len(load(exchange, monkeypatch)) == 1
+
+    with open(exchange.markets_cache_path) as cache_file:
+        assert json.load(cache_file)['timestamp'] == 1000.0
+
+
+def test_markets_cache_write_failure(tmp_path, monkeypatch, now):
+    """The temporary file is removed if the cache cannot be written.
+    """
+    def fail(*args, **kwargs):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(rest_api_exchange.os, 'replace', fail)
+    exchange = create_exchange(tmp_path)
+    assert len(load(exchange, monkeypatch)) == 1
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_markets_cache_expiry(tmp_path, monkeypatch, now):
+    """The expired markets are refreshed, and a failed refresh is
+    retried after the retry interval however it fails.
+    """
+    exchange = create_exchange(tmp_path, markets_cache_ttl=100)
+    loads = load(exchange, monkeypatch)
+    sleeps = []
+    results = [RuntimeError('Unexpected'), False, True]
+
+    def sleep(second):
+        sleeps.append(second)
+        now[0] += second
+        if len(sleeps) > 3:
+            raise StopLoop()
+
+    def refresh():
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        if result:
+            exchange._markets_cache_time = now[0]
+        return result
+
+    monkeypatch.setattr(rest_api_exchange, 'sleep', sleep)
+    monkeypatch.setattr(exchange, '_refresh_markets_cache', refresh)
+
+    with pytest.raises(StopLoop):
+        exchange._refresh_markets_cache_loop()
+
+    assert len(loads) == 1
+    assert sleeps == [
+        100,
+        RestApiExchange.MARKETS_CACHE_RETRY_INTERVAL,
+        RestApiExchange.MARKETS_CACHE_RETRY_INTERVAL,
+        100]
+    assert results == []
+
+
+def test_refresh_markets_cache(tmp_path, monkeypatch, now):
+    """The refresh loads the markets on a new interface and rewrites
+    the cache.
+    """
+    exchange = create_exchange(tmp_path)
+    loads = load(exchange, monkeypatch)
+    now[0] += 10
+
+    assert exchange._refresh_markets_cache()
+    assert len(loads) == 2
+    assert loads[1] is not exchange._exchange_interface
+    assert exchange._markets_cache_time == 1010.0
+
+    with open(exchange.markets_cache_path) as cache_file:
+        assert json.load(cache_file)['timestamp'] == 1010.0
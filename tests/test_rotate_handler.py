@@ -0,0 +1,190 @@
+from calendar import timegm
+from collections import OrderedDict
+from datetime import datetime
+import queue
+
+import pytest
+
+from befh.handler.handler import Handler
+from befh.handler.handler_operator import (
+    HandlerCreateTableOperator,
+    HandlerInsertOperator)
+from befh.handler.rotate_handler import RotateHandler
+from befh.table.table import DateTimeField, IntIdField
+
+
+class RecordRotateHandler(RotateHandler):
+    """Rotate handler recording the executed operations.
+    """
+
+    def __init__(self, **kwargs):
+        """Constructor.
+        """
+        super().__init__(is_debug=False, is_cold=False, **kwargs)
+        self.operations = []
+
+    def create_table(self, table_name, fields, **kwargs):
+        """Create table.
+        """
+        self.register_rotate_table(table_name=table_name, fields=fields)
+
+    def insert(self, table_name, fields):
+        """Insert.
+        """
+        self.operations.append(
+            ('insert', table_name, fields['date_time'].value))
+
+    def rename_table(self, from_name, to_name, fields=None, keep_table=True):
+        """Rename table.
+        """
+        self.operations.append(('rename', from_name, to_name))
+
+
+def create_fields(date_time):
+    """Create the fields of a row.
+    """
+    return OrderedDict([
+        ('id', IntIdField(name='id')),
+        ('date_time', DateTimeField(name='date_time', value=date_time)),
+    ])
+
+
+def epoch(*args):
+    """Epoch seconds of the UTC time.
+    """
+    return timegm(datetime(*args).utctimetuple())
+
+
+@pytest.mark.parametrize('timestamp, rotate_frequency, expected', [
+    (datetime(2020, 1, 1, 12, 30, 15), '%Y%m%d', epoch(2020, 1, 2)),
+    (datetime(2020, 1, 1, 12, 30, 15), '%Y%m%d%H', epoch(2020, 1, 1, 13)),
+    (datetime(2020, 1, 1, 12, 30, 15), '%Y%m%d%H%M',
+     epoch(2020, 1, 1, 12, 31)),
+    (datetime(2020, 1, 1, 12, 30, 15, 500000), '%Y%m%d%H%M%S',
+     epoch(2020, 1, 1, 12, 30, 16)),
+    (datetime(2020, 12, 31, 23, 59, 59), '%Y%m', epoch(2021, 1, 1)),
+    (datetime(2020, 2, 15), '%Y%m', epoch(2020, 3, 1)),
+    (datetime(2020, 6, 15), '%Y', epoch(2021, 1, 1)),
+    (datetime(2020, 6, 15), 'fixed', float('inf')),
+])
+def test_get_next_rotate_time(timestamp, rotate_frequency, expected):
+    """The next rotation time is the first boundary changing the
+    formatted timestamp.
+    """
+    assert RotateHandler.get_next_rotate_time(
+        timestamp=timestamp,
+        rotate_frequency=rotate_frequency) == expected
+
+
+def test_rotate_by_row_date_time():
+    """The rows queued before the boundary stay in the table of their
+    period, even though they are executed after the boundary.
+    """
+    handler = RecordRotateHandler(is_rotate=True)
+    handler.load(queue_factory=queue.Queue)
+    handler.update_last_rotate_timestamp(datetime(2020, 1, 1, 23, 59))
+
+    handler.execute(HandlerCreateTableOperator(
+        table_name='a_order', fields=create_fields(None)).encode())
+    for date_time in [
+            datetime(2020, 1, 1, 23, 59, 58),
+            datetime(2020, 1, 1, 23, 59, 59, 999999),
+            datetime(2020, 1, 2),
+            datetime(2020, 1, 2, 0, 0, 1),
+            datetime(2020, 1, 3, 0, 0, 1)]:
+        handler.execute(HandlerInsertOperator(
+            table_name='a_order',
+            fields=create_fields(date_time)).encode())
+
+    assert handler.operations == [
+        ('insert', 'a_order', datetime(2020, 1, 1, 23, 59, 58)),
+        ('insert', 'a_order', datetime(2020, 1, 1, 23, 59, 59, 999999)),
+        ('rename', 'a_order', 'a_order_20200101'),
+        ('insert', 'a_order', datetime(2020, 1, 2)),
+        ('insert', 'a_order', datetime(2020, 1, 2, 0, 0, 1)),
+        ('rename', 'a_order', 'a_order_20200102'),
+        ('insert', 'a_order', datetime(2020, 1, 3, 0, 0, 1)),
+    ]
+    assert handler.get_last_rotated_timestamp('a_order') == (
+        datetime(2020, 1, 3, 0, 0, 1))
+    assert handler.last_rotated_timestamp == datetime(2020, 1, 1, 23, 59)
+
+
+def test_rotate_each_table():
+    """A table is rotated by its own rows only, and a table registered
+    after the rotation of another table starts from the period of the
+    handler.
+    """
+    handler = RecordRotateHandler(is_rotate=True)
+    handler.load(queue_factory=queue.Queue)
+    handler.update_last_rotate_timestamp(datetime(2020, 1, 1, 23, 59))
+
+    handler.execute(HandlerCreateTableOperator(
+        table_name='a_trade', fields=create_fields(None)))
+    handler.execute(HandlerInsertOperator(
+        table_name='a_trade', fields=create_fields(datetime(2020, 1, 2))))
+    handler.execute(HandlerCreateTableOperator(
+        table_name='a_order', fields=create_fields(None)))
+    for date_time in [datetime(2020, 1, 1, 23, 59, 59), datetime(2020, 1, 2)]:
+        handler.execute(HandlerInsertOperator(
+            table_name='a_order', fields=create_fields(date_time)))
+
+    assert handler.operations == [
+        ('rename', 'a_trade', 'a_trade_20200101'),
+        ('insert', 'a_trade', datetime(2020, 1, 2)),
+        ('insert', 'a_order', datetime(2020, 1, 1, 23, 59, 59)),
+        ('rename', 'a_order', 'a_order_20200101'),
+        ('insert', 'a_order', datetime(2020, 1, 2)),
+    ]
+
+
+def test_rotate_priority_lanes():
+    """A trade past the boundary executed ahead of a backlog of order
+    book updates before the boundary does not rotate the order book
+    table, whose backlog stays in the table of its period.
+    """
+    handler = RecordRotateHandler(
+        is_rotate=True, is_priority_lanes=True, batch_frequency=0,
+        lane_batch_sizes={Handler.BOOK_LANE: 2})
+    handler.load(queue_factory=queue.Queue)
+    handler.update_last_rotate_timestamp(datetime(2020, 1, 1, 23, 59))
+
+    for table_name in ['a_order', 'a_trade']:
+        handler.prepare_create_table(
+            table_name=table_name, fields=create_fields(None))
+
+    for second in range(5):
+        handler.prepare_insert(
+            table_name='a_order',
+            fields=create_fields(datetime(2020, 1, 1, 23, 59, 50 + second)))
+
+    handler.prepare_insert(
+        table_name='a_trade', fields=create_fields(datetime(2020, 1, 2)))
+    handler.prepare_insert(
+        table_name='a_order', fields=create_fields(datetime(2020, 1, 2)))
+    handler.prepare_close()
+    handler.run()
+
+    assert handler.operations[:2] == [
+        ('rename', 'a_trade', 'a_trade_20200101'),
+        ('insert', 'a_trade', datetime(2020, 1, 2))]
+    assert [
+        operation for operation in handler.operations
+        if operation[1] == 'a_order'] == [
+        ('insert', 'a_order', datetime(2020, 1, 1, 23, 59, 50 + second))
+        for second in range(5)] + [
+        ('rename', 'a_order', 'a_order_20200101'),
+        ('insert', 'a_order', datetime(2020, 1, 2))]
+
+
+def test_no_rotation():
+    """The tables are not rotated without is_rotate.
+    """
+    handler = RecordRotateHandler()
+    handler.load(queue_factory=queue.Queue)
+    handler.update_last_rotate_timestamp(datetime(2020, 1, 1))
+    handler.execute(HandlerInsertOperator(
+        table_name='a_order', fields=create_fields(datetime(2020, 1, 5))))
+
+    assert handler.operations == [
+        ('insert', 'a_order', datetime(2020, 1, 5))]
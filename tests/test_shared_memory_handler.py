@@ -0,0 +1,120 @@
+from datetime import datetime
+import queue
+
+import pytest
+
+from befh.handler.shared_memory_handler import (
+    SEQUENCE,
+    SharedMemoryHandler,
+    SharedMemoryReader)
+from befh.table.order_book_delta_table import OrderBookDelta
+from befh.table.order_book_table import OrderBook
+
+TABLE_NAME = 'exchange_ethbtc_order'
+
+
+@pytest.fixture
+def handler(tmp_path):
+    """Shared memory handler with the slot of an order book.
+    """
+    handler = SharedMemoryHandler(
+        path=str(tmp_path / 'befh'), slots=2, depth=2, is_debug=False,
+        is_cold=False)
+    handler.load(queue_factory=queue.Queue)
+    order_book = OrderBook(exchange='Exchange', symbol='ETH/BTC')
+    handler.create_table(
+        table_name=order_book.table_name, fields=order_book.fields)
+    return handler
+
+
+def write(handler, quantity):
+    """Write an order book of the quantity.
+    """
+    order_book = OrderBook(exchange='Exchange', symbol='ETH/BTC')
+    order_book.update_bids_asks(
+        bids=[[100.0, quantity], [99.0, quantity]],
+        asks=[[101.0, quantity], [102.0, quantity]])
+    handler.insert(table_name=TABLE_NAME, fields=order_book.fields)
+
+
+def read(reader):
+    """Read the snapshot as a dict.
+    """
+    return dict(zip(reader.field_names, reader.read(TABLE_NAME)))
+
+
+def test_read(handler, tmp_path):
+    """The latest order book is read from the slot.
+    """
+    reader = SharedMemoryReader(str(tmp_path / 'befh'))
+
+    assert reader.table_names == [TABLE_NAME]
+    assert reader.read(TABLE_NAME) is None
+    assert reader.read('unknown_table') is None
+
+    write(handler, 1.0)
+    write(handler, 2.0)
+    snapshot = read(reader)
+
+    assert snapshot['b1'] == 100.0
+    assert snapshot['aq2'] == 2.0
+    assert snapshot['date_time'] <= (
+        datetime.utcnow() - datetime(1970, 1, 1)).total_seconds()
+    reader.close()
+
+
+def test_read_locked_slot(handler, tmp_path, monkeypatch):
+    """A read of a slot left locked by a dead writer fails after the
+    maximum retries rather than spinning forever.
+    """
+    monkeypatch.setattr(SharedMemoryReader, 'MAXIMUM_READ_RETRIES', 10)
+    reader = SharedMemoryReader(str(tmp_path / 'befh'))
+    write(handler, 1.0)
+
+    offset = handler._offsets[TABLE_NAME]
+    sequence, = SEQUENCE.unpack_from(handler._mmap, offset)
+    SEQUENCE.pack_into(handler._mmap, offset, sequence + 1)
+
+    with pytest.raises(RuntimeError):
+        reader.read(TABLE_NAME)
+
+    reader.close()
+
+
+def test_reload_keeps_mapped_file(handler, tmp_path):
+    """The file is replaced on load rather than truncated, so a reader
+    of the previous file keeps reading its snapshots.
+    """
+    write(handler, 1.0)
+    reader = SharedMemoryReader(str(tmp_path / 'befh'))
+
+    new_handler = SharedMemoryHandler(
+        path=str(tmp_path / 'befh'), slots=2, depth=2, is_debug=False,
+        is_cold=False)
+    new_handler.load(queue_factory=queue.Queue)
+
+    assert read(reader)['bq1'] == 1.0
+    assert list(tmp_path.iterdir()) == [tmp_path / 'befh']
+
+    new_reader = SharedMemoryReader(str(tmp_path / 'befh'))
+    assert new_reader.table_names == []
+    reader.close()
+    new_reader.close()
+
+
+def test_reject_delta_table(handler):
+    """The tables of the delta storage are rejected, while the trade
+    and bar tables have no slot.
+    """
+    order_book = OrderBookDelta(
+        exchange='Exchange', symbol='ETH/BTC', is_trade_table=True,
+        bar_intervals=[60])
+    table_name, fields = order_book.tables[0]
+
+    with pytest.raises(RuntimeError):
+        handler.create_table(table_name=table_name, fields=fields)
+
+    for table_name, fields in order_book.tables[1:]:
+        handler.create_table(table_name=table_name, fields=fields)
+
+    assert list(handler._offsets.keys()) == [TABLE_NAME]
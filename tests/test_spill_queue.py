@@ -0,0 +1,186 @@
+import os
+import queue
+
+import pytest
+
+from befh.handler.spill_queue import SpillQueue
+
+
+@pytest.fixture(autouse=True)
+def flush_interval(monkeypatch):
+    """Shorten the polling of the drain thread.
+    """
+    monkeypatch.setattr(SpillQueue, 'FLUSH_INTERVAL', 0.01)
+
+
+def create_queue(path, source=None, **kwargs):
+    """Create and start the spill queue.
+    """
+    spill_queue = SpillQueue(
+        source=source or queue.Queue(), path=str(path), **kwargs)
+    spill_queue.start()
+    return spill_queue
+
+
+def get_all(spill_queue):
+    """Get all the operators of the queue.
+    """
+    elements = []
+    while not spill_queue.empty():
+        elements.append(spill_queue.get())
+
+    return elements
+
+
+def get_segment_names(path):
+    """Get the file names of the segments.
+    """
+    return sorted(
+        name for name in os.listdir(str(path))
+        if name.endswith(SpillQueue.SEGMENT_SUFFIX))
+
+
+def crash(spill_queue):
+    """Stop the drain thread without writing anything, as a crashed
+    worker does.
+    """
+    spill_queue._is_running = False
+    spill_queue._thread.join()
+
+
+def test_spill_in_order(tmp_path):
+    """The operators over the threshold are spilled and read back in
+    order, and the log is removed once committed.
+    """
+    spill_queue = create_queue(tmp_path, threshold=2)
+
+    for i in range(5):
+        spill_queue.put(b'%d' % i)
+
+    assert spill_queue.is_spilling
+    assert get_all(spill_queue) == [b'0', b'1', b'2', b'3', b'4']
+    assert not spill_queue.is_spilling
+    assert get_segment_names(tmp_path) != []
+
+    spill_queue.commit()
+    assert get_segment_names(tmp_path) == []
+
+    spill_queue.put(b'5')
+    assert get_all(spill_queue) == [b'5']
+    spill_queue.stop()
+
+
+def test_segment_removed_after_commit(tmp_path):
+    """A consumed segment is kept until its operators are committed.
+    """
+    spill_queue = create_queue(tmp_path, threshold=1, segment_size=1)
+
+    for i in range(3):
+        spill_queue.put(b'%d' % i)
+
+    assert get_all(spill_queue) == [b'0', b'1', b'2']
+    assert len(get_segment_names(tmp_path)) == 2
+
+    spill_queue.commit()
+    assert get_segment_names(tmp_path) == []
+    spill_queue.stop()
+
+
+def test_replay_uncommitted_after_crash(tmp_path):
+    """The operators taken but not committed before a crash are
+    replayed, while the committed ones are not.
+    """
+    spill_queue = create_queue(tmp_path, threshold=1)
+
+    for i in range(4):
+        spill_queue.put(b'%d' % i)
+
+    assert spill_queue.get() == b'0'
+    assert spill_queue.get() == b'1'
+    spill_queue.commit()
+    assert spill_queue.get() == b'2'
+    crash(spill_queue)
+
+    spill_queue = create_queue(tmp_path, threshold=1)
+    assert spill_queue.is_spilling
+    assert get_all(spill_queue) == [b'2', b'3']
+    spill_queue.commit()
+    spill_queue.stop()
+
+    assert get_segment_names(tmp_path) == []
+    assert not os.path.exists(str(tmp_path / SpillQueue.CURSOR_NAME))
+
+
+def test_stop_writes_memory(tmp_path):
+    """The operators in memory, in the pending batch and in the source
+    queue are written on stop and replayed in order.
+    """
+    source = queue.Queue()
+    spill_queue = create_queue(tmp_path, source=source, threshold=3)
+
+    for i in range(6):
+        spill_queue.put(b'%d' % i)
+
+    assert spill_queue.get() == b'0'
+    spill_queue.stop()
+    source.put(b'6')
+
+    spill_queue = create_queue(tmp_path, source=source, threshold=3)
+    assert get_all(spill_queue) == [b'1', b'2', b'3', b'4', b'5', b'6']
+    spill_queue.commit()
+    spill_queue.stop()
+
+    assert get_segment_names(tmp_path) == []
+
+
+def test_stop_writes_memory_without_spilling(tmp_path):
+    """The operators in memory are written on stop even if the queue
+    is not spilling.
+    """
+    spill_queue = create_queue(tmp_path, threshold=10)
+    spill_queue.put(b'0')
+    spill_queue.put(b'1')
+    assert not spill_queue.is_spilling
+    spill_queue.stop()
+
+    spill_queue = create_queue(tmp_path, threshold=10)
+    assert get_all(spill_queue) == [b'0', b'1']
+    spill_queue.commit()
+    spill_queue.stop()
+
+
+def test_replay_from_cursor(tmp_path):
+    """The segments are replayed from the cursor after a clean stop.
+    """
+    spill_queue = create_queue(tmp_path, threshold=1, segment_size=1)
+
+    for i in range(5):
+        spill_queue.put(b'%d' % i)
+
+    assert [spill_queue.get() for _ in range(3)] == [b'0', b'1', b'2']
+    spill_queue.stop()
+
+    spill_queue = create_queue(tmp_path, threshold=1, segment_size=1)
+    assert get_all(spill_queue) == [b'3', b'4']
+    spill_queue.commit()
+    spill_queue.stop()
+
+    assert get_segment_names(tmp_path) == []
+
+
+def test_drain_source(tmp_path):
+    """The operators of the source queue are moved by the drain thread.
+    """
+    source = queue.Queue()
+    spill_queue = create_queue(tmp_path, source=source, threshold=1)
+
+    for i in range(3):
+        source.put(b'%d' % i)
+
+    elements = []
+    while len(elements) < 3:
+        if not spill_queue.empty():
+            elements.append(spill_queue.get())
+
+    assert elements == [b'0', b'1', b'2']
+    spill_queue.stop()
@@ -0,0 +1,150 @@
+from datetime import datetime
+import gzip
+import os
+import sqlite3
+
+import pytest
+
+from befh.handler import sql_archive
+from befh.handler.sql_archive import archive_table
+
+TABLE_NAME = 'exchange_ethbtc_order'
+ROTATED_NAME = 'exchange_ethbtc_order_20200101'
+DATE = datetime(2020, 1, 1)
+
+
+def count_rows(path, table_name):
+    """Count the rows of the table in the SQLite database file.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            'select count(*) from %s' % table_name).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def get_table_names(path):
+    """Get the table names of the SQLite database file.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        return set(name for name, in conn.execute(
+            "select name from sqlite_master where type = 'table'"))
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Database of the live table and a rotated table of the date.
+    """
+    path = str(tmp_path / 'test.db')
+    conn = sqlite3.connect(path)
+
+    for table_name, date_times in [
+            (ROTATED_NAME, ['20200101 00:00:00.000000',
+                            '20200101 12:00:00.000000',
+                            '20200101 23:59:59.999999']),
+            (TABLE_NAME, ['20200101 23:59:59.999999',
+                          '20200102 00:00:00.000000',
+                          '20200102 00:00:01.000000'])]:
+        conn.execute(
+            'create table %s (id integer primary key, '
+            'date_time varchar(25), b1 float)' % table_name)
+        conn.executemany(
+            'insert into %s (date_time, b1) values (?, ?)' % table_name,
+            [(date_time, 1.0) for date_time in date_times])
+
+    conn.commit()
+    conn.close()
+    return path
+
+
+def archive(database, tmp_path, **kwargs):
+    """Archive the table of the date.
+    """
+    return archive_table(
+        connection='sqlite:///%s' % database,
+        table_name=TABLE_NAME,
+        date=DATE,
+        archive_path=str(tmp_path / 'archive'),
+        **kwargs)
+
+
+def read_archive(tmp_path):
+    """Read the date times of the SQLite archive.
+    """
+    path = str(tmp_path / 'archive' / '20200101' / (TABLE_NAME + '.db.gz'))
+    database_path = str(tmp_path / 'archive.db')
+
+    with gzip.open(path, 'rb') as archive_file, \
+            open(database_path, 'wb') as database_file:
+        database_file.write(archive_file.read())
+
+    conn = sqlite3.connect(database_path)
+    try:
+        return [date_time for date_time, in conn.execute(
+            'select date_time from %s order by id' % TABLE_NAME)]
+    finally:
+        conn.close()
+
+
+def test_archive_keeps_rows(database, tmp_path):
+    """The rows are archived and kept in the database by default.
+    """
+    assert archive(database, tmp_path) == 4
+
+    assert read_archive(tmp_path) == [
+        '20200101 00:00:00.000000',
+        '20200101 12:00:00.000000',
+        '20200101 23:59:59.999999',
+        '20200101 23:59:59.999999']
+    assert count_rows(database, ROTATED_NAME) == 3
+    assert count_rows(database, TABLE_NAME) == 3
+
+
+def test_archive_delete(database, tmp_path):
+    """The archived rows are deleted and the empty rotated table is
+    dropped with is_delete.
+    """
+    assert archive(database, tmp_path, is_delete=True) == 4
+
+    assert len(read_archive(tmp_path)) == 4
+    assert get_table_names(database) == {TABLE_NAME}
+    assert count_rows(database, TABLE_NAME) == 2
+
+
+def test_archive_delete_unverified(database, tmp_path, monkeypatch):
+    """The rows are not deleted if the archive does not hold all of
+    them.
+    """
+    monkeypatch.setattr(
+        sql_archive, '_count_archived_rows', lambda **kwargs: 3)
+
+    with pytest.raises(RuntimeError):
+        archive(database, tmp_path, is_delete=True)
+
+    assert count_rows(database, ROTATED_NAME) == 3
+    assert count_rows(database, TABLE_NAME) == 3
+
+
+def test_archive_delete_corrupted(database, tmp_path, monkeypatch):
+    """The rows are not deleted if the archive cannot be read back.
+    """
+    write_archive = sql_archive._archive_sqlite
+
+    def write_truncated_archive(path, **kwargs):
+        row_count = write_archive(path=path, **kwargs)
+        with open(path + '.gz', 'r+b') as archive_file:
+            archive_file.truncate(os.path.getsize(path + '.gz') // 2)
+        return row_count
+
+    monkeypatch.setattr(
+        sql_archive, '_archive_sqlite', write_truncated_archive)
+
+    with pytest.raises(EOFError):
+        archive(database, tmp_path, is_delete=True)
+
+    assert count_rows(database, ROTATED_NAME) == 3
+    assert count_rows(database, TABLE_NAME) == 3
@@ -0,0 +1,456 @@
+from collections import OrderedDict
+import csv
+from datetime import datetime
+import queue
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.dialects import mysql
+
+from befh.handler import sql_handler
+from befh.handler.postgres_copy import CSV_NULL, encode_csv
+from befh.handler.sql_handler import SqlHandler
+from befh.table.table import DateTimeField, IntIdField, PriceField
+
+TABLE_NAME = 'exchange_ethbtc_order'
+STAGING_NAME = 'exchange_ethbtc_order_next'
+
+
+def create_fields(price=1.0):
+    """Create the fields of a row.
+    """
+    return OrderedDict([
+        ('id', IntIdField(name='id')),
+        ('date_time', DateTimeField(
+            name='date_time', value=datetime(2020, 1, 1))),
+        ('b1', PriceField(name='b1', value=price)),
+    ])
+
+
+def create_handler(path, **kwargs):
+    """Create the SQL handler on the SQLite database file.
+    """
+    handler = SqlHandler(
+        connection='sqlite:///%s' % path,
+        is_debug=False,
+        is_cold=False,
+        **kwargs)
+    handler.load(queue_factory=queue.Queue)
+    return handler
+
+
+def get_table_names(path):
+    """Get the table names of the SQLite database file.
+    """
+    return set(
+        table_name for table_name
+        in inspect(create_engine('sqlite:///%s' % path)).get_table_names()
+        if not table_name.startswith('sqlite_'))
+
+
+def count_rows(path, table_name):
+    """Count the rows of the table.
+    """
+    engine = create_engine('sqlite:///%s' % path)
+    return engine.execute(
+        'select count(*) from %s' % table_name).fetchone()[0]
+
+
+@pytest.fixture
+def path(tmp_path):
+    """Path of the SQLite database file.
+    """
+    return str(tmp_path / 'test.db')
+
+
+def test_swap_staging_table(path):
+    """The rotation swaps the staging table into the live table.
+    """
+    handler = create_handler(path, is_rotate=True)
+    handler.create_table(table_name=TABLE_NAME, fields=create_fields())
+    handler.flush()
+    assert STAGING_NAME in get_table_names(path)
+
+    handler.insert(table_name=TABLE_NAME, fields=create_fields())
+    handler.rename_table(
+        from_name=TABLE_NAME,
+        to_name=TABLE_NAME + '_20200101',
+        fields=create_fields())
+    handler.insert(table_name=TABLE_NAME, fields=create_fields())
+    handler.flush()
+
+    assert get_table_names(path) == {
+        TABLE_NAME, STAGING_NAME, TABLE_NAME + '_20200101'}
+    assert count_rows(path, TABLE_NAME + '_20200101') == 1
+    assert count_rows(path, TABLE_NAME) == 1
+    # The rotated table is analyzed between the batches
+    engine = create_engine('sqlite:///%s' % path)
+    assert engine.execute(
+        'select count(*) from sqlite_stat1 where tbl = ?',
+        (TABLE_NAME + '_20200101',)).fetchone()[0] == 1
+    handler.close()
+
+
+def test_recover_interrupted_swap(path):
+    """The live table lost between the renames of a swap is restored
+    from the staging table on start.
+    """
+    handler = create_handler(path, is_rotate=True)
+    handler.create_table(table_name=TABLE_NAME, fields=create_fields())
+    handler.flush()
+    handler.close()
+
+    engine = create_engine('sqlite:///%s' % path)
+    engine.execute('alter table %s rename to %s_20200101' % (
+        TABLE_NAME, TABLE_NAME))
+    engine.execute('insert into %s (date_time, b1) values (?, ?)' % (
+        STAGING_NAME), ('20200102 00:00:00.000000', 2.0))
+    assert TABLE_NAME not in get_table_names(path)
+
+    handler = create_handler(path, is_rotate=True)
+    handler.create_table(table_name=TABLE_NAME, fields=create_fields())
+    handler.flush()
+
+    assert TABLE_NAME in get_table_names(path)
+    assert count_rows(path, TABLE_NAME) == 1
+    # The staging table of the following period is created again
+    assert STAGING_NAME in get_table_names(path)
+    handler.close()
+
+
+def test_restore_failed_swap(path, monkeypatch):
+    """The live table is restored if the swap fails between the
+    renames.
+    """
+    handler = create_handler(path, is_rotate=True)
+    handler.create_table(table_name=TABLE_NAME, fields=create_fields())
+    handler.flush()
+    rename_tables = SqlHandler._rename_tables
+
+    def rename_first_table(conn, names, **kwargs):
+        monkeypatch.setattr(
+            SqlHandler, '_rename_tables', staticmethod(rename_tables))
+        rename_tables(conn=conn, names=names[:1], **kwargs)
+        raise RuntimeError('Lost connection')
+
+    monkeypatch.setattr(
+        SqlHandler, '_rename_tables', staticmethod(rename_first_table))
+
+    with pytest.raises(RuntimeError):
+        handler.rename_table(
+            from_name=TABLE_NAME,
+            to_name=TABLE_NAME + '_20200101',
+            fields=create_fields())
+
+    handler.insert(table_name=TABLE_NAME, fields=create_fields())
+    handler.flush()
+
+    assert TABLE_NAME in get_table_names(path)
+    assert count_rows(path, TABLE_NAME) == 1
+    handler.close()
+
+
+def test_rename_tables_mysql():
+    """The tables are renamed by a single statement on MySQL.
+    """
+    class Connection:
+        dialect = mysql.dialect()
+
+        def __init__(self):
+            self.statements = []
+
+        def execute(self, statement):
+            self.statements.append(statement)
+
+    conn = Connection()
+    SqlHandler._rename_tables(
+        conn=conn, names=[('a', 'a_1'), ('a_next', 'a')])
+
+    assert conn.statements == ['RENAME TABLE a TO a_1, a_next TO a']
+
+
+def get_index_names(path):
+    """Get the index names of each table of the SQLite database file.
+    """
+    inspector = inspect(create_engine('sqlite:///%s' % path))
+    return dict(
+        (table_name, [
+            index['name'] for index in inspector.get_indexes(table_name)])
+        for table_name in get_table_names(path))
+
+
+def test_time_index_name(path):
+    """The time index is named after the table, and follows its table
+    on the rotations.
+    """
+    handler = create_handler(path, is_rotate=True, is_time_index=True)
+    handler.create_table(table_name=TABLE_NAME, fields=create_fields())
+    handler.flush()
+
+    for suffix in ['20200101', '20200102']:
+        handler.insert(table_name=TABLE_NAME, fields=create_fields())
+        handler.rename_table(
+            from_name=TABLE_NAME,
+            to_name=TABLE_NAME + '_' + suffix,
+            fields=create_fields())
+        handler.flush()
+
+    assert get_index_names(path) == dict(
+        (table_name, [SqlHandler.get_index_name(table_name, 'date_time')])
+        for table_name in [
+            TABLE_NAME, STAGING_NAME,
+            TABLE_NAME + '_20200101', TABLE_NAME + '_20200102'])
+    assert count_rows(path, TABLE_NAME + '_20200102') == 1
+    handler.close()
+
+
+def test_time_index_without_staging(path):
+    """The time index follows its table when the table is renamed and
+    created again without a staging table.
+    """
+    handler = create_handler(path, is_time_index=True)
+    handler.create_table(table_name=TABLE_NAME, fields=create_fields())
+    handler.insert(table_name=TABLE_NAME, fields=create_fields())
+    handler.rename_table(
+        from_name=TABLE_NAME,
+        to_name=TABLE_NAME + '_20200101',
+        fields=create_fields())
+    handler.insert(table_name=TABLE_NAME, fields=create_fields())
+    handler.flush()
+
+    assert get_index_names(path) == dict(
+        (table_name, [SqlHandler.get_index_name(table_name, 'date_time')])
+        for table_name in [TABLE_NAME, TABLE_NAME + '_20200101'])
+    assert count_rows(path, TABLE_NAME + '_20200101') == 1
+    assert count_rows(path, TABLE_NAME) == 1
+    handler.close()
+
+
+def test_no_time_index(path):
+    """The time index is not created by default.
+    """
+    handler = create_handler(path)
+    handler.create_table(table_name=TABLE_NAME, fields=create_fields())
+
+    assert get_index_names(path) == {TABLE_NAME: []}
+    handler.close()
+
+
+def test_get_index_name():
+    """The index name is derived from the table name and the column,
+    and the long name is truncated with its checksum.
+    """
+    assert SqlHandler.get_index_name('a_b_order', 'date_time') == (
+        'ix_a_b_order_date_time')
+
+    long_names = [
+        SqlHandler.get_index_name('exchange_%s_order_%d' % ('x' * 60, i),
+                                  'date_time')
+        for i in range(2)]
+    assert all(
+        len(name) == SqlHandler.MAXIMUM_INDEX_NAME_LENGTH
+        for name in long_names)
+    assert long_names[0] != long_names[1]
+    assert long_names[0] == SqlHandler.get_index_name(
+        'exchange_%s_order_0' % ('x' * 60), 'date_time')
+
+
+class CopyStandIn:
+    """In-process stand-in of COPY FROM STDIN, which decodes the CSV
+    of the COPY and inserts the rows into the SQLite table.
+    """
+
+    def __init__(self, handler, failures=()):
+        """Constructor.
+
+        :param failures: `list` of the exceptions raised by the next
+            copies.
+        """
+        self._handler = handler
+        self._failures = list(failures)
+        self.row_counts = []
+
+    def __call__(self, table, rows):
+        """Copy the rows into the table.
+        """
+        if self._failures:
+            raise self._failures.pop(0)
+
+        column_names = list(rows[0].keys())
+        data = encode_csv(rows=rows, column_names=column_names)
+        values = [
+            dict(zip(column_names, [
+                None if value == CSV_NULL else value for value in row]))
+            for row in csv.reader(data)]
+        self._handler._get_connection(table.name).execute(
+            table.insert(), values)
+        self.row_counts.append(len(values))
+
+
+@pytest.fixture
+def copy_handler(path, monkeypatch):
+    """SQL handler copying the rows through the COPY stand-in.
+    """
+    handler = create_handler(path, is_copy=True, copy_size=3)
+    handler.create_table(table_name=TABLE_NAME, fields=create_fields())
+    monkeypatch.setattr(
+        handler._get_engine(TABLE_NAME).dialect, 'name', 'postgresql')
+    yield handler
+    handler.close()
+
+
+def test_copy_rows(path, copy_handler):
+    """The rows are buffered and copied on the copy size and on flush.
+    """
+    copy_handler._copy_rows = copy = CopyStandIn(copy_handler)
+
+    for i in range(4):
+        copy_handler.insert(table_name=TABLE_NAME, fields=create_fields(i))
+    assert copy.row_counts == [3]
+
+    copy_handler.flush(force=True)
+    assert copy.row_counts == [3, 1]
+    assert count_rows(path, TABLE_NAME) == 4
+
+
+def test_copy_retry_after_failure(path, copy_handler, monkeypatch):
+    """The table falls back to insert after a failure, and COPY is
+    retried after the backoff, which doubles on consecutive failures.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(sql_handler, 'time', lambda: now[0])
+    copy_handler._copy_rows = copy = CopyStandIn(
+        copy_handler,
+        failures=[RuntimeError('Lost connection')] * 2)
+
+    for i in range(3):
+        copy_handler.insert(table_name=TABLE_NAME, fields=create_fields(i))
+    assert count_rows(path, TABLE_NAME) == 3
+    assert not copy_handler._is_copy_table(TABLE_NAME)
+
+    now[0] += SqlHandler.COPY_RETRY_INTERVAL
+    for i in range(3):
+        copy_handler.insert(table_name=TABLE_NAME, fields=create_fields(i))
+    assert count_rows(path, TABLE_NAME) == 6
+
+    now[0] += SqlHandler.COPY_RETRY_INTERVAL
+    assert not copy_handler._is_copy_table(TABLE_NAME)
+
+    now[0] += SqlHandler.COPY_RETRY_INTERVAL
+    for i in range(3):
+        copy_handler.insert(table_name=TABLE_NAME, fields=create_fields(i))
+    assert copy.row_counts == [3]
+    assert count_rows(path, TABLE_NAME) == 9
+    assert TABLE_NAME not in copy_handler._copy_retries
+
+
+def test_copy_permanent_failure(path, copy_handler):
+    """COPY is not retried on the failures which will keep happening.
+    """
+    copy_handler._copy_rows = CopyStandIn(
+        copy_handler,
+        failures=[AttributeError('Driver does not support copy_expert')])
+
+    for i in range(3):
+        copy_handler.insert(table_name=TABLE_NAME, fields=create_fields(i))
+
+    assert count_rows(path, TABLE_NAME) == 3
+    assert copy_handler._copy_retries[TABLE_NAME][1] == float('inf')
+    assert not copy_handler._is_copy_table(TABLE_NAME)
+
+
+def test_copy_flush_after_swap(path, monkeypatch):
+    """The rows buffered after the swap of the staging table are
+    flushed into the new live table.
+    """
+    handler = create_handler(path, is_copy=True, copy_size=10,
+                             is_rotate=True)
+    handler.create_table(table_name=TABLE_NAME, fields=create_fields())
+    handler.flush()
+    monkeypatch.setattr(
+        handler, '_is_copy_table', lambda table_name: True)
+    handler._copy_rows = copy = CopyStandIn(handler)
+
+    handler.insert(table_name=TABLE_NAME, fields=create_fields(1))
+    handler.rename_table(
+        from_name=TABLE_NAME, to_name=TABLE_NAME + '_20200101',
+        fields=create_fields())
+    handler.insert(table_name=TABLE_NAME, fields=create_fields(2))
+    handler.insert(table_name=TABLE_NAME, fields=create_fields(3))
+    handler.flush(force=True)
+
+    assert copy.row_counts == [1, 2]
+    assert count_rows(path, TABLE_NAME + '_20200101') == 1
+    assert count_rows(path, TABLE_NAME) == 2
+    handler.close()
+
+
+def test_copy_keep_rows_on_failure(path, copy_handler, monkeypatch):
+    """The rows are kept in the buffer if neither COPY nor the insert
+    writes them, and the following rows are buffered behind them.
+    """
+    copy_handler._copy_rows = CopyStandIn(
+        copy_handler,
+        failures=[RuntimeError('Lost connection')])
+    connection = copy_handler._get_connection(TABLE_NAME)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('Lost connection')
+
+    monkeypatch.setattr(connection, 'execute', fail)
+    for i in range(3):
+        copy_handler.insert(table_name=TABLE_NAME, fields=create_fields(i))
+    assert len(copy_handler._copy_buffers[TABLE_NAME]) == 3
+
+    copy_handler.insert(table_name=TABLE_NAME, fields=create_fields(3))
+    assert len(copy_handler._copy_buffers[TABLE_NAME]) == 4
+
+    monkeypatch.undo()
+    copy_handler.flush(force=True)
+    assert TABLE_NAME not in copy_handler._copy_buffers
+    assert count_rows(path, TABLE_NAME) == 4
+
+
+def test_transaction_size(path, monkeypatch):
+    """The transaction is committed before the row exceeding the
+    maximum size, which is executed in the following transaction.
+    """
+    monkeypatch.setattr(SqlHandler, 'MAXIMUM_TRANSACTION_SIZE', 3)
+    handler = create_handler(path, sqlite_profile='throughput')
+    handler.create_table(table_name=TABLE_NAME, fields=create_fields())
+
+    for i in range(3):
+        handler.insert(table_name=TABLE_NAME, fields=create_fields(i))
+    assert count_rows(path, TABLE_NAME) == 0
+
+    handler.insert(table_name=TABLE_NAME, fields=create_fields(3))
+    assert count_rows(path, TABLE_NAME) == 3
+
+    handler.flush()
+    assert count_rows(path, TABLE_NAME) == 4
+    handler.close()
+
+
+def test_exchange_connection(tmp_path):
+    """The placeholder of the exchange is resolved per table, and the
+    unresolved connection is never connected.
+    """
+    handler = SqlHandler(
+        connection='sqlite:///%s' % (tmp_path / '{exchange}.db'),
+        batch_frequency=0,
+        is_debug=False,
+        is_cold=False)
+    handler.load(queue_factory=queue.Queue)
+    assert handler.engine is None
+
+    for table_name in ['binance_ethbtc_order', 'bitmex_xbtusd_order']:
+        handler.prepare_create_table(
+            table_name=table_name, fields=create_fields())
+        handler.prepare_insert(table_name=table_name, fields=create_fields())
+    handler.prepare_close()
+    handler.run()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'binance.db', 'bitmex.db']
+    assert count_rows(
+        str(tmp_path / 'binance.db'), 'binance_ethbtc_order') == 1
@@ -0,0 +1,93 @@
+import pytest
+
+pytest.importorskip('cryptofeed')
+
+from cryptofeed.defines import ASK, BID  # noqa: E402
+from sortedcontainers import SortedDict  # noqa: E402
+
+from befh.exchange.exchange import Exchange  # noqa: E402
+from befh.exchange.websocket_exchange import WebsocketExchange  # noqa: E402
+
+
+class RecordDispatcher:
+    """Dispatcher recording the table names of the inserted rows.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+        self.table_names = []
+
+    def prepare_insert(self, table_name, fields):
+        """Record the table name.
+        """
+        self.table_names.append(table_name)
+
+
+def create_exchange(name, feed, **config):
+    """Create the websocket exchange with the routes of the feed,
+    without connecting to the exchange.
+    """
+    exchange = WebsocketExchange(
+        name=name, config=config, is_debug=False, is_cold=False)
+    Exchange.load(exchange, handlers={})
+    exchange._instrument_mapping = exchange._create_instrument_mapping()
+    exchange._routes = exchange._create_routes(feed)
+    exchange._dispatcher = RecordDispatcher()
+    return exchange
+
+
+def update_trade(exchange, feed, pair, price):
+    """Call the trade callback.
+    """
+    exchange._update_trade_callback(
+        feed=feed, pair=pair, order_id='1', timestamp=1577836800.0,
+        side='buy', amount=1.0, price=price, receipt_timestamp=None)
+
+
+def test_routes():
+    """The callbacks of the instruments of the feed are routed to their
+    order books.
+    """
+    exchange = create_exchange(
+        'Bitmex', 'BITMEX', instruments=['XBTUSD', 'ETHUSD'])
+    instruments = exchange.instruments
+
+    assert exchange._routes == {
+        ('BITMEX', 'XBTUSD'): instruments['XBTUSD'],
+        ('BITMEX', 'ETHUSD'): instruments['ETHUSD'],
+    }
+
+    update_trade(exchange, 'BITMEX', 'ETHUSD', 200.0)
+    update_trade(exchange, 'BITMEX', 'XBTUSD', 7000.0)
+    exchange._update_order_book_callback(
+        feed='BITMEX', pair='ETHUSD',
+        book={BID: SortedDict({199.5: 1.0}), ASK: SortedDict({200.5: 2.0})},
+        timestamp=None, receipt_timestamp=None)
+
+    # The order book updates are not recorded without the trade table
+    assert exchange._dispatcher.table_names == [
+        'bitmex_ethusd_order', 'bitmex_xbtusd_order']
+    assert instruments['ETHUSD'].fields['t'].value == 200.0
+    assert instruments['ETHUSD'].fields['b1'].value == 199.5
+    assert instruments['XBTUSD'].fields['t'].value == 7000.0
+    assert instruments['XBTUSD'].fields['b1'].value == -1
+
+
+def test_routes_instrument_name():
+    """The feeds sending the instrument name are routed by the name
+    after the colon of the instrument.
+    """
+    exchange = create_exchange(
+        'HuobiDM', 'HUOBI_DM', type='futures',
+        instruments=['BTC_CW:BTC200103', 'ETH_CW:ETH200103'])
+    instruments = exchange.instruments
+
+    assert exchange._routes == {
+        ('HUOBI_DM', 'BTC200103'): instruments['BTC_CW:BTC200103'],
+        ('HUOBI_DM', 'ETH200103'): instruments['ETH_CW:ETH200103'],
+    }
+
+    update_trade(exchange, 'HUOBI_DM', 'ETH200103', 130.0)
+    assert exchange._dispatcher.table_names == ['huobidm_eth200103_order']
+    assert instruments['ETH_CW:ETH200103'].fields['t'].value == 130.0